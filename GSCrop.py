@@ -4,70 +4,299 @@ GScrop converted to python
 import subprocess
 import os
 import re
+import glob
+import time
+import fcntl
+import struct
 
 
-def set_camera_crop(width, height, x_offset=None, y_offset=None, media_device=None):
-    """
-    Set camera crop settings using media-ctl.
+# Sensorgroesse IMX296
+SENSOR_WIDTH = 1440
+SENSOR_HEIGHT = 1088
+# Der imx296-Treiber richtet den Crop-Offset auf Vielfache von 4 aus
+CROP_ALIGN = 4
 
-    Args:
-        width (int): Width of the crop window (must be even)
-        height (int): Height of the crop window (must be even)
-        x_offset (int, optional): X offset for crop. If None, centers the crop.
-        y_offset (int, optional): Y offset for crop. If None, centers the crop.
-        media_device (int, optional): Media device number. If None, tries devices 0-5.
+# --- V4L2 Subdevice ioctls (linux/v4l2-subdev.h) ---
+V4L2_SUBDEV_FORMAT_ACTIVE = 1
+V4L2_SEL_TGT_CROP = 0
+V4L2_FIELD_NONE = 1
+MEDIA_BUS_FMT_SBGGR10_1X10 = 0x3007
 
-    Returns:
-        bool: True if successful, False otherwise
-    """
-    # Validate width and height are even numbers
-    if width % 2 != 0 or height % 2 != 0:
-        raise ValueError("Width and height must be even numbers")
+# struct v4l2_subdev_format: which, pad, v4l2_mbus_framefmt, stream, reserved[7]
+SUBDEV_FORMAT = struct.Struct("<II IIIII HHHH 10H I 7I")
+# struct v4l2_subdev_selection: which, pad, target, flags, v4l2_rect, stream, reserved[7]
+SUBDEV_SELECTION = struct.Struct("<IIII iiII I 7I")
+
+
+def _pack(layout, *values):
+    """Struktur mit values am Anfang, Rest (reserved) mit Nullen, als beschreibbarer Puffer."""
+    count = len(layout.unpack(bytes(layout.size)))
+    return bytearray(layout.pack(*values, *([0] * (count - len(values)))))
+
+
+def format_buffer(width=0, height=0, code=0, field=0, which=V4L2_SUBDEV_FORMAT_ACTIVE, pad=0):
+    """struct v4l2_subdev_format fuer VIDIOC_SUBDEV_G_FMT/S_FMT."""
+    return _pack(SUBDEV_FORMAT, which, pad, width, height, code, field)
+
+
+def selection_buffer(x_offset, y_offset, width, height, target=V4L2_SEL_TGT_CROP,
+                     which=V4L2_SUBDEV_FORMAT_ACTIVE, pad=0):
+    """struct v4l2_subdev_selection fuer VIDIOC_SUBDEV_S_SELECTION."""
+    return _pack(SUBDEV_SELECTION, which, pad, target, 0, x_offset, y_offset, width, height)
+
+
+def _iowr(nr, size):
+    return (3 << 30) | (size << 16) | (ord("V") << 8) | nr
+
+
+VIDIOC_SUBDEV_G_FMT = _iowr(4, SUBDEV_FORMAT.size)
+VIDIOC_SUBDEV_S_FMT = _iowr(5, SUBDEV_FORMAT.size)
+VIDIOC_SUBDEV_S_SELECTION = _iowr(62, SUBDEV_SELECTION.size)
 
-    # Detect if we're on a Raspberry Pi 5 with CM4 camera (like the script does)
-    is_pi_5 = False
-    device_id = "10"  # Default device ID
 
+def detect_device_id():
+    """
+    Detect if we're on a Raspberry Pi 5 with CM4 camera (like the script does)
+    and return the I2C bus id of the camera ("10" or "11").
+    """
+    device_id = "10"  # Default device ID
     try:
         with open("/proc/cpuinfo", "r") as f:
             cpuinfo = f.read()
             if re.search(r"Revision.*: ...17.$", cpuinfo):
-                is_pi_5 = True
                 # Check for cam1 environment variable as in original script
                 if os.environ.get("cam1"):
                     device_id = "11"
                 else:
                     device_id = "10"
-    except:
+    except OSError:
         pass
+    return device_id
+
+
+def find_subdev(entity_name):
+    """Sucht den /dev/v4l-subdevN-Knoten zu einer Media-Entity ueber sysfs."""
+    for name_file in sorted(glob.glob("/sys/class/video4linux/v4l-subdev*/name")):
+        try:
+            with open(name_file, "r") as f:
+                if f.read().strip() == entity_name:
+                    return "/dev/" + os.path.basename(os.path.dirname(name_file))
+        except OSError:
+            continue
+    return None
 
-    # Calculate crop offsets if not provided (center crop)
-    if x_offset is None:
-        x_offset = (1440 - width) // 2
-    if y_offset is None:
-        y_offset = (1088 - height) // 2
 
-    # Determine which media device to use
-    if media_device is not None:
-        media_devices = [media_device]
-    else:
-        media_devices = range(6)  # Try devices 0-5 as in the original script
+class V4L2SubdevBackend:
+    """Setzt den Crop direkt per ioctl auf dem Sensor-Subdevice."""
 
-    # Format the media-ctl command
-    crop_fmt = f"'imx296 {device_id}-001a':0 [fmt:SBGGR10_1X10/{width}x{height} crop:({x_offset},{y_offset})/{width}x{height}]"
+    def __init__(self, subdev_path):
+        self.subdev_path = subdev_path
+        self.fd = os.open(subdev_path, os.O_RDWR)
 
-    # Try to set the crop on each media device until success
-    for m in media_devices:
-        cmd = ["media-ctl", "-d", f"/dev/media{m}", "--set-v4l2", crop_fmt]
+        # Aktuelles Format einmal lesen, damit der Mediabus-Code erhalten bleibt
         try:
-            result = subprocess.run(cmd, capture_output=True, text=True)
-            if result.returncode == 0:
-                print(
-                    f"Successfully set crop on /dev/media{m}: {width}x{height} at offset ({x_offset},{y_offset})"
-                )
-                return True
-        except Exception as e:
-            print(f"Error setting crop on /dev/media{m}: {e}")
+            buf = format_buffer()
+            fcntl.ioctl(self.fd, VIDIOC_SUBDEV_G_FMT, buf)
+            self.code = SUBDEV_FORMAT.unpack(buf)[4] or MEDIA_BUS_FMT_SBGGR10_1X10
+        except OSError:
+            self.code = MEDIA_BUS_FMT_SBGGR10_1X10
+
+    def apply(self, width, height, x_offset, y_offset):
+        # Wie media-ctl: zuerst Crop, dann Format
+        fcntl.ioctl(self.fd, VIDIOC_SUBDEV_S_SELECTION,
+                    selection_buffer(x_offset, y_offset, width, height))
+        fcntl.ioctl(self.fd, VIDIOC_SUBDEV_S_FMT,
+                    format_buffer(width, height, self.code, V4L2_FIELD_NONE))
+        return True
+
+    def close(self):
+        os.close(self.fd)
+
+
+class MediaCtlBackend:
+    """Fallback ueber einen media-ctl Subprozess; merkt sich das funktionierende /dev/mediaN."""
+
+    def __init__(self, entity_name, media_device=None):
+        self.entity_name = entity_name
+        self.media_device = media_device
+
+    def apply(self, width, height, x_offset, y_offset):
+        crop_fmt = (f"'{self.entity_name}':0 [fmt:SBGGR10_1X10/{width}x{height} "
+                    f"crop:({x_offset},{y_offset})/{width}x{height}]")
+        if self.media_device is not None:
+            media_devices = [self.media_device]
+        else:
+            media_devices = range(6)  # Try devices 0-5 as in the original script
+
+        # Try to set the crop on each media device until success
+        for m in media_devices:
+            cmd = ["media-ctl", "-d", f"/dev/media{m}", "--set-v4l2", crop_fmt]
+            try:
+                result = subprocess.run(cmd, capture_output=True, text=True)
+                if result.returncode == 0:
+                    self.media_device = m
+                    return True
+            except Exception as e:
+                print(f"Error setting crop on /dev/media{m}: {e}")
+        return False
+
+    def close(self):
+        pass
+
+
+class FakeCropBackend:
+    """Backend ohne Hardware, z.B. um die Latenz des Controllers zu messen."""
+
+    def __init__(self):
+        self.calls = []
+
+    def apply(self, width, height, x_offset, y_offset):
+        self.calls.append((width, height, x_offset, y_offset))
+        return True
+
+    def close(self):
+        pass
+
+
+class CropController:
+    """
+    Setzt den Sensor-Crop mit einmal ermitteltem Device.
+
+    Beim ersten Aufruf werden /proc/cpuinfo, die imx296-Entity und das
+    zugehoerige v4l-subdev gesucht und gecacht. Danach kostet ein
+    Crop-Wechsel nur zwei ioctls statt fork/exec von media-ctl. Schlaegt der
+    native Weg fehl, wird auf media-ctl zurueckgefallen.
+
+    Args:
+        media_device (int, optional): Media device number for the media-ctl fallback.
+        backend (optional): Eigenes Backend mit apply(width, height, x, y), z.B. FakeCropBackend
+    """
+
+    def __init__(self, media_device=None, backend=None):
+        self.media_device = media_device
+        self.backend = backend
+        self.entity_name = None
+        # Zuletzt angeforderter Crop nach snap(): (width, height, x_offset, y_offset)
+        self.last_crop = None
+
+        # Latenzstatistik
+        self.calls = 0
+        self.failures = 0
+        self.last_latency_us = 0.0
+        self.max_latency_us = 0.0
+        self.total_latency_us = 0.0
+
+    def _discover(self):
+        self.entity_name = f"imx296 {detect_device_id()}-001a"
+        subdev = find_subdev(self.entity_name)
+        if subdev is not None:
+            try:
+                self.backend = V4L2SubdevBackend(subdev)
+                return
+            except OSError as e:
+                print(f"Cannot open {subdev}, falling back to media-ctl: {e}")
+        self.backend = MediaCtlBackend(self.entity_name, self.media_device)
+
+    @staticmethod
+    def snap(width, height, x_offset=None, y_offset=None):
+        """Crop auf gueltige Sensorwerte bringen (zentriert, ausgerichtet, begrenzt)."""
+        # Validate width and height are even numbers
+        if width % 2 != 0 or height % 2 != 0:
+            raise ValueError("Width and height must be even numbers")
+
+        # Calculate crop offsets if not provided (center crop)
+        if x_offset is None:
+            x_offset = (SENSOR_WIDTH - width) // 2
+        if y_offset is None:
+            y_offset = (SENSOR_HEIGHT - height) // 2
+
+        # Begrenzen auf den groessten ausgerichteten Offset, der noch auf den Sensor passt
+        max_x = (SENSOR_WIDTH - width) // CROP_ALIGN * CROP_ALIGN
+        max_y = (SENSOR_HEIGHT - height) // CROP_ALIGN * CROP_ALIGN
+        x_offset = max(0, min(int(x_offset) // CROP_ALIGN * CROP_ALIGN, max_x))
+        y_offset = max(0, min(int(y_offset) // CROP_ALIGN * CROP_ALIGN, max_y))
+        return width, height, x_offset, y_offset
+
+    def set_crop(self, width, height, x_offset=None, y_offset=None):
+        """
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        width, height, x_offset, y_offset = self.snap(width, height, x_offset, y_offset)
+        self.last_crop = (width, height, x_offset, y_offset)
+        start = time.perf_counter()
+
+        if self.backend is None:
+            self._discover()
+        try:
+            ok = self.backend.apply(width, height, x_offset, y_offset)
+        except OSError as e:
+            if isinstance(self.backend, V4L2SubdevBackend):
+                print(f"V4L2 crop failed, falling back to media-ctl: {e}")
+                self.backend.close()
+                self.backend = MediaCtlBackend(self.entity_name, self.media_device)
+                ok = self.backend.apply(width, height, x_offset, y_offset)
+            else:
+                raise
+
+        self.last_latency_us = (time.perf_counter() - start) * 1_000_000.0
+        self.max_latency_us = max(self.max_latency_us, self.last_latency_us)
+        self.total_latency_us += self.last_latency_us
+        self.calls += 1
+        if not ok:
+            self.failures += 1
+        return ok
+
+    def get_stats(self):
+        return {
+            "backend": type(self.backend).__name__ if self.backend is not None else None,
+            "calls": self.calls,
+            "failures": self.failures,
+            "last_latency_us": round(self.last_latency_us, 1),
+            "mean_latency_us": round(self.total_latency_us / self.calls, 1) if self.calls else 0.0,
+            "max_latency_us": round(self.max_latency_us, 1),
+        }
+
+    def close(self):
+        if self.backend is not None:
+            self.backend.close()
+            self.backend = None
+
+
+# Ein Controller pro media_device, damit die Erkennung nur einmal laeuft
+_controllers = {}
+
+
+def get_crop_controller(media_device=None):
+    controller = _controllers.get(media_device)
+    if controller is None:
+        controller = CropController(media_device)
+        _controllers[media_device] = controller
+    return controller
+
+
+def set_camera_crop(width, height, x_offset=None, y_offset=None, media_device=None):
+    """
+    Set camera crop settings (cached V4L2 subdevice, media-ctl as fallback).
+
+    Args:
+        width (int): Width of the crop window (must be even)
+        height (int): Height of the crop window (must be even)
+        x_offset (int, optional): X offset for crop. If None, centers the crop.
+        y_offset (int, optional): Y offset for crop. If None, centers the crop.
+        media_device (int, optional): Media device number. If None, tries devices 0-5.
+
+    Returns:
+        bool: True if successful, False otherwise
+    """
+    controller = get_crop_controller(media_device)
+    # set_crop richtet den Crop aus (snap), last_crop enthaelt die gesetzten Werte
+    if controller.set_crop(width, height, x_offset, y_offset):
+        width, height, x_offset, y_offset = controller.last_crop
+        print(
+            f"Successfully set crop: {width}x{height} at offset ({x_offset},{y_offset})"
+        )
+        return True
 
     print("Failed to set crop on any media device")
     return False
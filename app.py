@@ -1,9 +1,12 @@
+from flask import Flask, Response, jsonify
 import time
-import threading
-
-from flask import Flask, Response
-from picamera2 import Picamera2
 import cv2
+from framesource import open_frame_source
+from streamhub import StreamHub
+from asyncserver import run_server
+from metrics import Metrics, PROMETHEUS_CONTENT_TYPE
+from threadplacement import ThreadPlacement
+from sensortime import SensorTiming, capture_with_metadata
 
 
 """
@@ -18,7 +21,7 @@ media-ctl -d /dev/media0 \
 app = Flask(__name__)
 
 # Initialize the camera
-picam2 = Picamera2()
+picam2 = open_frame_source()  # FRAME_SOURCE=synthetic/replay:... ohne Kamera
 picam2.configure(picam2.create_video_configuration(main={"size": (640, 480)}))
 # picam2.configure(picam2.create_video_configuration(main={"size": (128, 128)}))
 # picam2.configure(picam2.create_video_configuration(main={"size": (1440, 1080)}))
@@ -49,45 +52,50 @@ picam2.set_controls({
 
 picam2.start()
 
-# Global variable to store FPS
-fps = 0.0
-fps_lock = threading.Lock()
-
-def gen_frames():
-    global fps
-    frame_counter = 0
-    start_time = time.time()
-    while True:
-        frame = picam2.capture_array()
-        # Convert from RGB to BGR for OpenCV
-        frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
-
-        # Calculate FPS
-        frame_counter += 1
-        elapsed_time = time.time() - start_time
-        if elapsed_time >= 1.0:
-            with fps_lock:
-                fps = frame_counter / elapsed_time
-            frame_counter = 0
-            start_time = time.time()
-
-        ret, buffer = cv2.imencode('.jpg', frame)
-        frame = buffer.tobytes()
-
-        yield (b'--frame\r\n'
-               b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
+# Per-stage latency histograms, exported on /metrics
+metrics = Metrics(frame_budget=0.002)
+# Kerne/Prioritaet pro Thread aus THREAD_PLACEMENT, CPU-Zeit und Kontextwechsel unter /metrics
+placement = ThreadPlacement.from_env(metrics)
+capture_stage = metrics.stage("capture")
+convert_stage = metrics.stage("convert")
+# Sensor frame rate and dropped frames from SensorTimestamp
+sensor_timing = SensorTiming(frame_duration_us=2000, metrics=metrics)
+
+def capture_frame():
+    start = time.perf_counter()
+    frame, metadata = capture_with_metadata(picam2)
+    captured = time.perf_counter()
+    sensor_timing.update(metadata)
+    # Convert from RGB to BGR for OpenCV
+    frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
+    capture_stage.observe(captured - start)
+    convert_stage.observe(time.perf_counter() - captured)
+    return frame
+
+# One capture pipeline shared by all clients
+hub = StreamHub(capture_frame, metrics=metrics,
+                placement=placement)
+hub.start()
 
 @app.route('/video_feed')
 def video_feed():
-    return Response(gen_frames(),
+    return Response(hub.stream(),
                     mimetype='multipart/x-mixed-replace; boundary=frame')
 
 # New route to provide FPS value
 @app.route('/fps')
 def get_fps():
-    with fps_lock:
-        current_fps = fps
-    return f"{current_fps:.2f}"
+    return f"{hub.fps:.2f}"
+
+# Sensor frame rate and dropped frames
+@app.route('/timing')
+def timing():
+    return jsonify(sensor_timing.get_stats())
+
+# Prometheus scrape endpoint
+@app.route('/metrics')
+def get_metrics():
+    return Response(metrics.render(), content_type=PROMETHEUS_CONTENT_TYPE)
 
 
 @app.route('/')
@@ -98,13 +106,14 @@ def index():
             <title>Live Stream</title>
             <style>
                 body { font-family: Arial, sans-serif; }
-                #fps { font-size: 1.2em; color: black; margin-top: 10px; }
+                #fps, #sensor { font-size: 1.2em; color: black; margin-top: 10px; }
             </style>
         </head>
         <body>
             <h1>Live Stream</h1>
             <img src="/video_feed">
             <div id="fps">FPS: Calculating...</div>
+            <div id="sensor">Sensor: Calculating...</div>
             <script>
                 function fetchFPS() {
                     fetch('/fps')
@@ -119,10 +128,24 @@ def index():
          
                 // Fetch FPS on page load
                 fetchFPS();
+
+                // Sensor frame rate and dropped frames from SensorTimestamp
+                function fetchTiming() {
+                    fetch('/timing')
+                        .then(response => response.json())
+                        .then(t => {
+                            document.getElementById('sensor').innerText =
+                                'Sensor: ' + t.sensor_fps.toFixed(1) + ' fps | dropped: ' + t.frames_dropped;
+                        })
+                        .catch(error => console.error('Error fetching timing:', error));
+                }
+                setInterval(fetchTiming, 1000);
+                fetchTiming();
             </script>
         </body>
     </html>
     '''
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, threaded=True)
+    # STREAM_SERVER=asyncio: alle Clients in einem Event-Loop statt einem Thread pro Stream
+    run_server(app, hub, host='0.0.0.0', port=5000, placement=placement)
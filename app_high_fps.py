@@ -1,18 +1,21 @@
+from flask import Flask, Response, jsonify
 import time
-import threading
-from flask import Flask, Response
-from picamera2 import Picamera2
 import cv2
-from GSCrop import set_camera_crop
+from framesource import open_frame_source, set_source_crop
+from streamhub import StreamHub
+from asyncserver import run_server
+from metrics import Metrics, PROMETHEUS_CONTENT_TYPE
+from threadplacement import ThreadPlacement
+from sensortime import SensorTiming, capture_with_metadata
+
+# ---------- Flask App vorbereiten ----------
+app = Flask(__name__)
+picam2 = open_frame_source()  # FRAME_SOURCE=synthetic/replay:... ohne Kamera
 
 # ---------- Kamera-Cropping festlegen ----------
 CROP_WIDTH = 400
 CROP_HEIGHT = 400
-set_camera_crop(CROP_WIDTH, CROP_HEIGHT)
-
-# ---------- Flask App vorbereiten ----------
-app = Flask(__name__)
-picam2 = Picamera2()
+set_source_crop(picam2, CROP_WIDTH, CROP_HEIGHT)
 
 # Kamera konfigurieren (keine Rohdaten, nur das verarbeitete Bild vom ISP)
 video_config = picam2.create_video_configuration(
@@ -28,43 +31,46 @@ picam2.configure(video_config)
 # Kamera starten
 picam2.start()
 
-# ---------- FPS-Zählung ----------
-fps = 0.0
-fps_lock = threading.Lock()
-
-def gen_frames():
-    global fps
-    frame_counter = 0
-    start_time = time.time()
-    while True:
-        frame = picam2.capture_array()
-        frame = cv2.cvtColor(frame, cv2.COLOR_RGBA2BGR)  # ISP liefert RGBA
+# ---------- Eine Pipeline fuer alle Clients ----------
+# Latenz pro Schritt, Export unter /metrics
+metrics = Metrics(frame_budget=0.002)
+# Kerne/Prioritaet pro Thread aus THREAD_PLACEMENT, CPU-Zeit und Kontextwechsel unter /metrics
+placement = ThreadPlacement.from_env(metrics)
+capture_stage = metrics.stage("capture")
+convert_stage = metrics.stage("convert")
+# Echte Bildrate und verlorene Bilder aus den Sensor-Zeitstempeln
+sensor_timing = SensorTiming(frame_duration_us=2000, metrics=metrics)
 
-        # FPS berechnen
-        frame_counter += 1
-        elapsed_time = time.time() - start_time
-        if elapsed_time >= 1.0:
-            with fps_lock:
-                fps = frame_counter / elapsed_time
-            frame_counter = 0
-            start_time = time.time()
+def capture_frame():
+    start = time.perf_counter()
+    frame, metadata = capture_with_metadata(picam2)
+    captured = time.perf_counter()
+    sensor_timing.update(metadata)
+    frame = cv2.cvtColor(frame, cv2.COLOR_RGBA2BGR)  # ISP liefert RGBA
+    capture_stage.observe(captured - start)
+    convert_stage.observe(time.perf_counter() - captured)
+    return frame
 
-        # MJPEG-Stream generieren
-        ret, buffer = cv2.imencode('.jpg', frame)
-        frame = buffer.tobytes()
-        yield (b'--frame\r\n'
-               b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
+hub = StreamHub(capture_frame, metrics=metrics,
+                placement=placement)
+hub.start()
 
 @app.route('/video_feed')
 def video_feed():
-    return Response(gen_frames(),
+    return Response(hub.stream(),
                     mimetype='multipart/x-mixed-replace; boundary=frame')
 
 @app.route('/fps')
 def get_fps():
-    with fps_lock:
-        current_fps = fps
-    return f"{current_fps:.2f}"
+    return f"{hub.fps:.2f}"
+
+@app.route('/timing')
+def timing():
+    return jsonify(sensor_timing.get_stats())
+
+@app.route('/metrics')
+def get_metrics():
+    return Response(metrics.render(), content_type=PROMETHEUS_CONTENT_TYPE)
 
 @app.route('/')
 def index():
@@ -74,13 +80,14 @@ def index():
             <title>Live Stream</title>
             <style>
                 body { font-family: Arial, sans-serif; }
-                #fps { font-size: 1.2em; color: black; margin-top: 10px; }
+                #fps, #sensor { font-size: 1.2em; color: black; margin-top: 10px; }
             </style>
         </head>
         <body>
             <h1>Live Stream</h1>
             <img src="/video_feed" width="1000">
             <div id="fps">FPS: Calculating...</div>
+            <div id="sensor">Sensor: Calculating...</div>
             <script>
                 function fetchFPS() {
                     fetch('/fps')
@@ -92,10 +99,24 @@ def index():
                 }
                 setInterval(fetchFPS, 1000);
                 fetchFPS();
+
+                function fetchTiming() {
+                    fetch('/timing?t=' + Date.now())
+                        .then(response => response.json())
+                        .then(t => {
+                            document.getElementById('sensor').innerText =
+                                'Sensor: ' + t.sensor_fps.toFixed(1) + ' fps | dropped: ' + t.frames_dropped;
+                        })
+                        .catch(console.error);
+                }
+
+                setInterval(fetchTiming, 1000);
+                fetchTiming();
             </script>
         </body>
     </html>
     '''
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, threaded=True)
+    # STREAM_SERVER=asyncio: alle Clients in einem Event-Loop statt einem Thread pro Stream
+    run_server(app, hub, host='0.0.0.0', port=5000, placement=placement)
@@ -1,15 +1,17 @@
 from flask import Flask, Response, jsonify
-from picamera2 import Picamera2
 import cv2
+from framesource import open_frame_source
 import time
 import threading
 import json
 import numbers
+from metrics import Metrics, PROMETHEUS_CONTENT_TYPE
+from sensortime import SensorTiming, capture_with_metadata
 
 app = Flask(__name__)
 
 # Initialize the camera
-picam2 = Picamera2()
+picam2 = open_frame_source()  # FRAME_SOURCE=synthetic/replay:... ohne Kamera
 picam2.configure(picam2.create_video_configuration(main={"size": (640, 480)}))
 # picam2.configure(picam2.create_video_configuration(main={"size": (1440, 1080)}))
 
@@ -39,14 +41,30 @@ fps = 0.0
 # Lock for thread safety
 fps_lock = threading.Lock()
 
+# Per-stage latency histograms, exported on /metrics
+metrics = Metrics(frame_budget=0.002)
+capture_stage = metrics.stage("capture")
+convert_stage = metrics.stage("convert")
+encode_stage = metrics.stage("encode")
+send_stage = metrics.stage("send")
+# Sensor frame rate and dropped frames from SensorTimestamp
+sensor_timing = SensorTiming(frame_duration_us=2000, metrics=metrics)
+# Metadata of the latest frame (SensorTimestamp, ExposureTime, ...)
+last_metadata = {}
+
 def gen_frames():
-    global fps
+    global fps, last_metadata
     frame_counter = 0
     start_time = time.time()
     while True:
-        frame = picam2.capture_array()
+        t0 = time.perf_counter()
+        frame, metadata = capture_with_metadata(picam2)
+        t1 = time.perf_counter()
+        sensor_timing.update(metadata)
+        last_metadata = metadata
         # Convert from RGB to BGR for OpenCV
         frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
+        t2 = time.perf_counter()
 
         # Calculate FPS
         frame_counter += 1
@@ -59,15 +77,28 @@ def gen_frames():
 
         ret, buffer = cv2.imencode('.jpg', frame)
         frame = buffer.tobytes()
+        t3 = time.perf_counter()
 
+        # Flask resumes the generator once the frame has been written
         yield (b'--frame\r\n'
                b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
+        t4 = time.perf_counter()
+
+        capture_stage.observe(t1 - t0)
+        convert_stage.observe(t2 - t1)
+        encode_stage.observe(t3 - t2)
+        send_stage.observe(t4 - t3)
+        metrics.frame_done(t4 - t1)
 
 @app.route('/video_feed')
 def video_feed():
     return Response(gen_frames(),
                     mimetype='multipart/x-mixed-replace; boundary=frame')
 
+@app.route('/metrics')
+def get_metrics():
+    return Response(metrics.render(), content_type=PROMETHEUS_CONTENT_TYPE)
+
 @app.route('/stats')
 def stats():
     with fps_lock:
@@ -99,7 +130,9 @@ def stats():
     data = {
         'fps': f"{current_fps:.2f}",
         'controls': controls_serializable,
-        'configuration': config_serializable
+        'configuration': config_serializable,
+        'sensor': sensor_timing.get_stats(),
+        'metadata': serialize(last_metadata)
     }
     return jsonify(data)
 
@@ -112,7 +145,7 @@ def index():
             <style>
                 body { font-family: Arial, sans-serif; }
                 #stats { margin-top: 10px; }
-                #fps { font-size: 1.2em; font-weight: bold; }
+                #fps, #sensor { font-size: 1.2em; font-weight: bold; }
                 pre { background-color: #f4f4f4; padding: 10px; border-radius: 5px; }
             </style>
         </head>
@@ -121,6 +154,9 @@ def index():
             <img src="/video_feed">
             <div id="stats">
                 <p id="fps">FPS: Calculating...</p>
+                <p id="sensor">Sensor: Calculating...</p>
+                <h2>Frame Metadata</h2>
+                <pre id="metadata">Loading...</pre>
                 <h2>Camera Configuration</h2>
                 <pre id="config">Loading...</pre>
             </div>
@@ -130,6 +166,10 @@ def index():
                         .then(response => response.json())
                         .then(data => {
                             document.getElementById('fps').innerText = 'FPS: ' + data.fps;
+                            document.getElementById('sensor').innerText =
+                                'Sensor: ' + data.sensor.sensor_fps.toFixed(1) + ' fps | dropped: ' +
+                                data.sensor.frames_dropped + ' | interval: ' + data.sensor.frame_interval_us + ' us';
+                            document.getElementById('metadata').innerText = JSON.stringify(data.metadata, null, 2);
                             document.getElementById('config').innerText = JSON.stringify(data.configuration, null, 2);
                         })
                         .catch(error => console.error('Error fetching stats:', error));
@@ -0,0 +1,449 @@
+"""
+Asyncio-Server fuer die MJPEG-Streams: alle Clients in einem Event-Loop
+
+Mit app.run(threaded=True) haelt jeder Zuschauer einen OS-Thread, der im
+Generator auf das naechste Bild wartet und mit der Detektion um den GIL
+konkurriert. Hier bekommt der Event-Loop jedes fertige JPEG vom StreamHub
+(call_soon_threadsafe, blockiert den Encoder nie) und schreibt es an alle
+Clients des Modus; ein Client kostet nur noch einen Socket-Puffer.
+
+Alle anderen Routen (/fps, /stats, /metrics, die Seite selbst, ...) gehen
+unveraendert an die Flask-App, aufgerufen ueber WSGI in einem kleinen
+Thread-Pool. Dazu kommen WebSocket-Endpunkte (z.B. /telemetry), die Flask
+selbst nicht kann. Nur Standardbibliothek, keine zusaetzliche Abhaengigkeit.
+
+Start in den Skripten ueber die Umgebung:
+    STREAM_SERVER=asyncio python tracker_high_fps.py
+"""
+import asyncio
+import base64
+import hashlib
+import io
+import os
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, unquote, urlsplit
+
+STREAM_CONTENT_TYPE = "multipart/x-mixed-replace; boundary=frame"
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 413: "Payload Too Large",
+            500: "Internal Server Error"}
+# Request-Bodies fuer die Flask-Routen sind nur kleine Formulare/JSON
+_MAX_BODY = 1024 * 1024
+_WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+# Eingehende Nachrichten sind nur kleine Steuerbefehle
+_WEBSOCKET_MAX_MESSAGE = 65536
+# Close-Codes (RFC 6455, 7.4.1)
+WS_CLOSE_PROTOCOL_ERROR = 1002
+WS_CLOSE_INVALID_DATA = 1007
+WS_CLOSE_TOO_BIG = 1009
+
+
+def _unmask(payload, mask):
+    # XOR ueber die ganze Nachricht als eine grosse Zahl statt Byte fuer Byte
+    n = len(payload)
+    key = (mask * (n // 4 + 1))[:n]
+    return (int.from_bytes(payload, "big") ^ int.from_bytes(key, "big")).to_bytes(n, "big")
+
+
+class WebSocket:
+    """
+    Minimaler WebSocket (RFC 6455) auf einer asyncio-Verbindung.
+
+    Unterstuetzt Text- und Binaernachrichten (auch fragmentiert, zusammen
+    hoechstens _WEBSOCKET_MAX_MESSAGE Bytes), Ping/Pong und Close. Verstoesse
+    gegen das Protokoll (unmaskierte Client-Frames, RSV-Bits, unbekannte
+    Opcodes, Fortsetzung ohne Anfang) beenden die Verbindung mit Close 1002,
+    zu grosse Nachrichten mit 1009, ungueltiges UTF-8 mit 1007.
+    """
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.closed = False
+
+    async def send(self, data):
+        """Text (str) oder Binaerdaten (bytes) senden."""
+        if isinstance(data, str):
+            await self._send_frame(0x1, data.encode("utf-8"))
+        else:
+            await self._send_frame(0x2, data)
+
+    async def _send_frame(self, opcode, payload):
+        length = len(payload)
+        if length < 126:
+            header = bytes((0x80 | opcode, length))
+        elif length < 65536:
+            header = bytes((0x80 | opcode, 126)) + length.to_bytes(2, "big")
+        else:
+            header = bytes((0x80 | opcode, 127)) + length.to_bytes(8, "big")
+        self.writer.write(header + payload)
+        await self.writer.drain()
+
+    async def receive(self):
+        """
+        Naechste Nachricht des Clients; Ping wird dabei beantwortet.
+
+        Returns:
+            str or bytes: Nachricht, None wenn die Verbindung geschlossen wurde
+        """
+        message = None      # Bisherige Fragmente einer geteilten Nachricht
+        message_opcode = None
+        while not self.closed:
+            try:
+                b1, b2 = await self.reader.readexactly(2)
+                fin = b1 & 0x80
+                opcode = b1 & 0x0F
+                length = b2 & 0x7F
+                if length == 126:
+                    length = int.from_bytes(await self.reader.readexactly(2), "big")
+                elif length == 127:
+                    length = int.from_bytes(await self.reader.readexactly(8), "big")
+                if b1 & 0x70 or not b2 & 0x80:
+                    # Keine Extensions ausgehandelt; Client-Frames muessen maskiert sein
+                    await self.close(WS_CLOSE_PROTOCOL_ERROR)
+                    break
+                if opcode & 0x8:
+                    if opcode not in (0x8, 0x9, 0xA) or not fin or length > 125:
+                        await self.close(WS_CLOSE_PROTOCOL_ERROR)
+                        break
+                elif opcode > 0x2 or (opcode == 0x0) != (message is not None):
+                    # Unbekannter Opcode, Fortsetzung ohne Anfang oder neue Nachricht mittendrin
+                    await self.close(WS_CLOSE_PROTOCOL_ERROR)
+                    break
+                elif length + (len(message) if message is not None else 0) > _WEBSOCKET_MAX_MESSAGE:
+                    await self.close(WS_CLOSE_TOO_BIG)
+                    break
+                mask = await self.reader.readexactly(4)
+                payload = _unmask(await self.reader.readexactly(length), mask)
+            except (asyncio.IncompleteReadError, ConnectionError):
+                break
+
+            if opcode == 0x8:
+                # Close mit dem Code des Clients bestaetigen
+                await self.close(int.from_bytes(payload[:2], "big") if len(payload) >= 2 else None)
+                break
+            if opcode == 0x9:
+                await self._send_frame(0xA, payload)
+                continue
+            if opcode == 0xA:
+                continue
+            if opcode != 0x0:
+                message_opcode = opcode
+                message = bytearray()
+            message += payload
+            if not fin:
+                continue
+            data = bytes(message)
+            message = None
+            if message_opcode == 0x2:
+                return data
+            try:
+                return data.decode("utf-8")
+            except UnicodeDecodeError:
+                await self.close(WS_CLOSE_INVALID_DATA)
+                break
+        await self.close()
+        return None
+
+    async def close(self, code=None):
+        """Close-Frame senden (mit Statuscode, falls angegeben); danach liefert receive() None."""
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            await self._send_frame(0x8, code.to_bytes(2, "big") if code else b"")
+        except ConnectionError:
+            pass
+
+
+class AsyncStreamServer:
+    """
+    HTTP-Server auf asyncio fuer StreamHub + Flask-App.
+
+    Args:
+        hub (StreamHub): Liefert die JPEGs fuer stream_path
+        app (Flask, optional): WSGI-App fuer alle anderen Pfade
+        stream_path (str): Pfad des MJPEG-Streams
+        select_mode (callable, optional): select_mode(query) -> Modus des Hubs;
+            query ist ein dict mit dem ersten Wert jedes Parameters.
+            Standard: query["mode"], sonst der erste Modus des Hubs
+        wsgi_threads (int): Threads fuer die Flask-Routen
+        websockets (dict, optional): Pfad -> async handler(websocket, query)
+    """
+
+    def __init__(self, hub, app=None, stream_path="/video_feed", select_mode=None,
+                 wsgi_threads=4, websockets=None):
+        self.hub = hub
+        self.app = app
+        self.websockets = dict(websockets or {})
+        self.stream_path = stream_path
+        self.select_mode = select_mode or (lambda query: query.get("mode"))
+        self.executor = ThreadPoolExecutor(max_workers=wsgi_threads, thread_name_prefix="wsgi")
+        self.loop = None
+        self.server = None
+        self.thread = None
+        # Neuestes JPEG pro Modus; das Event wird bei jedem Bild ersetzt
+        self.latest = {}
+        self.events = {}
+
+        # Statistik
+        self.clients = 0
+        self.requests = 0
+        self.frames_sent = 0
+        self.bytes_sent = 0
+
+    # --- Start/Stop ---
+    def run(self, host="0.0.0.0", port=5000):
+        """Blockiert wie app.run()."""
+        asyncio.run(self.serve(host, port))
+
+    def start(self, host="0.0.0.0", port=5000):
+        """Server in einem eigenen Thread starten."""
+        ready = threading.Event()
+        self.thread = threading.Thread(target=lambda: asyncio.run(self.serve(host, port, ready)),
+                                       daemon=True)
+        self.thread.start()
+        ready.wait(5.0)
+
+    def stop(self):
+        if self.loop is not None and self.server is not None:
+            self.loop.call_soon_threadsafe(self.server.close)
+        if self.thread is not None:
+            self.thread.join(timeout=2.0)
+        self.executor.shutdown(wait=False)
+
+    async def serve(self, host, port, ready=None):
+        self.loop = asyncio.get_running_loop()
+        if self.hub is not None:
+            for mode in self.hub.modes:
+                self.latest[mode] = (0, None)
+                self.events[mode] = asyncio.Event()
+            self.hub.add_listener(self._from_hub)
+        self.server = await asyncio.start_server(self._client, host, port, reuse_address=True)
+        print(f"asyncio stream server on http://{host}:{port}")
+        if ready is not None:
+            ready.set()
+        try:
+            async with self.server:
+                await self.server.serve_forever()
+        except asyncio.CancelledError:
+            pass
+
+    # --- Bilder vom Hub ---
+    def _from_hub(self, mode, seq, frame_bytes):
+        # Encoder-Thread: nur an den Event-Loop uebergeben
+        loop = self.loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._frame, mode, seq, frame_bytes)
+
+    def _frame(self, mode, seq, frame_bytes):
+        self.latest[mode] = (seq, frame_bytes)
+        event = self.events[mode]
+        self.events[mode] = asyncio.Event()
+        event.set()
+
+    # --- HTTP ---
+    async def _client(self, reader, writer):
+        try:
+            try:
+                head = await reader.readuntil(b"\r\n\r\n")
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                return
+            lines = head.decode("latin-1").split("\r\n")
+            try:
+                method, target, version = lines[0].split(" ", 2)
+            except ValueError:
+                await self._simple(writer, 400, b"bad request")
+                return
+            headers = {}
+            for line in lines[1:]:
+                if ":" in line:
+                    name, value = line.split(":", 1)
+                    headers[name.strip().lower()] = value.strip()
+            body = b""
+            try:
+                length = int(headers.get("content-length") or 0)
+            except ValueError:
+                length = -1
+            if length < 0:
+                await self._simple(writer, 400, b"bad content-length")
+                return
+            if length > _MAX_BODY:
+                await self._simple(writer, 413, b"request body too large")
+                return
+            if length:
+                body = await reader.readexactly(length)
+
+            self.requests += 1
+            url = urlsplit(target)
+            path = unquote(url.path)
+            query = {k: v[0] for k, v in parse_qs(url.query).items()}
+            if path in self.websockets and headers.get("upgrade", "").lower() == "websocket":
+                await self._websocket(reader, writer, headers, self.websockets[path], query)
+            elif self.hub is not None and path == self.stream_path and method == "GET":
+                await self._stream(writer, self.select_mode(query))
+            elif self.app is not None:
+                await self._wsgi(writer, method, path, url.query, version, headers, body)
+            else:
+                await self._simple(writer, 404, b"not found")
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _simple(self, writer, status, body, content_type="text/plain"):
+        writer.write(f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+                     f"Content-Type: {content_type}\r\nContent-Length: {len(body)}\r\n"
+                     f"Connection: close\r\n\r\n".encode("latin-1") + body)
+        await writer.drain()
+
+    async def _stream(self, writer, mode):
+        mode = self.hub.subscribe(mode)
+        self.clients += 1
+        try:
+            writer.write(f"HTTP/1.1 200 OK\r\nContent-Type: {STREAM_CONTENT_TYPE}\r\n"
+                         f"Cache-Control: no-cache\r\nConnection: close\r\n\r\n".encode("latin-1"))
+            await writer.drain()
+            last_seq = 0
+            while self.hub.running:
+                seq, frame_bytes = self.latest[mode]
+                if seq <= last_seq or frame_bytes is None:
+                    try:
+                        await asyncio.wait_for(self.events[mode].wait(), 1.0)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                last_seq = seq
+                # Langsame Clients ueberspringen Bilder: waehrend drain() wird latest ersetzt
+                send_start = time.perf_counter()
+                writer.write(b"--frame\r\nContent-Type: image/jpeg\r\n\r\n" + frame_bytes
+                             + b"\r\n")
+                await writer.drain()
+                self.hub.send_stage.observe(time.perf_counter() - send_start)
+                self.frames_sent += 1
+                self.bytes_sent += len(frame_bytes)
+        finally:
+            self.clients -= 1
+            self.hub.unsubscribe(mode)
+
+    async def _websocket(self, reader, writer, headers, handler, query):
+        key = headers.get("sec-websocket-key")
+        if not key:
+            await self._simple(writer, 400, b"missing Sec-WebSocket-Key")
+            return
+        accept = base64.b64encode(hashlib.sha1((key + _WEBSOCKET_GUID).encode()).digest())
+        writer.write(b"HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\n"
+                     b"Connection: Upgrade\r\nSec-WebSocket-Accept: " + accept + b"\r\n\r\n")
+        await writer.drain()
+        websocket = WebSocket(reader, writer)
+        self.clients += 1
+        try:
+            await handler(websocket, query)
+        finally:
+            self.clients -= 1
+            await websocket.close()
+
+    async def _wsgi(self, writer, method, path, query, version, headers, body):
+        environ = {
+            "REQUEST_METHOD": method,
+            "SCRIPT_NAME": "",
+            "PATH_INFO": path,
+            "QUERY_STRING": query,
+            "SERVER_NAME": "localhost",
+            "SERVER_PORT": "80",
+            "SERVER_PROTOCOL": version,
+            "REMOTE_ADDR": (writer.get_extra_info("peername") or ("", 0))[0],
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": "http",
+            "wsgi.input": io.BytesIO(body),
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": False,
+            "wsgi.run_once": False,
+        }
+        for name, value in headers.items():
+            key = name.upper().replace("-", "_")
+            if key in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+                environ[key] = value
+            else:
+                environ["HTTP_" + key] = value
+        if "HTTP_HOST" in environ:
+            environ["SERVER_NAME"] = environ["HTTP_HOST"].split(":")[0]
+
+        response = {}
+
+        def start_response(status, response_headers, exc_info=None):
+            response["status"] = status
+            response["headers"] = response_headers
+            return lambda data: None
+
+        run = self.loop.run_in_executor
+        result = None
+        iterator = None
+        headers_sent = False
+        try:
+            result = await run(self.executor, self.app, environ, start_response)
+            iterator = iter(result)
+            # Erst nach dem ersten Teil steht der Status fest (z.B. bei Generatoren)
+            chunk = await run(self.executor, next, iterator, None)
+            lines = [f"HTTP/1.1 {response['status']}"]
+            lines += [f"{name}: {value}" for name, value in response["headers"]
+                      if name.lower() != "connection"]
+            lines.append("Connection: close")
+            writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+            headers_sent = True
+            while chunk is not None:
+                if method != "HEAD":
+                    writer.write(chunk)
+                await writer.drain()
+                # Streaming-Antworten (z.B. ein gen_frames()) laufen weiter im Thread-Pool
+                chunk = await run(self.executor, next, iterator, None)
+        except ConnectionError:
+            raise
+        except Exception:
+            # Fehler in der App oder im Generator; nach dem Header bleibt nur Abbrechen
+            traceback.print_exc(file=sys.stderr)
+            if not headers_sent:
+                await self._simple(writer, 500, b"internal server error")
+        finally:
+            close = getattr(result, "close", None) or getattr(iterator, "close", None)
+            if close is not None:
+                try:
+                    await run(self.executor, close)
+                except Exception:
+                    traceback.print_exc(file=sys.stderr)
+
+    def get_stats(self):
+        return {
+            "clients": self.clients,
+            "requests": self.requests,
+            "frames_sent": self.frames_sent,
+            "bytes_sent": self.bytes_sent,
+        }
+
+
+def run_server(app, hub=None, host="0.0.0.0", port=5000, select_mode=None, websockets=None,
+               placement=None):
+    """
+    Flask-App starten; STREAM_SERVER=asyncio nimmt den AsyncStreamServer.
+
+    Args:
+        app (Flask): App mit allen Routen
+        hub (StreamHub, optional): Liefert /video_feed im asyncio-Modus
+        select_mode (callable, optional): Siehe AsyncStreamServer
+        websockets (dict, optional): WebSocket-Endpunkte, nur im asyncio-Modus
+            (die Seiten fallen unter Flask auf Polling zurueck)
+        placement (ThreadPlacement, optional): Vorgaben der Stufe "http" fuer
+            den Hauptthread; Request- und WSGI-Threads erben sie
+    """
+    if placement is not None:
+        placement.apply("http")
+    if os.environ.get("STREAM_SERVER", "flask") == "asyncio":
+        AsyncStreamServer(hub, app, select_mode=select_mode,
+                          websockets=websockets).run(host, port)
+    else:
+        app.run(host=host, port=port, threaded=True)
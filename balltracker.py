@@ -1,151 +1,519 @@
 import time
 import threading
-from picamera2 import Picamera2
 import cv2
-import numpy as np
-from GSCrop import set_camera_crop
+from GSCrop import CropController
+from framering import FrameRing
+from roi import RoiPredictor, detect_with_roi
+from yuv import CAPTURE_FORMAT_YUV420, luma
+from colorlut import ColorClassifier, to_frame_coords
+from blob import BlobDetector
+from hough import AdaptiveHoughDetector
+from framesource import open_frame_source, set_source_crop
+from metrics import Metrics
+from sensortime import SensorTiming, capture_with_metadata, now_ns
+from positionstream import PositionStream
+from sharedpositions import SharedPositionRing
+from parallelhough import ParallelHoughDetector
+from motiongate import MotionGate, gated
+from scheduler import DeadlineScheduler, PACING_FIXED
+from threadplacement import ThreadPlacement
+
+
+# Wartezeit, wenn eine eigene Bildquelle None liefert (verdoppelt sich bis zum Maximum)
+CAPTURE_IDLE_MIN_S = 0.0005
+CAPTURE_IDLE_MAX_S = 0.01
 
 
 class Balltracker:
 
-    def __init__(self, width=400, height=400):
-        
+    def __init__(self, width=400, height=400, frame_source=None, ring_slots=3,
+                 capture_format=None, recorder=None, shared_positions=None,
+                 hough_workers=0, motion_gate=False, pacing="frames", tracking_period_us=None,
+                 overrun="skip", placement=None):
+        """
+        Args:
+            width (int): Breite des Sensor-Crops
+            height (int): Hoehe des Sensor-Crops
+            frame_source (optional): Bildquelle mit Picamera2-API (z.B.
+                SyntheticSource, ReplaySource) oder callable, das bei jedem
+                Aufruf ein Bild im capture_format liefert. Wenn None, wird
+                open_frame_source() verwendet (FRAME_SOURCE, Standard Picamera2).
+            ring_slots (int): Anzahl Slots im Ringpuffer zwischen Capture und Detektion
+            capture_format (str, optional): None fuer RGB, "YUV420" fuer den
+                Luma-Pfad (Hough ohne Farbkonvertierung)
+            recorder (FrameRecorder, optional): Bekommt jedes Rohbild im
+                Capture-Thread und das Detektionsergebnis fuer Auto-Trigger
+            shared_positions (str or bool, optional): Positionen zusaetzlich in
+                einen Shared-Memory-Ring dieses Namens schreiben (True fuer
+                "balltracker_positions"), lesbar mit SharedPositionReader
+            hough_workers (int): Hough in so vielen Worker-Prozessen ausfuehren
+                (0 = im Detektions-Thread); lohnt sich, wenn ein Detektor
+                langsamer als der Sensor ist. Die Worker starten per fork vor
+                open_frame_source(); eine schon geoeffnete Kamera als
+                frame_source wird dabei mitkopiert
+            motion_gate (bool or MotionGate): Detektoren nur in Bereichen mit
+                Bewegung ausfuehren, ohne Bewegung gilt die letzte Detektion
+                weiter (nur im Detektions-Thread, nicht mit hough_workers)
+            pacing (str): Takt der Detektion: "frames" (jedes neue Kamerabild),
+                "fixed" (feste Rate mit absoluten Deadlines) oder "free" (ohne Warten)
+            tracking_period_us (int, optional): Takt bei "fixed" bzw. Zeitbudget
+                pro Zyklus; Standard 10000 bei "fixed", sonst die Bilddauer
+            overrun (str): Bei Ueberlauf "skip" (Takte auslassen), "degrade"
+                (keine Ganzbildsuche nach Fehlschlag im ROI, bis die Zyklen
+                wieder passen) oder "alert" (Warnung, hoechstens einmal pro Sekunde)
+            placement (ThreadPlacement, dict or str, optional): Kerne, SCHED_FIFO,
+                nice und OpenCV-Threads fuer die Stufen "capture" und "detect";
+                Standard ist THREAD_PLACEMENT aus der Umgebung
+        """
         self.width = width
         self.height = height
-        self.tracking_task_period_us = 10000
+        self.capture_format = capture_format
+        if tracking_period_us is None:
+            tracking_period_us = 10000 if pacing == PACING_FIXED else 2000
+        self.tracking_task_period_us = tracking_period_us
         self.picam2 = None
+        self.frame_source = None
         self.thread = None
+        self.capture_thread = None
         self.running = False
         self.mode = "color"
         self.mode_lock = threading.Lock()
-        self.lock = threading.Lock()
-        self.position = (0, 0, 0)
-
-
+        # Positionen mit Sensorzeit und Sequenznummer, Schreibpfad ohne Lock
+        self.positions = PositionStream()
+        # Dieselben Samples fuer Leser in anderen Prozessen
+        self.shared_positions = None
+        if shared_positions:
+            if shared_positions is True:
+                self.shared_positions = SharedPositionRing()
+            else:
+                self.shared_positions = SharedPositionRing(shared_positions)
+        # Trefferquote der letzten Bilder (EWMA) und Formguete der letzten Detektion
+        self.hit_rate = 0.0
+        self.last_shape = 1.0
+
+        # Rohbilder fuer Aufnahmen mit Vorlauf
+        self.recorder = recorder
+        _, _, crop_x, crop_y = CropController.snap(width, height)
+        self.crop = (crop_x, crop_y, width, height)
+
+        # Capture -> Detektion, immer nur das neueste Bild wird verarbeitet
+        self.ring = FrameRing(ring_slots)
+        self.frames_processed = 0
+
+        # Latenz pro Schritt; Ueberlauf = Zyklus laenger als tracking_task_period_us
+        self.metrics = Metrics(frame_budget=self.tracking_task_period_us / 1_000_000.0)
+        self.capture_stage = self.metrics.stage("capture")
+        self.convert_stage = self.metrics.stage("convert")
+        self.detect_stage = self.metrics.stage("detect")
+        self.metrics.counter("frames_dropped_total", "Frames lost on the way", {"where": "ring"},
+                             fn=lambda: self.ring.frames_dropped)
+        # Echte Bildrate und verlorene Bilder aus den Sensor-Zeitstempeln
+        self.timing = SensorTiming(frame_duration_us=2000, metrics=self.metrics)
+        # Kerne und Prioritaet pro Thread, CPU-Zeit und Kontextwechsel in get_stats()
+        if isinstance(placement, ThreadPlacement):
+            self.placement = placement
+        elif placement:
+            self.placement = ThreadPlacement(placement, self.metrics)
+        else:
+            self.placement = ThreadPlacement.from_env(self.metrics)
+        # Takt der Detektionsschleife, Ueberlaeufe mit Histogramm statt print
+        self.degraded = False
+        self.scheduler = DeadlineScheduler(self.tracking_task_period_us / 1_000_000.0, pacing,
+                                           overrun, metrics=self.metrics,
+                                           on_degrade=self._set_degraded)
+
+        # Suche zuerst im Fenster um die vorhergesagte Ballposition
+        self.roi_tracking = True
+        self.roi = RoiPredictor()
+
+        # Nur dort suchen, wo sich seit dem Hintergrundmodell etwas geaendert hat
+        self.motion_gate = None
+        if motion_gate:
+            self.motion_gate = motion_gate if isinstance(motion_gate, MotionGate) else MotionGate()
+            for result in ("unchanged", "gated", "full"):
+                self.metrics.counter("motion_gate_frames_total", "Frames by motion gate decision",
+                                     {"result": result},
+                                     fn=lambda result=result: getattr(self.motion_gate,
+                                                                      "frames_" + result))
+        self.last_detection = (0, 0, 0)
+
+        # Radiusband folgt dem zuletzt gefundenen Radius
+        self.hough = AdaptiveHoughDetector(min_radius=20, max_radius=100, dp=1.5,
+                                           min_dist=50, param1=100, param2=40)
+        # Optional auf mehrere Kerne verteilt, Ergebnisse kommen in Bildreihenfolge zurueck
+        self.hough_pool = None
+        if hough_workers:
+            # Vor open_frame_source(): fork kopiert sonst die Threads und fds von Picamera2
+            self.hough_pool = ParallelHoughDetector(self.hough, (height, width),
+                                                    workers=hough_workers, metrics=self.metrics)
+
+        if frame_source is None:
+            self.picam2 = open_frame_source()
+        elif hasattr(frame_source, "capture_array"):
+            self.picam2 = frame_source
+        else:
+            self.frame_source = frame_source
+
+        # Farbmaske per Lookup-Tabelle direkt im Kameraformat
+        pixel_format = "YUV420" if capture_format == CAPTURE_FORMAT_YUV420 else "RGB"
+        self.color_classifier = ColorClassifier(pixel_format=pixel_format)
+        # Rundester Fleck der Maske per connectedComponents
+        self.blob_detector = BlobDetector()
 
         # --- Kamera vorbereiten ---
         # Sensor auf hohen FPS-Modus croppen
-        set_camera_crop(width, height)
+        if self.picam2 is not None:
+            set_source_crop(self.picam2, width, height)
 
     def start_balltracker(self, mode):
 
         with self.mode_lock:
             self.mode = mode
 
-        # Kamera initialisieren
-        self.picam2 = Picamera2()
-        video_config = self.picam2.create_video_configuration(
-            main={"size": (self.width, self.height)},
-            raw=None,
-            controls={
-                "NoiseReductionMode": 0,  # deaktiviert Noise Reduction
-                "FrameDurationLimits": (2000, 2000),  # 500 fps theoretisch
-            }
-        )
+        if self.frame_source is None:
+            # Kamera (oder Ersatzquelle) initialisieren
+            main = {"size": (self.width, self.height)}
+            if self.capture_format is not None:
+                main["format"] = self.capture_format
+            video_config = self.picam2.create_video_configuration(
+                main=main,
+                raw=None,
+                controls={
+                    "NoiseReductionMode": 0,  # deaktiviert Noise Reduction
+                    "FrameDurationLimits": (2000, 2000),  # 500 fps theoretisch
+                }
+            )
+
+            self.picam2.configure(video_config)
+            self.picam2.start()
+            self.frame_source = self.picam2.capture_array
 
-        self.picam2.configure(video_config)
-        self.picam2.start()
         self.running = True
+        self.capture_thread = threading.Thread(
+            target=self._capture_loop,
+            name="capture",
+            daemon=True
+        )
         self.thread = threading.Thread(
             target=self._detection_loop,
+            name="detect",
             daemon=True
         )
+        # Detektion zuerst: endet die Quelle sofort, wartet _finish() auf einen laufenden Thread
         self.thread.start()
+        self.capture_thread.start()
 
         
 
 
     # --- Bildverarbeitung ---
-    def _detect_ball_hough(self, frame):
-        MIN_RADIUS = 20
-        MAX_RADIUS = 100
+    def _detect_ball_hough(self, frame, roi=None):
         x = y = r = 0
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        blurred = cv2.medianBlur(gray, 5)
-        circles = cv2.HoughCircles(blurred, cv2.HOUGH_GRADIENT, dp=1.5, minDist=50,
-                                param1=100, param2=40, minRadius=MIN_RADIUS, maxRadius=MAX_RADIUS)
-        if circles is not None:
-            circles = np.uint16(np.around(circles))
-            c = circles[0][0]
-            cv2.circle(frame, (c[0], c[1]), c[2], (0, 255, 0), 2)
-            cv2.circle(frame, (c[0], c[1]), 2, (0, 0, 255), 3)
-            x = c[0]
-            y = c[1]
-            r = c[2]
+        found, dimensions = self.hough.detect(frame, roi)
+        self.last_shape = 1.0
+        if found:
+            x, y, r = dimensions
+            if frame.ndim == 3:
+                cv2.circle(frame, (int(x), int(y)), int(r), (0, 255, 0), 2)
+                cv2.circle(frame, (int(x), int(y)), 2, (0, 0, 255), 3)
         return frame, x, y, r
 
-    def _detect_ball_color(self, frame):
+    def _detect_ball_color(self, frame, roi=None):
         x = y = radius = 0
-        hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
-        lower_orange = np.array([5, 150, 150])
-        upper_orange = np.array([25, 255, 255])
-        mask = cv2.inRange(hsv, lower_orange, upper_orange)
-        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-
-        if contours:
-            largest = max(contours, key=cv2.contourArea)
-            ((x, y), radius) = cv2.minEnclosingCircle(largest)
-            if radius > 5:
-                center = (int(x), int(y))
-                cv2.circle(frame, center, int(radius), (0, 255, 0), 2)
-                cv2.circle(frame, center, 2, (0, 0, 255), 3)
+        # Maske in halber Aufloesung aus dem Rohbild, ohne HSV-Konvertierung
+        mask, scale, offset = self.color_classifier.mask(frame, roi, self.width, self.height)
+        found, dimensions, roundness = self.blob_detector.find(mask)
+
+        if found:
+            # Rundheit des Flecks: 1 fuer eine volle Kreisscheibe
+            self.last_shape = roundness
+            x, y, radius = to_frame_coords(*dimensions, scale, offset)
 
         return frame, x, y, radius
-    
+
+    def set_color_thresholds(self, lower, upper):
+        """
+        HSV-Grenzen der Farbdetektion zur Laufzeit aendern.
+
+        Args:
+            lower (tuple): Untere HSV-Grenze (OpenCV-Skala, H 0-179)
+            upper (tuple): Obere HSV-Grenze
+        """
+        self.color_classifier.set_thresholds(lower, upper)
+
 
 
     #test function to test performance without ball detection
-    def _detect_ball_color_test(self, frame):
+    def _detect_ball_color_test(self, frame, roi=None):
         x = y = radius = 0
         return frame, x, y, radius
 
+    def _detect_in_roi(self, detect, frame, regions=None):
+        # Adapter auf die Signatur von detect_with_roi: (frame, found, (x, y, r))
+        def detect_found(frame, roi=None):
+            frame, x, y, r = detect(frame, roi)
+            return frame, r > 5, (x, y, r)
+
+        # Ganzbildsuchen nur in den Bewegungsfenstern
+        detect_found = gated(detect_found, regions)
+        if self.roi_tracking:
+            # Unter Last (overrun="degrade") keine Ganzbildsuche direkt nach einem ROI-Fehlschlag
+            frame, found, (x, y, r) = detect_with_roi(detect_found, frame, self.roi,
+                                                       size=(self.width, self.height),
+                                                       full_frame=not self.degraded)
+        else:
+            frame, found, (x, y, r) = detect_found(frame)
+        if r is None:
+            x = y = r = 0
+        return frame, x, y, r
 
+    def _set_degraded(self, degraded):
+        self.degraded = degraded
+
+    def _capture_loop(self):
+        self.placement.apply("capture")
+        # Bilder so schnell holen, wie die Kamera sie liefert
+        idle_s = CAPTURE_IDLE_MIN_S
+        while self.running:
+            start = time.perf_counter()
+            try:
+                frame, timestamp = self._capture()
+            except EOFError:
+                # Replay ohne loop ist zu Ende: Leser aufwecken statt ewig zu warten
+                print("frame source finished, stopping tracker")
+                self._finish()
+                return
+            if frame is None:
+                # Quelle hat (noch) kein Bild: kurz warten statt den Kern zu blockieren,
+                # ohne Eintrag im Capture-Histogramm
+                time.sleep(idle_s)
+                idle_s = min(2 * idle_s, CAPTURE_IDLE_MAX_S)
+                continue
+            idle_s = CAPTURE_IDLE_MIN_S
+            self.capture_stage.observe(time.perf_counter() - start)
+            self.ring.put(frame, timestamp)
+            if self.recorder is not None:
+                self.recorder.add(frame, timestamp / 1e9, crop=self.crop)
+
+    def _finish(self):
+        # Aus dem Capture-Thread: Detektion auslaufen lassen, dann Positionen schliessen
+        self.running = False
+        self.ring.close()
+        self.thread.join()
+        self.positions.close()
+
+    def _capture(self):
+        if self.picam2 is not None:
+            frame, metadata = capture_with_metadata(self.picam2)
+            self.timing.update(metadata)
+            return frame, metadata["SensorTimestamp"]
+        # Eigene Bildquelle ohne Metadaten: Zeitpunkt der Abholung
+        return self.frame_source(), now_ns()
 
     def _detection_loop(self):
+        self.placement.apply("detect")
+        last_seq = 0
 
         while self.running:
-            # Start timer (like main_task_timer.reset() in C++)
-            cycle_start_time = time.perf_counter()
-
-            frame = self.picam2.capture_array()
-            frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
+            # Bei fester Rate bis zur naechsten Deadline, sonst sofort
+            self.scheduler.wait()
+            # Auf ein neues Bild warten, veraltete Bilder werden uebersprungen
+            seq, raw = self.ring.get_latest(last_seq, timeout=0.5)
+            if raw is None:
+                if self.hough_pool is not None and self.hough_pool.in_flight:
+                    self._publish_parallel(self.hough_pool.collect())
+                continue
+            last_seq = seq
+            timestamp = self.ring.read_timestamp()
+
+            cycle_start_time = self.scheduler.start()
 
             with self.mode_lock:
                 current_mode = self.mode
 
+            if self.hough_pool is not None:
+                if current_mode == "hough":
+                    # Bild an die Worker, Ergebnisse frueherer Bilder in Reihenfolge veroeffentlichen
+                    self._submit_parallel(raw, timestamp)
+                    self.ring.release()
+                    self._publish_parallel(self.hough_pool.collect())
+                    self.metrics.frame_done(time.perf_counter() - cycle_start_time)
+                    self.scheduler.done()
+                    continue
+                if self.hough_pool.in_flight:
+                    # Moduswechsel: aeltere Hough-Ergebnisse zuerst
+                    self._publish_parallel(self.hough_pool.drain())
+
+            if current_mode == "color":
+                # Lookup-Tabelle arbeitet direkt auf dem Rohbild im Ringpuffer
+                frame = raw
+            elif self.capture_format == CAPTURE_FORMAT_YUV420:
+                # Y-Ebene direkt aus dem Ringpuffer, Slot erst nach der Detektion freigeben
+                frame = luma(raw, self.width, self.height)
+            else:
+                frame = cv2.cvtColor(raw, cv2.COLOR_RGB2BGR)
+                self.ring.release()
+                self.convert_stage.observe(time.perf_counter() - cycle_start_time)
+
             if current_mode == "hough":
-                frame, x, y, r = self._detect_ball_hough(frame)
+                detect = self._detect_ball_hough
             elif current_mode == "color":
-                frame, x, y, r = self._detect_ball_color(frame)
+                detect = self._detect_ball_color
             else:
                 raise RuntimeError("no or wrong mode selected")
 
-
-
-            #To Do: calculation to get height / z from radius
-            z = round(r,0) #change as soon as height is defined
-            x = round(x,0)
-            y = round(y,0)
-
-
-
-            # Thread-sicher speichern
-            with self.lock:
-                self.position = (x, y, z)
-
-            tracking_task_elapsed_time_us = (time.perf_counter() - cycle_start_time) * 1_000_000.0
-            remaining_us = self.tracking_task_period_us - tracking_task_elapsed_time_us
-
-            if remaining_us < 0:
-                print("Warning: Main task took longer than main_task_period_ms")
+            detect_start = time.perf_counter()
+            regions = None
+            if self.motion_gate is not None:
+                # Vergleich auf der Y-Ebene bzw. dem gruenen Kanal, ein Ergebnis pro Bild
+                gray = luma(raw, self.width, self.height) \
+                    if self.capture_format == CAPTURE_FORMAT_YUV420 else frame
+                regions = self.motion_gate.regions(gray, timestamp)
+            if regions == []:
+                # Keine Bewegung: letzte Detektion gilt weiter, kein Detektor
+                x, y, r = self.last_detection
+            elif self.roi_tracking or regions is not None:
+                frame, x, y, r = self._detect_in_roi(detect, frame, regions)
             else:
-                time.sleep(remaining_us / 1_000_000.0)
-
-
-    def get_position(self):
-        with self.lock:
-            return self.position
+                frame, x, y, r = detect(frame)
+            self.last_detection = (x, y, r)
+            self.ring.release()
+            self.detect_stage.observe(time.perf_counter() - detect_start)
+            self._publish_detection(x, y, r, timestamp)
+
+            self.metrics.frame_done(time.perf_counter() - cycle_start_time)
+            # Ueberlauf zaehlen, naechste Deadline aus der vorigen (keine Drift)
+            self.scheduler.done()
+
+
+    def _publish_detection(self, x, y, r, timestamp):
+        found = r > 5
+        self.metrics.detection(found)
+        self.hit_rate += 0.1 * (found - self.hit_rate)
+
+
+
+        #To Do: calculation to get height / z from radius
+        z = round(r,0) #change as soon as height is defined
+        x = round(x,0)
+        y = round(y,0)
+
+
+
+        # Ohne Lock veroeffentlichen: unveraenderliches Sample, nur die Referenz wird getauscht
+        latency = self.timing.position_ready(timestamp)
+        confidence = round(self.hit_rate * self.last_shape, 3) if found else 0.0
+        sample = self.positions.publish(x, y, z, r, confidence, found, timestamp,
+                                        round(latency * 1000.0, 3) if latency is not None else None)
+        if self.shared_positions is not None:
+            self.shared_positions.write(sample)
+        self.frames_processed += 1
+        if self.recorder is not None:
+            self.recorder.update_detection(found)
+
+    # --- Parallele Hough-Detektion ---
+    def _submit_parallel(self, raw, timestamp):
+        roi = self.roi.window(self.width, self.height) if self.roi_tracking else None
+        if self.capture_format == CAPTURE_FORMAT_YUV420:
+            self.hough_pool.submit(luma(raw, self.width, self.height), roi, timestamp)
+        else:
+            # RGB direkt als Graustufen in den Shared-Memory-Slot
+            self.hough_pool.submit(raw, roi, timestamp, convert=cv2.COLOR_RGB2GRAY)
+
+    def _publish_parallel(self, results):
+        for result in results:
+            x, y, r = result.dimensions if result.found else (0, 0, 0)
+            self.detect_stage.observe(result.compute_ms / 1000.0)
+            # Statistik und Vorhersage wie in detect_with_roi
+            if result.roi is not None:
+                if result.roi_hit:
+                    self.roi.roi_hits += 1
+                else:
+                    self.roi.roi_misses += 1
+            if not result.roi_hit:
+                self.roi.full_frame_searches += 1
+            self.roi.update(result.found, *result.dimensions)
+            self.last_shape = 1.0
+            self._publish_detection(x, y, r, result.timestamp)
+
+    def get_position(self, timing=False):
+        """
+        Letzte Ballposition (x, y, z).
+
+        Args:
+            timing (bool): Zusaetzlich Zeitinformationen zur Position liefern
+
+        Returns:
+            tuple: (x, y, z) oder mit timing ((x, y, z), info); info enthaelt
+                sensor_timestamp_ns, latency_ms (Belichtungsstart bis Position),
+                sensor_fps und frames_dropped
+        """
+        sample = self.positions.latest
+        position = (sample.x, sample.y, sample.z) if sample is not None else (0, 0, 0)
+        if not timing:
+            return position
+        return position, {
+            "seq": sample.seq if sample is not None else 0,
+            "sensor_timestamp_ns": sample.timestamp_ns if sample is not None else None,
+            "latency_ms": sample.latency_ms if sample is not None else None,
+            "confidence": sample.confidence if sample is not None else 0.0,
+            "radius": sample.radius if sample is not None else 0,
+            "sensor_fps": round(self.timing.sensor_fps(), 2),
+            "frames_dropped": self.timing.frames_dropped,
+        }
+
+    # --- Positions-Stream ---
+    def wait_next(self, timeout=None, after=None):
+        """
+        Blockiert bis zur naechsten Position.
+
+        Args:
+            timeout (float, optional): Maximale Wartezeit in Sekunden
+            after (int, optional): seq des zuletzt gesehenen Samples (Standard: aktuelles)
+
+        Returns:
+            PositionSample: (seq, timestamp_ns, x, y, z, radius, confidence, found,
+                latency_ms) oder None bei Timeout
+        """
+        return self.positions.wait_next(timeout, after)
+
+    def samples(self, timeout=None):
+        """Iterator ueber jede neue Position in Reihenfolge (endet nach timeout ohne Daten)."""
+        return self.positions.samples(timeout)
+
+    def subscribe(self, callback):
+        """callback(sample) fuer jede neue Position; gibt eine Funktion zum Abmelden zurueck."""
+        return self.positions.subscribe(callback)
+
+    def get_stats(self):
+        """Zaehler fuer erfasste, verworfene und verarbeitete Bilder."""
+        return {
+            "frames_captured": self.ring.frames_written,
+            "frames_dropped": self.ring.frames_dropped,
+            "frames_processed": self.frames_processed,
+            "hough": self.hough.get_stats(),
+            "blob": self.blob_detector.get_stats(),
+            "motion_gate": self.motion_gate.get_stats() if self.motion_gate is not None else None,
+            "latency": self.metrics.summary(),
+            "timing": self.timing.get_stats(),
+            "scheduler": self.scheduler.get_stats(),
+            "threads": self.placement.get_stats(),
+            "positions": self.positions.get_stats(),
+            "hough_pool": self.hough_pool.get_stats() if self.hough_pool is not None else None,
+            "shared_positions": (self.shared_positions.get_stats()
+                                 if self.shared_positions is not None else None),
+        }
 
     def stop(self):
         self.running = False
-        self.thread.join()    
\ No newline at end of file
+        self.ring.close()
+        self.capture_thread.join()
+        self.thread.join()
+        self.positions.close()
+        if self.hough_pool is not None:
+            self.hough_pool.close()
+        if self.shared_positions is not None:
+            self.shared_positions.close()
+        if self.picam2 is not None:
+            self.picam2.stop()
+            self.frame_source = None
@@ -0,0 +1,672 @@
+"""
+Offline-Benchmark fuer Detektoren und Tracking-Pipeline (ohne Kamera)
+
+Laeuft auf jedem Linux-Rechner mit OpenCV und NumPy. Bilder kommen aus
+synthetischen Ballsequenzen mit bekannter Ground Truth oder aus
+aufgenommenen Clips (Video oder Bildordner, optional mit CSV frame,x,y,r).
+
+Beispiele:
+    python benchmark.py
+    python benchmark.py --frames 500 --background clutter --output results.json
+    python benchmark.py --clip wurf.avi --detectors hough color
+    python benchmark.py --export-synthetic wurf.avi
+    python benchmark.py --output neu.json --compare alt.json
+"""
+import argparse
+import datetime
+import glob
+import json
+import os
+import platform
+import resource
+import subprocess
+import time
+import tracemalloc
+import cv2
+import numpy as np
+from blob import BlobDetector
+from colorlut import ColorClassifier, to_frame_coords
+from framering import FrameRing
+from hough import AdaptiveHoughDetector
+from parallelhough import ParallelHoughDetector
+from pyramid import PyramidHoughDetector
+from roi import RoiPredictor, detect_with_roi
+from scheduler import PACINGS, OVERRUN_POLICIES
+from yuv import CAPTURE_FORMAT_YUV420, luma, yuv420_to_bgr
+
+# Gleiche Parameter wie in den Tracking-Skripten
+MIN_RADIUS = 20
+MAX_RADIUS = 100
+BALL_BGR = (0, 140, 255)
+
+
+# --- Bildquellen ---
+def synthetic_sequence(frames=300, width=400, height=400, radius=30, background="smooth",
+                       noise=6, dropout=0.05, seed=0):
+    """
+    Prozedural erzeugte Sequenz eines springenden Balls.
+
+    Der Ball fliegt auf Parabelbahnen mit Abprallen am Bildrand, der Radius
+    schwankt leicht (Hoehe). In Luecken der Laenge ~ dropout * frames fehlt
+    der Ball (Wiederfinden nach Verlust).
+
+    Returns:
+        tuple: (Liste BGR-Bilder, Liste Ground Truth (x, y, r) oder None)
+    """
+    rng = np.random.default_rng(seed)
+    bg = _background(background, width, height, rng)
+
+    x, y = width * 0.3, height * 0.3
+    vx, vy = width * 0.012, 0.0
+    gravity = height * 0.0015
+    gap_len = int(frames * dropout)
+    gap_start = frames // 2 if gap_len else frames
+
+    images, truth = [], []
+    shift = 4  # Subpixel-Zeichnen mit 1/16 Pixel
+    for i in range(frames):
+        r = radius * (1.0 + 0.1 * np.sin(i / 25.0))
+        vy += gravity
+        x += vx
+        y += vy
+        if x < r or x > width - r:
+            vx = -vx
+            x = min(max(x, r), width - r)
+        if y > height - r:
+            vy = -abs(vy) * 0.95
+            y = height - r
+
+        img = bg.copy()
+        if gap_start <= i < gap_start + gap_len:
+            truth.append(None)
+        else:
+            center = (int(round(x * (1 << shift))), int(round(y * (1 << shift))))
+            cv2.circle(img, center, int(round(r * (1 << shift))), BALL_BGR, -1,
+                       cv2.LINE_AA, shift)
+            # Leichte Schattierung, damit die Kante nicht ideal ist
+            highlight = (int(round((x - r / 3) * (1 << shift))), int(round((y - r / 3) * (1 << shift))))
+            cv2.circle(img, highlight, int(round(r / 3 * (1 << shift))), (60, 190, 255), -1,
+                       cv2.LINE_AA, shift)
+            truth.append((round(x * 16) / 16, round(y * 16) / 16, round(r * 16) / 16))
+        if noise:
+            img = cv2.add(img, rng.integers(0, noise, img.shape, dtype=np.uint8))
+        images.append(img)
+    return images, truth
+
+
+def _background(kind, width, height, rng):
+    if kind == "smooth":
+        gray = cv2.GaussianBlur(rng.integers(40, 110, (height, width), dtype=np.uint8), (0, 0), 6)
+        return cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
+    if kind == "clutter":
+        # Viele Kanten fuer Hough, aber entsaettigt, damit nichts orange ist
+        img = np.full((height, width, 3), 90, np.uint8)
+
+        def color():
+            return tuple(int(v) for v in int(rng.integers(0, 220)) + rng.integers(0, 25, 3))
+
+        for _ in range(40):
+            p1 = tuple(int(v) for v in rng.integers(0, max(width, height), 2))
+            p2 = tuple(int(v) for v in rng.integers(0, max(width, height), 2))
+            cv2.line(img, p1, p2, color(), 2)
+        for _ in range(10):
+            p1 = tuple(int(v) for v in rng.integers(0, max(width, height), 2))
+            p2 = tuple(int(v) for v in rng.integers(0, max(width, height), 2))
+            cv2.rectangle(img, p1, p2, color(), -1)
+        return img
+    raise ValueError(f"unknown background {kind}")
+
+
+def load_clip(path, max_frames=None):
+    """
+    Aufgenommenen Clip laden (Video oder Ordner mit Bildern).
+
+    Liegt neben dem Clip eine CSV-Datei gleichen Namens (frame,x,y,r; leeres x
+    = kein Ball), wird sie als Ground Truth verwendet.
+
+    Returns:
+        tuple: (Liste BGR-Bilder, Liste Ground Truth oder None pro Bild)
+    """
+    images = []
+    if os.path.isdir(path):
+        for name in sorted(glob.glob(os.path.join(path, "*"))):
+            img = cv2.imread(name)
+            if img is not None:
+                images.append(img)
+            if max_frames and len(images) >= max_frames:
+                break
+        csv_path = path.rstrip("/") + ".csv"
+    else:
+        cap = cv2.VideoCapture(path)
+        while not max_frames or len(images) < max_frames:
+            ok, img = cap.read()
+            if not ok:
+                break
+            images.append(img)
+        cap.release()
+        csv_path = os.path.splitext(path)[0] + ".csv"
+    if not images:
+        raise RuntimeError(f"no frames in {path}")
+
+    truth = [None] * len(images)
+    if os.path.exists(csv_path):
+        with open(csv_path) as f:
+            for line in f:
+                parts = line.strip().split(",")
+                if len(parts) < 4 or not parts[0].isdigit():
+                    continue  # Kopfzeile
+                i = int(parts[0])
+                if i < len(truth) and parts[1]:
+                    truth[i] = (float(parts[1]), float(parts[2]), float(parts[3]))
+    else:
+        truth = None
+    return images, truth
+
+
+def export_clip(path, images, truth, fps=30):
+    """Sequenz als MJPG-Video plus CSV speichern, z.B. fuer Vergleiche mit anderen Versionen."""
+    h, w = images[0].shape[:2]
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), fps, (w, h))
+    for img in images:
+        writer.write(img)
+    writer.release()
+    with open(os.path.splitext(path)[0] + ".csv", "w") as f:
+        f.write("frame,x,y,r\n")
+        for i, t in enumerate(truth):
+            f.write(f"{i},,,\n" if t is None else f"{i},{t[0]},{t[1]},{t[2]}\n")
+
+
+def to_capture_format(images, capture_format):
+    """BGR-Bilder in das Kameraformat der Skripte umwandeln (nicht Teil der Messung)."""
+    if capture_format == CAPTURE_FORMAT_YUV420:
+        return [cv2.cvtColor(img, cv2.COLOR_BGR2YUV_I420) for img in images]
+    if capture_format == "RGB":
+        return [cv2.cvtColor(img, cv2.COLOR_BGR2RGB) for img in images]
+    return images
+
+
+# --- Detektoren ---
+def make_detectors(capture_format, width, height):
+    """
+    Detektoren wie in den Skripten, alle mit der Signatur
+    detect(frame, roi=None) -> (found, (x, y, r)) auf einem Bild im Kameraformat.
+    """
+    yuv = capture_format == CAPTURE_FORMAT_YUV420
+
+    def gray_of(frame):
+        if yuv:
+            return luma(frame, width, height)
+        code = cv2.COLOR_RGB2GRAY if capture_format == "RGB" else cv2.COLOR_BGR2GRAY
+        return cv2.cvtColor(frame, code)
+
+    def hough_detector(**kwargs):
+        detector = AdaptiveHoughDetector(MIN_RADIUS, MAX_RADIUS, dp=1.5, min_dist=50,
+                                         param1=100, param2=40, **kwargs)
+
+        def detect(frame, roi=None):
+            return detector.detect(gray_of(frame), roi)
+        detect.stats = detector.get_stats
+        return detect
+
+    pyramid = PyramidHoughDetector(MIN_RADIUS, MAX_RADIUS, dp=1.5, min_dist=50,
+                                   param1=100, param2=30)
+
+    def detect_pyramid(frame, roi=None):
+        return pyramid.detect(gray_of(frame))
+    detect_pyramid.stats = pyramid.get_stats
+    # Nur fuer Ganzbildsuchen gedacht
+    detect_pyramid.full_frame = True
+
+    classifier = ColorClassifier(pixel_format="YUV420" if yuv else (capture_format or "BGR"))
+
+    blob_detector = BlobDetector()
+
+    def detect_color(frame, roi=None):
+        mask, scale, offset = classifier.mask(frame, roi, width, height)
+        found, dimensions, _ = blob_detector.find(mask)
+        if found:
+            x, y, radius = to_frame_coords(*dimensions, scale, offset)
+            if radius > 5:
+                return True, (x, y, radius)
+        return False, (None, None, None)
+    detect_color.stats = blob_detector.get_stats
+
+    def detect_color_contours(frame, roi=None):
+        # Vorheriger Weg: findContours + minEnclosingCircle auf derselben Maske
+        mask, scale, offset = classifier.mask(frame, roi, width, height)
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        if contours:
+            largest = max(contours, key=cv2.contourArea)
+            ((x, y), radius) = cv2.minEnclosingCircle(largest)
+            x, y, radius = to_frame_coords(x, y, radius, scale, offset)
+            if radius > 5:
+                return True, (x, y, radius)
+        return False, (None, None, None)
+
+    def detect_color_hsv(frame, roi=None):
+        # Referenz: urspruenglicher Weg ueber BGR -> HSV -> inRange
+        if yuv:
+            bgr = yuv420_to_bgr(frame, width, height)
+        elif capture_format == "RGB":
+            bgr = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
+        else:
+            bgr = frame
+        hsv = cv2.cvtColor(bgr, cv2.COLOR_BGR2HSV)
+        mask = cv2.inRange(hsv, np.array([5, 150, 150]), np.array([25, 255, 255]))
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        if contours:
+            largest = max(contours, key=cv2.contourArea)
+            ((x, y), radius) = cv2.minEnclosingCircle(largest)
+            if radius > 5:
+                return True, (x, y, radius)
+        return False, (None, None, None)
+
+    return {
+        "hough": hough_detector(),
+        "hough_fixed": hough_detector(adaptive=False),
+        "pyramid": detect_pyramid,
+        "color": detect_color,
+        "color_contours": detect_color_contours,
+        "color_hsv": detect_color_hsv,
+    }
+
+
+# --- Auswertung ---
+def percentiles(values_ms):
+    if not values_ms:
+        return None
+    a = np.asarray(values_ms)
+    return {
+        "count": int(a.size),
+        "mean": round(float(a.mean()), 4),
+        "p50": round(float(np.percentile(a, 50)), 4),
+        "p90": round(float(np.percentile(a, 90)), 4),
+        "p99": round(float(np.percentile(a, 99)), 4),
+        "max": round(float(a.max()), 4),
+    }
+
+
+def detection_error(results, truth):
+    """Treffer, Fehldetektionen und Abweichung gegenueber der Ground Truth."""
+    if truth is None:
+        return None
+    center_err, radius_err = [], []
+    hits = misses = false_positives = 0
+    for (found, (x, y, r)), t in zip(results, truth):
+        if t is None:
+            if found:
+                false_positives += 1
+            continue
+        if not found:
+            misses += 1
+            continue
+        err = float(np.hypot(x - t[0], y - t[1]))
+        if err > max(5.0, 0.25 * t[2]):
+            # Falscher Kreis: zaehlt als Fehldetektion und Fehlschlag
+            false_positives += 1
+            misses += 1
+            continue
+        hits += 1
+        center_err.append(err)
+        radius_err.append(abs(r - t[2]))
+    with_ball = hits + misses
+    return {
+        "hit_rate": round(hits / with_ball, 4) if with_ball else None,
+        "hits": hits,
+        "misses": misses,
+        "false_positives": false_positives,
+        "center_error_px": percentiles(center_err),
+        "radius_error_px": percentiles(radius_err),
+    }
+
+
+def memory_usage(run, frames):
+    """Python-Spitzenverbrauch (tracemalloc) eines kurzen Extra-Durchlaufs."""
+    tracemalloc.start()
+    run(frames)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "python_peak_kb": round(peak / 1024.0, 1),
+        "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+# --- Benchmarks ---
+def bench_detector(detect, frames, truth, roi_tracking, width, height):
+    predictor = RoiPredictor()
+
+    def run(frames):
+        results, times = [], []
+        for frame in frames:
+            start = time.perf_counter()
+            if roi_tracking:
+                def detect_found(frame, roi=None):
+                    found, dims = detect(frame, roi)
+                    return frame, found, dims
+                _, found, dims = detect_with_roi(detect_found, frame, predictor, MIN_RADIUS,
+                                                 (width, height))
+            else:
+                found, dims = detect(frame)
+            times.append((time.perf_counter() - start) * 1000.0)
+            results.append((found, dims))
+        return results, times
+
+    run(frames[:10])  # Aufwaermen (Caches, Lookup-Tabellen)
+    predictor.reset()
+    start = time.perf_counter()
+    results, times = run(frames)
+    elapsed = time.perf_counter() - start
+    predictor.reset()
+
+    data = {
+        "latency_ms": percentiles(times),
+        "throughput_fps": round(len(frames) / elapsed, 1),
+        "error": detection_error(results, truth),
+        "memory": memory_usage(run, frames[:50]),
+    }
+    if hasattr(detect, "stats"):
+        data["detector"] = detect.stats()
+    if roi_tracking:
+        data["roi"] = {"hits": predictor.roi_hits, "misses": predictor.roi_misses,
+                       "full_frame_searches": predictor.full_frame_searches}
+    return data
+
+
+def bench_pipeline(detect, frames, truth, capture_format, width, height, quality=80):
+    """
+    Capture -> Detektion -> Encoding wie in den Skripten, seriell pro Bild.
+
+    capture: Kopie in den Ringpuffer und Abholen des neuesten Bildes,
+    detect: Detektion mit ROI, encode: Farbkonvertierung, Overlay und JPEG.
+    """
+    ring = FrameRing(3)
+    predictor = RoiPredictor()
+    stages = {"capture": [], "detect": [], "encode": [], "total": []}
+    results = []
+    jpeg_bytes = 0
+
+    def detect_found(frame, roi=None):
+        found, dims = detect(frame, roi)
+        return frame, found, dims
+
+    last_seq = 0
+    start_all = time.perf_counter()
+    for frame in frames:
+        t0 = time.perf_counter()
+        ring.put(frame)
+        last_seq, raw = ring.get_latest(last_seq, timeout=1.0)
+        t1 = time.perf_counter()
+        _, found, dims = detect_with_roi(detect_found, raw, predictor, MIN_RADIUS, (width, height))
+        t2 = time.perf_counter()
+        if capture_format == CAPTURE_FORMAT_YUV420:
+            preview = yuv420_to_bgr(raw, width, height)
+        elif capture_format == "RGB":
+            preview = cv2.cvtColor(raw, cv2.COLOR_RGB2BGR)
+        else:
+            preview = raw.copy()
+        ring.release()
+        if found:
+            cv2.circle(preview, (int(dims[0]), int(dims[1])), int(dims[2]), (0, 255, 0), 2)
+        ok, buffer = cv2.imencode('.jpg', preview, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        t3 = time.perf_counter()
+        jpeg_bytes += len(buffer)
+        results.append((found, dims))
+        stages["capture"].append((t1 - t0) * 1000.0)
+        stages["detect"].append((t2 - t1) * 1000.0)
+        stages["encode"].append((t3 - t2) * 1000.0)
+        stages["total"].append((t3 - t0) * 1000.0)
+    elapsed = time.perf_counter() - start_all
+
+    return {
+        "latency_ms": {name: percentiles(values) for name, values in stages.items()},
+        "throughput_fps": round(len(frames) / elapsed, 1),
+        "mean_jpeg_kb": round(jpeg_bytes / len(frames) / 1024.0, 1),
+        "error": detection_error(results, truth),
+    }
+
+
+def bench_parallel_hough(frames, truth, capture_format, width, height, max_workers):
+    """Durchsatz und Zusatzlatenz der parallelen Hough-Detektion fuer 1..max_workers Worker."""
+    yuv = capture_format == CAPTURE_FORMAT_YUV420
+    convert = None if yuv else (cv2.COLOR_RGB2GRAY if capture_format == "RGB"
+                                else cv2.COLOR_BGR2GRAY)
+    runs = {}
+    for workers in range(1, max_workers + 1):
+        detector = AdaptiveHoughDetector(MIN_RADIUS, MAX_RADIUS, dp=1.5, min_dist=50,
+                                         param1=100, param2=40)
+        pool = ParallelHoughDetector(detector, (height, width), workers=workers)
+        results = []
+        start = time.perf_counter()
+        for frame in frames:
+            gray = luma(frame, width, height) if yuv else frame
+            # Offline kein Bild verwerfen: warten, bis ein Slot frei ist
+            while pool.submit(gray, convert=convert) is None:
+                results.extend(pool.collect(timeout=0.05))
+            results.extend(pool.collect())
+        results.extend(pool.drain(timeout=5.0))
+        elapsed = time.perf_counter() - start
+        stats = pool.get_stats()
+        pool.close()
+        runs[workers] = {
+            "throughput_fps": round(len(results) / elapsed, 1),
+            "added_latency_ms": percentiles([r.overhead_ms for r in results]),
+            "reorder_ms": percentiles([r.reorder_ms for r in results]),
+            "compute_ms": percentiles([r.compute_ms for r in results]),
+            "error": detection_error([(r.found, r.dimensions) for r in results], truth),
+            "stats": stats,
+        }
+    return runs
+
+
+def bench_balltracker(frames, capture_format, mode, width, height, duration, source_fps,
+                      pacing="frames", overrun="skip"):
+    """Balltracker mit Capture- und Detektions-Thread gegen eine Bildquelle mit fester Rate."""
+    from balltracker import Balltracker
+
+    period = 1.0 / source_fps if source_fps else 0.0
+    state = {"i": 0, "next": time.perf_counter()}
+
+    def source():
+        # Kamera simulieren: neues Bild im festen Takt
+        if period:
+            state["next"] += period
+            delay = state["next"] - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        frame = frames[state["i"] % len(frames)]
+        state["i"] += 1
+        return frame
+
+    tracker = Balltracker(width=width, height=height, frame_source=source,
+                          capture_format=capture_format, pacing=pacing, overrun=overrun)
+    tracker.start_balltracker(mode)
+    start = time.perf_counter()
+    time.sleep(duration)
+    stats = tracker.get_stats()
+    elapsed = time.perf_counter() - start
+    tracker.stop()
+    return {
+        "mode": mode,
+        "pacing": pacing,
+        "duration_s": round(elapsed, 2),
+        "source_fps": source_fps,
+        "captured_fps": round(stats["frames_captured"] / elapsed, 1),
+        "processed_fps": round(stats["frames_processed"] / elapsed, 1),
+        "frames_dropped": stats["frames_dropped"],
+        "stats": stats,
+    }
+
+
+# --- Ergebnisse ---
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+                                timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "opencv": cv2.__version__,
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def compare(results, baseline):
+    """Median-Latenz und Durchsatz gegenueber einer frueheren Ergebnisdatei."""
+    lines = []
+    for name, new in results.get("detectors", {}).items():
+        old = baseline.get("detectors", {}).get(name)
+        if not old or not old.get("latency_ms") or not new.get("latency_ms"):
+            continue
+        a, b = old["latency_ms"]["p50"], new["latency_ms"]["p50"]
+        lines.append(f"  {name:12s} p50 {a:8.3f} -> {b:8.3f} ms ({(b - a) / a * 100.0:+.1f}%)")
+    old = baseline.get("pipeline", {}).get("latency_ms", {}).get("total")
+    new = results.get("pipeline", {}).get("latency_ms", {}).get("total")
+    if old and new:
+        a, b = old["p50"], new["p50"]
+        lines.append(f"  {'pipeline':12s} p50 {a:8.3f} -> {b:8.3f} ms ({(b - a) / a * 100.0:+.1f}%)")
+    return "\n".join(lines)
+
+
+def print_summary(results):
+    print(f"{len(results['detectors'])} detectors on {results['source']['frames']} frames "
+          f"({results['source']['kind']}, {results['source']['capture_format']})")
+    for name, data in results["detectors"].items():
+        lat = data["latency_ms"]
+        line = (f"  {name:12s} p50 {lat['p50']:7.3f} ms  p99 {lat['p99']:7.3f} ms  "
+                f"{data['throughput_fps']:8.1f} fps")
+        error = data.get("error")
+        if error and error["hit_rate"] is not None:
+            center = error["center_error_px"]
+            line += f"  hit {error['hit_rate'] * 100:5.1f}%  fp {error['false_positives']:3d}"
+            if center:
+                line += f"  err {center['mean']:.2f} px"
+        print(line)
+    if "pipeline" in results:
+        p = results["pipeline"]
+        lat = p["latency_ms"]
+        print(f"  pipeline ({p['detector']}): capture {lat['capture']['p50']:.3f}  "
+              f"detect {lat['detect']['p50']:.3f}  encode {lat['encode']['p50']:.3f}  "
+              f"total p99 {lat['total']['p99']:.3f} ms, {p['throughput_fps']:.1f} fps")
+    for workers, p in results.get("parallel_hough", {}).items():
+        print(f"  hough x{workers} workers: {p['throughput_fps']:8.1f} fps, added latency "
+              f"p50 {p['added_latency_ms']['p50']:.3f} ms  p99 {p['added_latency_ms']['p99']:.3f} ms")
+    if "balltracker" in results:
+        b = results["balltracker"]
+        scheduler = b["stats"]["scheduler"]
+        print(f"  balltracker ({b['mode']}, {b['pacing']}): {b['processed_fps']} of "
+              f"{b['captured_fps']} fps processed, {b['frames_dropped']} dropped, "
+              f"{scheduler['overruns']} overruns (worst {scheduler['worst_overrun_ms']} ms)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark for the ball detectors")
+    parser.add_argument("--clip", help="Video oder Bildordner statt synthetischer Sequenz")
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--width", type=int, default=400)
+    parser.add_argument("--height", type=int, default=400)
+    parser.add_argument("--radius", type=float, default=30)
+    parser.add_argument("--background", choices=("smooth", "clutter"), default="smooth")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--format", choices=("YUV420", "RGB", "BGR"), default="YUV420",
+                        help="Kameraformat, in dem die Detektoren die Bilder bekommen")
+    parser.add_argument("--detectors", nargs="+",
+                        default=["hough", "hough_fixed", "pyramid", "color", "color_contours",
+                                 "color_hsv"])
+    parser.add_argument("--no-roi", action="store_true", help="Immer im ganzen Bild suchen")
+    parser.add_argument("--pipeline", default="hough",
+                        help="Detektor fuer den Pipeline-Durchlauf ('none' = aus)")
+    parser.add_argument("--balltracker", choices=("hough", "color", "none"), default="hough")
+    parser.add_argument("--balltracker-seconds", type=float, default=2.0)
+    parser.add_argument("--source-fps", type=float, default=500.0,
+                        help="Bildrate der simulierten Kamera fuer den Balltracker")
+    parser.add_argument("--pacing", choices=PACINGS, default="frames",
+                        help="Takt der Balltracker-Schleife")
+    parser.add_argument("--overrun", choices=OVERRUN_POLICIES, default="skip",
+                        help="Verhalten des Balltrackers bei Ueberlauf")
+    parser.add_argument("--hough-workers", type=int, default=0,
+                        help="Parallele Hough-Detektion mit 1..N Worker-Prozessen messen")
+    parser.add_argument("--output", help="Ergebnisse als JSON speichern")
+    parser.add_argument("--compare", help="Frueheres JSON-Ergebnis zum Vergleich")
+    parser.add_argument("--export-synthetic", metavar="PATH",
+                        help="Synthetische Sequenz als Video + CSV speichern und beenden")
+    args = parser.parse_args()
+
+    # --- Bilder laden ---
+    if args.clip:
+        images, truth = load_clip(args.clip, args.frames)
+        kind = args.clip
+    else:
+        images, truth = synthetic_sequence(args.frames, args.width, args.height, args.radius,
+                                           args.background, seed=args.seed)
+        kind = f"synthetic/{args.background}"
+    if args.export_synthetic:
+        export_clip(args.export_synthetic, images, truth)
+        print(f"wrote {len(images)} frames to {args.export_synthetic}")
+        return
+
+    height, width = images[0].shape[:2]
+    # YUV420 braucht gerade Abmessungen
+    width -= width % 2
+    height -= height % 2
+    images = [np.ascontiguousarray(img[:height, :width]) for img in images]
+    frames = to_capture_format(images, args.format)
+    detectors = make_detectors(args.format, width, height)
+    unknown = [d for d in args.detectors if d not in detectors]
+    if unknown:
+        parser.error(f"unknown detector(s) {unknown}, choose from {sorted(detectors)}")
+
+    results = {
+        "environment": environment(),
+        "source": {"kind": kind, "frames": len(frames), "width": width, "height": height,
+                   "capture_format": args.format, "ground_truth": truth is not None},
+        "detectors": {},
+    }
+
+    for name in args.detectors:
+        detect = detectors[name]
+        roi_tracking = not args.no_roi and not getattr(detect, "full_frame", False)
+        results["detectors"][name] = bench_detector(detect, frames, truth, roi_tracking,
+                                                    width, height)
+
+    if args.pipeline != "none":
+        # Frischer Detektor, damit das adaptive Band nicht vom Detektor-Lauf profitiert
+        detect = make_detectors(args.format, width, height)[args.pipeline]
+        results["pipeline"] = bench_pipeline(detect, frames, truth, args.format, width, height)
+        results["pipeline"]["detector"] = args.pipeline
+
+    if args.hough_workers:
+        results["parallel_hough"] = bench_parallel_hough(frames, truth, args.format, width,
+                                                         height, args.hough_workers)
+
+    if args.balltracker != "none":
+        # Balltracker kennt nur RGB (Picamera2-Standard) und YUV420
+        if args.format == CAPTURE_FORMAT_YUV420:
+            tracker_frames, capture_format = frames, CAPTURE_FORMAT_YUV420
+        else:
+            tracker_frames, capture_format = to_capture_format(images, "RGB"), None
+        results["balltracker"] = bench_balltracker(tracker_frames, capture_format,
+                                                   args.balltracker, width, height,
+                                                   args.balltracker_seconds, args.source_fps,
+                                                   args.pacing, args.overrun)
+
+    print_summary(results)
+    if args.compare:
+        with open(args.compare) as f:
+            print("compared to " + args.compare + ":")
+            print(compare(results, json.load(f)))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+"""
+Farbsegmentierung ueber eine vorberechnete Lookup-Tabelle
+
+Statt jedes Bild nach HSV zu konvertieren und inRange anzuwenden, wird die
+HSV-Regel einmal fuer alle quantisierten Farben ausgewertet. Danach ist die
+Maske nur noch ein Tabellenzugriff pro Pixel, direkt im Kameraformat.
+"""
+import threading
+import cv2
+import numpy as np
+
+# Standard: orange Tischtennisball
+LOWER_ORANGE = (5, 150, 150)
+UPPER_ORANGE = (25, 255, 255)
+
+# Bits pro Kanal, zusammen 15-16 Bit Index -> Tabelle passt in den L2-Cache
+QUANT_BITS = {
+    "YUV420": (4, 6, 6),  # Y, U, V
+    "RGB": (5, 5, 5),
+    "BGR": (5, 5, 5),
+}
+
+
+class ColorClassifier:
+    """
+    Erzeugt die Farbmaske mit einer quantisierten Lookup-Tabelle.
+
+    Die Maske wird mit halber Aufloesung berechnet: bei YUV420 entspricht das
+    der Aufloesung der Farbebenen, bei RGB/BGR wird jedes zweite Pixel
+    genommen. mask() liefert deshalb auch Skalierung und Offset, mit denen
+    Koordinaten aus der Maske ins Bild umgerechnet werden.
+
+    Args:
+        lower (tuple): Untere HSV-Grenze (OpenCV-Skala, H 0-179)
+        upper (tuple): Obere HSV-Grenze
+        pixel_format (str): "YUV420", "RGB" oder "BGR" (Format des Kamerabildes)
+    """
+
+    scale = 2
+
+    def __init__(self, lower=LOWER_ORANGE, upper=UPPER_ORANGE, pixel_format="BGR"):
+        if pixel_format not in QUANT_BITS:
+            raise ValueError(f"unsupported pixel format {pixel_format}")
+        self.pixel_format = pixel_format
+        self.bits = QUANT_BITS[pixel_format]
+        self.lock = threading.Lock()
+        self.lower = None
+        self.upper = None
+        self.lut = None
+        self.rebuilds = 0
+        self.set_thresholds(lower, upper)
+
+    def set_thresholds(self, lower, upper):
+        """Neue HSV-Grenzen setzen; die Tabelle wird nur bei Aenderung neu gebaut."""
+        lower = tuple(int(v) for v in lower)
+        upper = tuple(int(v) for v in upper)
+        with self.lock:
+            if lower == self.lower and upper == self.upper:
+                return
+            lut = self._build(lower, upper)
+            # Referenz tauschen, laufende mask()-Aufrufe nutzen die alte Tabelle weiter
+            self.lut = lut
+            self.lower = lower
+            self.upper = upper
+            self.rebuilds += 1
+
+    def get_thresholds(self):
+        return self.lower, self.upper
+
+    def _cell_centers(self, bits):
+        shift = 8 - bits
+        return (np.arange(1 << bits, dtype=np.uint16) << shift) + ((1 << shift) >> 1)
+
+    def _build(self, lower, upper):
+        b0, b1, b2 = self.bits
+        c0, c1, c2 = np.meshgrid(self._cell_centers(b0), self._cell_centers(b1),
+                                 self._cell_centers(b2), indexing="ij")
+        c0 = c0.ravel().astype(np.uint8)
+        c1 = c1.ravel().astype(np.uint8)
+        c2 = c2.ravel().astype(np.uint8)
+        n = c0.size
+
+        if self.pixel_format == "YUV420":
+            # Gleiche Konvertierung wie yuv420_to_bgr: jede Farbe als 2x2-Block in einem I420-Bild
+            y_plane = np.repeat(c0, 4).reshape(2 * n, 2)
+            i420 = np.concatenate([y_plane.ravel(), c1, c2]).reshape(3 * n, 2)
+            bgr = cv2.cvtColor(i420, cv2.COLOR_YUV2BGR_I420)[::2, 0].reshape(n, 1, 3)
+        elif self.pixel_format == "RGB":
+            bgr = np.stack([c2, c1, c0], axis=-1).reshape(n, 1, 3)
+        else:
+            bgr = np.stack([c0, c1, c2], axis=-1).reshape(n, 1, 3)
+
+        hsv = cv2.cvtColor(bgr, cv2.COLOR_BGR2HSV)
+        mask = cv2.inRange(hsv, np.array(lower), np.array(upper))
+        return mask.ravel()
+
+    def _index(self, c0, c1, c2):
+        b0, b1, b2 = self.bits
+        idx = (c0 >> (8 - b0)).astype(np.uint16) << (b1 + b2)
+        idx |= (c1 >> (8 - b1)).astype(np.uint16) << b2
+        idx |= c2 >> (8 - b2)
+        return idx
+
+    def mask(self, frame, roi=None, width=None, height=None):
+        """
+        Farbmaske fuer frame (optional nur im Fenster roi = (x0, y0, x1, y1)).
+
+        Bei YUV420 muessen width und height des Bildes angegeben werden.
+
+        Returns:
+            tuple: (mask, scale, (x_offset, y_offset)); Bildkoordinate =
+            offset + (Maskenkoordinate + 0.5) * scale - 0.5
+        """
+        lut = self.lut
+        x0 = y0 = 0
+        if roi is not None:
+            # Auf gerade Koordinaten ausrichten (2x2-Bloecke)
+            x0, y0 = roi[0] & ~1, roi[1] & ~1
+            x1, y1 = roi[2], roi[3]
+        if self.pixel_format == "YUV420":
+            stride = frame.shape[1]
+            h2, s2 = height // 2, stride // 2
+            y_plane = frame[:height]
+            u_plane = frame[height:height + height // 4].reshape(h2, s2)
+            v_plane = frame[height + height // 4:height + height // 2].reshape(h2, s2)
+            if roi is None:
+                x1, y1 = width, height
+            y_sub = y_plane[y0:y1:2, x0:x1:2]
+            u_sub = u_plane[y0 // 2:(y1 + 1) // 2, x0 // 2:(x1 + 1) // 2]
+            v_sub = v_plane[y0 // 2:(y1 + 1) // 2, x0 // 2:(x1 + 1) // 2]
+            idx = self._index(y_sub, u_sub, v_sub)
+        else:
+            if roi is None:
+                sub = frame[::2, ::2]
+            else:
+                sub = frame[y0:y1:2, x0:x1:2]
+            idx = self._index(sub[..., 0], sub[..., 1], sub[..., 2])
+        return lut[idx], self.scale, (x0, y0)
+
+
+def to_frame_coords(x, y, radius, scale, offset):
+    """Koordinaten aus der (halb aufgeloesten) Maske ins Bild umrechnen."""
+    return (offset[0] + (x + 0.5) * scale - 0.5,
+            offset[1] + (y + 0.5) * scale - 0.5,
+            radius * scale)
+
+
+def parse_hsv(text):
+    """"5,150,150" -> (5, 150, 150), z.B. fuer Query-Parameter."""
+    values = tuple(int(v) for v in text.split(","))
+    if len(values) != 3:
+        raise ValueError("expected three comma separated values")
+    return values
@@ -0,0 +1,196 @@
+"""
+Crop-Nachfuehrung fuer den dynamischen Tracker
+
+CropFollower entscheidet, wann der Sensor-Crop dem Ball folgen muss
+(Totband + Hysterese), CropReconfigurer setzt den Crop mit dem billigsten
+Neustart, den libcamera erlaubt, und misst die Kosten.
+"""
+import time
+from GSCrop import CropController, SENSOR_WIDTH, SENSOR_HEIGHT, get_crop_controller
+
+
+def clamp_offset(x_offset, y_offset, width, height):
+    """Offset ausrichten und begrenzen, damit wir nicht ausserhalb des Sensors croppen."""
+    _, _, x_offset, y_offset = CropController.snap(width, height, x_offset, y_offset)
+    return x_offset, y_offset
+
+
+def centered_offset(sensor_x, sensor_y, width, height):
+    """Crop-Offset, bei dem die Sensorposition in der Mitte des Crops liegt."""
+    return clamp_offset(sensor_x - width / 2, sensor_y - height / 2, width, height)
+
+
+def frame_to_sensor(frame_x, frame_y, x_offset, y_offset, width, height):
+    """
+    Bildkoordinaten eines um 180 Grad gedrehten Crops in Sensorkoordinaten.
+
+    180° Rotation = horizontaler + vertikaler Flip: Pixel x landet auf
+    width - 1 - x (wie SyntheticSource mit rotate180).
+    """
+    return x_offset + (width - 1 - frame_x), y_offset + (height - 1 - frame_y)
+
+
+class CropFollower:
+    """
+    Entscheidet, ob der Crop verschoben werden muss.
+
+    Solange der Ball innerhalb des Totbands um die Crop-Mitte liegt, bleibt
+    der Crop stehen. Erst wenn er naeher als edge_margin an den Rand kommt,
+    wird der Crop neu auf den Ball zentriert (Hysterese: Ausloeseschwelle am
+    Rand, Ruheposition in der Mitte). Kleine Verschiebungen unter min_step
+    werden ignoriert.
+
+    Args:
+        width (int): Breite des Crops
+        height (int): Hoehe des Crops
+        edge_margin (float): Randbereich als Anteil der Crop-Groesse, der eine Verschiebung ausloest
+        min_step (int): Minimale Verschiebung in Pixel
+    """
+
+    def __init__(self, width, height, edge_margin=0.25, min_step=16):
+        self.width = width
+        self.height = height
+        self.edge_margin = edge_margin
+        self.min_step = min_step
+
+    def needs_move(self, x_offset, y_offset, sensor_x, sensor_y):
+        # Position relativ zum aktuellen Crop
+        rel_x = sensor_x - x_offset
+        rel_y = sensor_y - y_offset
+        margin_x = self.width * self.edge_margin
+        margin_y = self.height * self.edge_margin
+        return (rel_x < margin_x or rel_x > self.width - margin_x
+                or rel_y < margin_y or rel_y > self.height - margin_y)
+
+    def update(self, x_offset, y_offset, sensor_x, sensor_y):
+        """
+        Returns:
+            tuple: Neuer Offset (x, y) oder None, wenn der Crop bleiben soll
+        """
+        if not self.needs_move(x_offset, y_offset, sensor_x, sensor_y):
+            return None
+        new_x, new_y = centered_offset(sensor_x, sensor_y, self.width, self.height)
+        if abs(new_x - x_offset) < self.min_step and abs(new_y - y_offset) < self.min_step:
+            # Am Sensorrand kann der Crop nicht weiter
+            return None
+        return new_x, new_y
+
+
+class CropReconfigurer:
+    """
+    Setzt Sensor-Crops auf einer laufenden Picamera2.
+
+    Die Video-Konfigurationen werden pro Crop-Groesse einmal erzeugt und
+    wiederverwendet. Bleibt die Groesse gleich, wird nur gestoppt, der Crop
+    ueber den CropController verschoben und wieder gestartet; configure() (Allokation
+    der Buffer, Pipeline-Setup) entfaellt. Nur ein Groessenwechsel
+    konfiguriert die Kamera neu.
+
+    Args:
+        picam2: Picamera2-Instanz
+        frame_duration_us (int): Nominale Bilddauer, fuer die Schaetzung verlorener Bilder
+        set_crop (callable, optional): Funktion (width, height, x, y) zum Setzen
+            des Sensor-Crops. Standard ist der gecachte CropController aus GSCrop.
+        main_format (str, optional): Pixelformat des Main-Streams, z.B. "YUV420"
+    """
+
+    def __init__(self, picam2, frame_duration_us=2000, set_crop=None, main_format=None):
+        self.picam2 = picam2
+        self.frame_duration_us = frame_duration_us
+        self.main_format = main_format
+        self.set_crop = set_crop if set_crop is not None else get_crop_controller().set_crop
+        self.configs = {}
+        self.size = None
+        self.offset = None
+
+        # Statistik
+        self.crop_moves = 0
+        self.reconfigurations = 0
+        self.frames_lost = 0
+        self.last_restart_us = 0.0
+        self.mean_move_us = 0.0
+        self.moves_per_second = 0.0
+        self._moves_in_window = 0
+        self._window_start = time.perf_counter()
+
+    def config_for(self, width, height):
+        config = self.configs.get((width, height))
+        if config is None:
+            main = {"size": (width, height)}
+            if self.main_format is not None:
+                main["format"] = self.main_format
+            config = self.picam2.create_video_configuration(
+                main=main,
+                raw=None,
+                controls={
+                    "NoiseReductionMode": 0,  # deaktiviert Noise Reduction
+                    "FrameDurationLimits": (self.frame_duration_us, self.frame_duration_us),
+                }
+            )
+            self.configs[(width, height)] = config
+        return config
+
+    def prebuild(self, sizes):
+        """Konfigurationen fuer alle benoetigten Crop-Groessen vorab erzeugen."""
+        for width, height in sizes:
+            self.config_for(width, height)
+
+    def start(self, width, height, x_offset, y_offset):
+        """Crop zum ersten Mal setzen, Kamera konfigurieren und starten."""
+        self.set_crop(width, height, x_offset, y_offset)
+        self.picam2.configure(self.config_for(width, height))
+        self.picam2.start()
+        self.size = (width, height)
+        self.offset = (x_offset, y_offset)
+
+    def apply(self, width, height, x_offset, y_offset):
+        """Crop setzen; konfiguriert nur bei Groessenwechsel neu."""
+        if self.size == (width, height) and self.offset == (x_offset, y_offset):
+            return
+        start = time.perf_counter()
+
+        resize = self.size != (width, height)
+        self.picam2.stop()
+        self.set_crop(width, height, x_offset, y_offset)
+        if resize:
+            self.picam2.configure(self.config_for(width, height))
+            self.reconfigurations += 1
+        else:
+            self.crop_moves += 1
+            self._moves_in_window += 1
+        self.picam2.start()
+
+        self.size = (width, height)
+        self.offset = (x_offset, y_offset)
+
+        # Waehrend des Neustarts liefert der Sensor keine Bilder
+        self.last_restart_us = (time.perf_counter() - start) * 1_000_000.0
+        self.frames_lost += int(self.last_restart_us // self.frame_duration_us)
+        if not resize:
+            # Gleitender Mittelwert, damit der Tracker die Verzoegerung vorhersagen kann
+            if self.mean_move_us == 0.0:
+                self.mean_move_us = self.last_restart_us
+            else:
+                self.mean_move_us += 0.1 * (self.last_restart_us - self.mean_move_us)
+
+    def move_latency_s(self):
+        """Erwartete Zeit, bis ein verschobener Crop das erste Bild liefert."""
+        return (self.mean_move_us + self.frame_duration_us) / 1_000_000.0
+
+    def tick(self):
+        """Einmal pro Bild aufrufen, aktualisiert moves_per_second."""
+        elapsed = time.perf_counter() - self._window_start
+        if elapsed >= 1.0:
+            self.moves_per_second = self._moves_in_window / elapsed
+            self._moves_in_window = 0
+            self._window_start = time.perf_counter()
+
+    def get_stats(self):
+        return {
+            "crop_moves": self.crop_moves,
+            "crop_moves_per_second": round(self.moves_per_second, 2),
+            "reconfigurations": self.reconfigurations,
+            "frames_lost_to_reconfiguration": self.frames_lost,
+            "last_restart_us": round(self.last_restart_us, 1),
+            "mean_move_us": round(self.mean_move_us, 1),
+        }
@@ -1,13 +1,27 @@
+import os
 import time
 import threading
-from flask import Flask, Response, request
-from picamera2 import Picamera2
+from flask import Flask, Response, request, jsonify
 import cv2
-import numpy as np
-from GSCrop import set_camera_crop
+from framesource import open_frame_source, crop_setter
+from roi import RoiPredictor, detect_with_roi
+from yuv import CAPTURE_FORMAT_YUV420, luma, yuv420_to_bgr
+from colorlut import ColorClassifier, parse_hsv, to_frame_coords
+from blob import BlobDetector
+from cropfollow import CropFollower, CropReconfigurer, centered_offset, frame_to_sensor
+from kalman import BallKalman
+from hough import AdaptiveHoughDetector
+from streamhub import StreamHub
+from asyncserver import run_server
+from telemetry import Telemetry, TELEMETRY_JS, split_mode, stream_mode, with_client_overlay
+from recorder import FrameRecorder
+from metrics import Metrics, PROMETHEUS_CONTENT_TYPE
+from threadplacement import ThreadPlacement
+from sensortime import SensorTiming, capture_with_metadata, now_ns
 
 app = Flask(__name__)
-picam2 = Picamera2()
+# FRAME_SOURCE=synthetic/replay:... ohne Kamera, Kamera ist ueber Kopf montiert
+picam2 = open_frame_source(rotate180=True)
 
 # --- Kamera vorbereiten ---
 # schneller FPS-Modus
@@ -19,64 +33,110 @@ CROP_HEIGHT_SLOW = 800
 # Calculate crop offsets if not provided (center crop)
 x_offset_initial = (1440 - CROP_WIDTH_SLOW) // 2
 y_offset_initial = (1088 - CROP_HEIGHT_SLOW) // 2
-set_camera_crop(CROP_WIDTH_SLOW, CROP_HEIGHT_SLOW, x_offset_initial, y_offset_initial)
 
-# Kamera initialisieren
-video_config = picam2.create_video_configuration(
-    main={"size": (CROP_WIDTH_SLOW, CROP_HEIGHT_SLOW)},
-    raw=None,
-    controls={
-        "NoiseReductionMode": 0,  # deaktiviert Noise Reduction
-        "FrameDurationLimits": (2000, 2000),  # 500 fps theoretisch
-    }
-)
-picam2.configure(video_config)
+# YUV420 vom ISP: Hough arbeitet direkt auf der Y-Ebene, Farbe nur bei Bedarf
+CAPTURE_FORMAT = CAPTURE_FORMAT_YUV420
 
-picam2.start()
+# Konfigurationen pro Crop-Groesse einmal erzeugen und wiederverwenden
+reconfigurer = CropReconfigurer(picam2, frame_duration_us=2000, main_format=CAPTURE_FORMAT,
+                                set_crop=crop_setter(picam2))
+reconfigurer.prebuild([(CROP_WIDTH_SLOW, CROP_HEIGHT_SLOW), (CROP_WIDTH_FAST, CROP_HEIGHT_FAST)])
+# Crop bewegt sich erst, wenn der Ball in die aeusseren 25% des Fensters kommt
+crop_follower = CropFollower(CROP_WIDTH_FAST, CROP_HEIGHT_FAST, edge_margin=0.25)
+
+# Kamera initialisieren und starten
+reconfigurer.start(CROP_WIDTH_SLOW, CROP_HEIGHT_SLOW, x_offset_initial, y_offset_initial)
 
 # Globale Variablen
 fps = 0.0
 MIN_RADIUS = 20
 MAX_RADIUS = 100
+# Detektion zuerst im Fenster um die vorhergesagte Ballposition
+ROI_TRACKING = True
+# Ganzbildsuche ab dieser Breite grob-zu-fein (langsamer Modus 800x800)
+PYRAMID_MIN_WIDTH = 600
+# Radiusband folgt dem zuletzt gefundenen Radius, bei Fehlschlaegen wieder breiter
+hough_detector = AdaptiveHoughDetector(MIN_RADIUS, MAX_RADIUS, dp=1.5, min_dist=50,
+                                       param1=100, param2=30,
+                                       pyramid_min_width=PYRAMID_MIN_WIDTH)
+# Farbmaske per Lookup-Tabelle direkt aus YUV420, Grenzen zur Laufzeit aenderbar
+color_classifier = ColorClassifier(pixel_format=CAPTURE_FORMAT)
+# Rundester Fleck der Maske per connectedComponents, statt findContours
+blob_detector = BlobDetector()
+# Vorschaurate des MJPEG-Streams, unabhaengig von der Tracking-Rate
+PREVIEW_FPS = 30
+# Bewegungsmodell fuer die Crop-Platzierung ("cv", "ca" oder None fuer aus)
+KALMAN_MODEL = "ca"
+# Messungen, bevor der Vorhersage vertraut wird
+KALMAN_MIN_UPDATES = 3
+# So viele Bilder ohne Ball folgt der Crop noch der Vorhersage
+KALMAN_COAST_FRAMES = 5
+# Rohbilder der letzten Sekunde im Speicher, Aufnahme per /record
+# (RECORD_AUTO_TRIGGERS z.B. (TRIGGER_DETECTED, TRIGGER_LOST) aus recorder).
+# Der Ringpuffer (RECORD_BUFFER_MB) und die Kopie pro Bild fallen erst an,
+# wenn der Recorder scharf ist: RECORDING=1 beim Start oder /record?arm=1
+RECORDING = os.environ.get("RECORDING", "0") == "1"
+RECORD_BUFFER_MB = 256
+RECORD_PRE_SECONDS = 1.0
+RECORD_POST_SECONDS = 1.0
+RECORD_AUTO_TRIGGERS = ()
+recorder = FrameRecorder(buffer_mb=RECORD_BUFFER_MB, pre_seconds=RECORD_PRE_SECONDS,
+                         post_seconds=RECORD_POST_SECONDS, capture_format=CAPTURE_FORMAT,
+                         auto_triggers=RECORD_AUTO_TRIGGERS, armed=RECORDING)
+# Latenz pro Schritt und Zaehler, Export unter /metrics
+metrics = Metrics(frame_budget=0.002)
+# Kerne/Prioritaet pro Thread aus THREAD_PLACEMENT, CPU-Zeit und Kontextwechsel unter /metrics
+placement = ThreadPlacement.from_env(metrics)
+capture_stage = metrics.stage("capture")
+convert_stage = metrics.stage("convert")
+detect_stage = metrics.stage("detect")
+draw_stage = metrics.stage("draw")
+metrics.counter("crop_changes_total", "Sensor crop changes", {"kind": "move"},
+                fn=lambda: reconfigurer.crop_moves)
+metrics.counter("crop_changes_total", "Sensor crop changes", {"kind": "resize"},
+                fn=lambda: reconfigurer.reconfigurations)
+metrics.counter("frames_dropped_total", "Frames lost on the way", {"where": "reconfiguration"},
+                fn=lambda: reconfigurer.frames_lost)
+metrics.counter("frames_dropped_total", "Frames lost on the way", {"where": "recording"},
+                fn=lambda: recorder.frames_lost)
+# Echte Bildrate, verlorene Bilder und Latenz aus den Sensor-Zeitstempeln;
+# Luecken durch Crop-Neustarts werden getrennt gezaehlt
+sensor_timing = SensorTiming(frame_duration_us=2000, metrics=metrics)
 fps_lock = threading.Lock()
 mode_lock = threading.Lock()
 mode = "hough"
+# Positionen und Stufenzeiten per WebSocket (/telemetry, nur STREAM_SERVER=asyncio);
+# das Bild ist um 180 Grad gedreht, der Browser rechnet die Spur ueber den Sensor um
+telemetry = Telemetry(CROP_WIDTH_SLOW, CROP_HEIGHT_SLOW, modes=("hough", "color"),
+                      fps=lambda: fps, sensor_fps=sensor_timing.sensor_fps, metrics=metrics,
+                      flip=True)
 
 # --- Bildverarbeitung ---
-def detect_ball_hough(frame):
-    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-    blurred = cv2.medianBlur(gray, 5)
-    circles = cv2.HoughCircles(blurred, cv2.HOUGH_GRADIENT, dp=1.5, minDist=50,
-                               param1=100, param2=30, minRadius=MIN_RADIUS, maxRadius=MAX_RADIUS)
-    if circles is not None:
-        circles = np.uint16(np.around(circles))
-        # c = Tupel mit x, y, R
-        c = circles[0][0]
-        cv2.circle(frame, (c[0], c[1]), c[2], (0, 255, 0), 2)
-        cv2.circle(frame, (c[0], c[1]), 2, (0, 0, 255), 3)
-        return frame, True, (c[0], c[1], c[2])
-    else:
-        return frame, False, (None, None, None)
-
-def detect_ball_color(frame):
-    hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
-    lower_orange = np.array([5, 150, 150])
-    upper_orange = np.array([25, 255, 255])
-    mask = cv2.inRange(hsv, lower_orange, upper_orange)
-    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-
-    if contours:
-        largest = max(contours, key=cv2.contourArea)
-        ((x, y), radius) = cv2.minEnclosingCircle(largest)
+def detect_ball_hough(frame, roi=None):
+    found, dimensions = hough_detector.detect(frame, roi)
+    if found and frame.ndim == 3:
+        frame = draw_ball(frame, dimensions)
+    return frame, found, dimensions
+
+def detect_ball_color(frame, roi=None, width=None, height=None):
+    # Maske in halber Aufloesung direkt aus dem Kamerabild, ohne HSV-Konvertierung
+    mask, scale, offset = color_classifier.mask(frame, roi, width, height)
+    found, (x, y, radius), _ = blob_detector.find(mask)
+
+    if found:
+        x, y, radius = to_frame_coords(x, y, radius, scale, offset)
         if radius > 5:
-            center = (int(x), int(y))
-            cv2.circle(frame, center, int(radius), (0, 255, 0), 2)
-            cv2.circle(frame, center, 2, (0, 0, 255), 3)
             return frame, True, (int(x), int(y), int(radius))
 
     return frame, False, (None, None, None)
 
 
+def draw_ball(frame, dimensions):
+    x, y, r = dimensions
+    cv2.circle(frame, (int(x), int(y)), int(r), (0, 255, 0), 2)
+    cv2.circle(frame, (int(x), int(y)), 2, (0, 0, 255), 3)
+    return frame
+
 def draw_reference_circles(frame):
     h, w = frame.shape[:2]
     center = (w // 2, h // 2)
@@ -85,190 +145,147 @@ def draw_reference_circles(frame):
     return frame
 
 # --- Streaming Funktion ---
-def gen_frames():
-    global fps, mode, x_offset_initial, y_offset_initial
+def tracking_loop():
+    global fps
+    placement.apply("detect")
     frame_counter = 0
     previous_mode = mode
     no_ball_counter = 0
     MAX_NO_BALL_FRAMES = 20
 
     crop_active = False  # Ob aktuell der Crop-Modus läuft
-    # Sensorgröße (angepasst auf IMX296)
-    sensor_width = 800
-    sensor_height = 800
     start_time = time.time()
-
+    roi_predictor = RoiPredictor()
+    kalman = BallKalman(KALMAN_MODEL) if KALMAN_MODEL else None
+
+    def crop_target_time():
+        # Erstes Bild eines jetzt verschobenen Crops, auf der Uhr der SensorTimestamps
+        # (Verzoegerung seit der Belichtung ist damit schon enthalten)
+        return now_ns() / 1e9 + reconfigurer.move_latency_s()
+
+    def predicted_position(fallback):
+        # Wo ist der Ball, wenn ein jetzt verschobener Crop das erste Bild liefert?
+        if kalman is None or kalman.updates < KALMAN_MIN_UPDATES:
+            return fallback
+        return kalman.predict_position(crop_target_time())
+
+    def apply_crop(width, height, x_offset, y_offset):
+        # Bildkoordinaten verschieben sich mit dem Crop (geflippt)
+        old_width, old_height = reconfigurer.size
+        old_x, old_y = reconfigurer.offset
+        reconfigurer.apply(width, height, x_offset, y_offset)
+        roi_predictor.shift((x_offset - old_x) + (width - old_width),
+                            (y_offset - old_y) + (height - old_height))
+
+    crop_changes = 0
 
     while True:
-        frame = picam2.capture_array()
-        frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
+        capture_start = time.perf_counter()
+        try:
+            frame, metadata = capture_with_metadata(picam2)
+        except EOFError:
+            # Replay ohne loop ist zu Ende: Vorschau-Clients beenden statt ewig zu warten
+            print("frame source finished, stopping tracking")
+            hub.stop()
+            return
+        capture_time = time.perf_counter()
+        capture_stage.observe(capture_time - capture_start)
+        if reconfigurer.crop_moves + reconfigurer.reconfigurations != crop_changes:
+            # Kamera wurde fuer einen neuen Crop neu gestartet
+            crop_changes = reconfigurer.crop_moves + reconfigurer.reconfigurations
+            sensor_timing.restart()
+        sensor_timing.update(metadata)
+        sensor_timestamp = metadata["SensorTimestamp"]
+        frame_width, frame_height = reconfigurer.size
+        frame_x_offset, frame_y_offset = reconfigurer.offset
+        reconfigurer.tick()
 
         with mode_lock:
             current_mode = mode
-        
+
         if previous_mode != current_mode:
             print("restarting picam")
             # Crop deaktivieren, wieder ganzes Bild zeigen
             crop_active = False
             no_ball_counter = 0
-            set_camera_crop(CROP_WIDTH_SLOW, CROP_HEIGHT_SLOW)
-            picam2.stop()
-            video_config = picam2.create_video_configuration(
-                main={"size": (CROP_WIDTH_SLOW, CROP_HEIGHT_SLOW)},
-                raw=None,
-                controls={
-                    "NoiseReductionMode": 0,
-                    "FrameDurationLimits": (2000, 2000),
-                }
-            )
-            picam2.configure(video_config)
-            picam2.start()
-
-            sensor_width = 800
-            sensor_height = 800
-            x_offset_initial = (1440 - CROP_WIDTH_SLOW) // 2
-            y_offset_initial = (1088 - CROP_HEIGHT_SLOW) // 2
+            roi_predictor.reset()
+            hough_detector.reset()
+            if kalman is not None:
+                kalman.reset()
+            reconfigurer.apply(CROP_WIDTH_SLOW, CROP_HEIGHT_SLOW, x_offset_initial, y_offset_initial)
             previous_mode = current_mode
             print("picam restarted")
+            continue
 
         if current_mode == "hough":
-            frame = draw_reference_circles(frame)
-            frame, found, dimensions = detect_ball_hough(frame)
-        elif current_mode == "color":
-            frame, found, dimensions = detect_ball_color(frame)
-
-        #print(f"Ball bei ({dimensions[0]}, {dimensions[1]})")
-
-          
-
-        """
-        if found & found_old == False:
-            picam2.stop()
-            set_camera_crop(CROP_WIDTH_FAST, CROP_HEIGHT_FAST, int(dimensions[0] + CROP_WIDTH_FAST / 2), int(dimensions[1] + CROP_HEIGHT_FAST))
-            video_config = picam2.create_video_configuration(
-                main={"size": (CROP_WIDTH_FAST, CROP_HEIGHT_FAST)},
-                raw=None,
-                controls={
-                    "NoiseReductionMode": 0,  # deaktiviert Noise Reduction
-                    "FrameDurationLimits": (2000, 2000),  # 500 fps theoretisch
-                }
-            )
-            picam2.configure(video_config)
-            picam2.start()
-
-        if not found & found_old == True:
-            picam2.stop()
-            set_camera_crop(CROP_WIDTH_SLOW, CROP_HEIGHT_SLOW)
-            video_config = picam2.create_video_configuration(
-                main={"size": (CROP_WIDTH_SLOW, CROP_HEIGHT_SLOW)},
-                raw=None,
-                controls={
-                    "NoiseReductionMode": 0,  # deaktiviert Noise Reduction
-                    "FrameDurationLimits": (2000, 2000),  # 500 fps theoretisch
-                }
-            )
-            picam2.configure(video_config)
-            picam2.start()
-
-        found_old = found
-        """
-
+            # Hough direkt auf der Y-Ebene (View, keine Kopie, keine Farbkonvertierung)
+            detect = detect_ball_hough
+            search = luma(frame, frame_width, frame_height)
+        else:
+            # Farbmaske direkt aus YUV420 ueber die Lookup-Tabelle
+            def detect(frame, roi=None):
+                return detect_ball_color(frame, roi, frame_width, frame_height)
+            search = frame
+
+        detect_start = time.perf_counter()
+        if ROI_TRACKING:
+            search, found, dimensions = detect_with_roi(detect, search, roi_predictor, MIN_RADIUS,
+                                                        (frame_width, frame_height))
+        else:
+            search, found, dimensions = detect(search)
+        detect_stage.observe(time.perf_counter() - detect_start)
+        metrics.detection(found)
+        sensor_timing.position_ready(sensor_timestamp)
+        telemetry.add(*dimensions, found, sensor_timestamp,
+                      crop=(frame_x_offset, frame_y_offset, frame_width, frame_height),
+                      mode=current_mode)
+
+        if recorder.armed:
+            # Nur Kopie in den Ringpuffer, geschrieben wird im Recorder-Thread
+            recorder.add(frame, sensor_timestamp / 1e9,
+                         (frame_x_offset, frame_y_offset, frame_width, frame_height), found)
 
-        
-        # Im Frame-Loop oder wo du den Crop setzt:
         if found and dimensions[0] is not None and dimensions[1] is not None:
             no_ball_counter = 0  # Reset Counter, da Ball gefunden
-            if not crop_active or True:
+            width, height = reconfigurer.size
+            x_offset, y_offset = reconfigurer.offset
+            ball_x, ball_y = frame_to_sensor(dimensions[0], dimensions[1],
+                                             x_offset, y_offset, width, height)
+            if kalman is not None:
+                # Belichtungszeitpunkt statt Abholzeit: Schwankungen beim Abholen verfaelschen sonst v und a
+                kalman.update(ball_x, ball_y, sensor_timestamp / 1e9)
+            target_x, target_y = predicted_position((ball_x, ball_y))
+
+            if not crop_active:
+                # Wechsel in den schnellen Modus, Crop auf den Ball zentrieren
                 crop_active = True
+                new_offset = centered_offset(target_x, target_y, CROP_WIDTH_FAST, CROP_HEIGHT_FAST)
+            else:
+                # Nur verschieben, wenn der Ball (vorhergesagt) nahe am Rand ist
+                new_offset = crop_follower.update(x_offset, y_offset, target_x, target_y)
 
-                # Ball-Zentrum aus dimensions (zuvor erfasst)
-                ball_x = dimensions[0]
-                ball_y = dimensions[1]
-
-                # --- Flip durchführen ---
-                # 180° Rotation ≡ Horizontal + Vertikal Flip
-                ball_x = sensor_width - ball_x
-                ball_y = sensor_height - ball_y
-
-                # Offset berechnen, sodass der Ball in der Mitte des Crops liegt
-                x_offset = int(ball_x - CROP_WIDTH_FAST / 2) + x_offset_initial
-                y_offset = int(ball_y - CROP_HEIGHT_FAST / 2) +y_offset_initial
-
-                # Werte vom aktuellen offset in zwischenvariable / Initialwert speichern
-                x_offset_initial = x_offset
-                y_offset_initial = y_offset
-
-                # Offset begrenzen, damit wir nicht außerhalb des Sensors croppen
-                x_offset = max(0, min(x_offset, 1440 - CROP_WIDTH_FAST))
-                y_offset = max(0, min(y_offset, 1088 - CROP_HEIGHT_FAST))
-
-                # Debug-Ausgabe
-                print(f"Ball bei ({dimensions[0]}, {dimensions[1]}), gecropt bei ({x_offset}, {y_offset})")
-
-
-                # Crop setzen
-                set_camera_crop(CROP_WIDTH_FAST, CROP_HEIGHT_FAST, x_offset, y_offset)
-
-                
-                picam2.stop()
-                video_config = picam2.create_video_configuration(
-                    main={"size": (CROP_WIDTH_FAST, CROP_HEIGHT_FAST)},
-                    raw=None,
-                    controls={
-                        "NoiseReductionMode": 0,
-                        "FrameDurationLimits": (2000, 2000),
-                    }
-                )
-                picam2.configure(video_config)
-                picam2.start()
-
-                sensor_width = 400
-                sensor_height = 400
+            if new_offset is not None:
+                apply_crop(CROP_WIDTH_FAST, CROP_HEIGHT_FAST, *new_offset)
 
         else:
             no_ball_counter += 1
+            if crop_active and no_ball_counter <= KALMAN_COAST_FRAMES \
+                    and kalman is not None and kalman.updates >= KALMAN_MIN_UPDATES:
+                # Ball hat das Fenster verlassen: Crop zur vorhergesagten Position schieben
+                x_offset, y_offset = reconfigurer.offset
+                target_x, target_y = kalman.predict_position(crop_target_time())
+                new_offset = crop_follower.update(x_offset, y_offset, target_x, target_y)
+                if new_offset is not None:
+                    apply_crop(CROP_WIDTH_FAST, CROP_HEIGHT_FAST, *new_offset)
+
             if no_ball_counter >= MAX_NO_BALL_FRAMES and crop_active:
                 # Crop deaktivieren, wieder ganzes Bild zeigen
                 crop_active = False
                 no_ball_counter = 0
-                set_camera_crop(CROP_WIDTH_SLOW, CROP_HEIGHT_SLOW)
-                picam2.stop()
-                video_config = picam2.create_video_configuration(
-                    main={"size": (CROP_WIDTH_SLOW, CROP_HEIGHT_SLOW)},
-                    raw=None,
-                    controls={
-                        "NoiseReductionMode": 0,
-                        "FrameDurationLimits": (2000, 2000),
-                    }
-                )
-                picam2.configure(video_config)
-                picam2.start()
-
-                sensor_width = 800
-                sensor_height = 800
-                x_offset_initial = (1440 - CROP_WIDTH_SLOW) // 2
-                y_offset_initial = (1088 - CROP_HEIGHT_SLOW) // 2
-
-                
-
-
-        """
-        set_camera_crop(600, 600,
-                        0,
-                        0)
-        picam2.stop()
-
-        video_config = picam2.create_video_configuration(
-            main={"size": (600, 600)},
-            raw=None,
-            controls={
-                "NoiseReductionMode": 0,  # deaktiviert Noise Reduction
-                "FrameDurationLimits": (2000, 2000),  # 500 fps theoretisch
-            }
-        )
-        picam2.configure(video_config)
-        picam2.start()
-        """
+                roi_predictor.reset()
+                if kalman is not None:
+                    kalman.reset()
+                reconfigurer.apply(CROP_WIDTH_SLOW, CROP_HEIGHT_SLOW, x_offset_initial, y_offset_initial)
 
         # FPS berechnen
         frame_counter += 1
@@ -279,22 +296,52 @@ def gen_frames():
             frame_counter = 0
             start_time = time.time()
 
-        ret, buffer = cv2.imencode('.jpg', frame)
-        if not ret:
-            continue
-        frame_bytes = buffer.tobytes()
-
-        yield (b'--frame\r\n'
-               b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
+        # Vorschau wird im Encoder-Pool mit eigener Rate kodiert, nie hier; Modi
+        # ohne Client (z.B. "preview:client" ohne Telemetrie-Seite) ueberspringt der Encoder
+        for preview_mode in PREVIEW_MODES:
+            hub.submit(preview_mode, frame, copy=False,
+                       render=make_preview_render(preview_mode, current_mode, frame_width,
+                                                  frame_height, found, dimensions))
+        metrics.frame_done(time.perf_counter() - capture_time)
+
+def make_preview_render(preview_mode, mode, width, height, found, dimensions):
+    # Farbe und Overlay nur fuer Bilder, die wirklich kodiert werden; bei
+    # "preview:client" zeichnet der Browser den Ball
+    _, overlay = split_mode(preview_mode)
+
+    def render(frame):
+        start = time.perf_counter()
+        preview = yuv420_to_bgr(frame, width, height)
+        converted = time.perf_counter()
+        if mode == "hough":
+            preview = draw_reference_circles(preview)
+        if found and overlay:
+            preview = draw_ball(preview, dimensions)
+        convert_stage.observe(converted - start)
+        draw_stage.observe(time.perf_counter() - converted)
+        return preview
+    return render
+
+# Tracking laeuft unabhaengig von den Browsern, die nur die Vorschau abholen
+PREVIEW_MODES = with_client_overlay(("preview",))
+hub = StreamHub(modes=PREVIEW_MODES, preview_fps=PREVIEW_FPS, metrics=metrics,
+                placement=placement)
+hub.start()
+tracking_thread = threading.Thread(target=tracking_loop, name="detect", daemon=True)
+tracking_thread.start()
 
 # --- Flask-Routen ---
-@app.route('/video_feed')
-def video_feed():
+def select_mode(args):
+    # Der Stream-Parameter waehlt die Detektion, die Vorschau ist immer "preview"
+    # (mit ?overlay=client ohne Ball: "preview:client")
     global mode
-    requested_mode = request.args.get('mode', 'hough')
     with mode_lock:
-        mode = requested_mode
-    return Response(gen_frames(),
+        mode = args.get('mode', 'hough')
+    return stream_mode({'overlay': args.get('overlay')}, 'preview')
+
+@app.route('/video_feed')
+def video_feed():
+    return Response(hub.stream(select_mode(request.args)),
                     mimetype='multipart/x-mixed-replace; boundary=frame')
 
 @app.route('/fps')
@@ -303,6 +350,53 @@ def get_fps():
         current_fps = fps
     return f"{current_fps:.2f}"
 
+@app.route('/stats')
+def stats():
+    with fps_lock:
+        current_fps = fps
+    data = {'fps': round(current_fps, 2)}
+    data.update(reconfigurer.get_stats())
+    data['encoder'] = hub.encoder.get_stats()
+    data['hough'] = hough_detector.get_stats()
+    data['latency'] = metrics.summary()
+    data['timing'] = sensor_timing.get_stats()
+    data['threads'] = placement.get_stats()
+    data['telemetry'] = telemetry.get_stats()
+    data['recorder'] = recorder.get_stats()
+    return jsonify(data)
+
+@app.route('/timing')
+def timing():
+    return jsonify(sensor_timing.get_stats())
+
+@app.route('/metrics')
+def get_metrics():
+    return Response(metrics.render(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+@app.route('/record')
+def record():
+    # Letzte RECORD_PRE_SECONDS und folgende RECORD_POST_SECONDS sichern
+    # /record?arm=1 legt den Ringpuffer an; ausloesen erst, wenn Vorlauf vorhanden ist
+    if request.args.get('arm') == '1':
+        return jsonify({'armed': recorder.arm(), **recorder.get_stats()})
+    if not recorder.armed:
+        return jsonify({'error': 'recording not armed, use /record?arm=1'}), 409
+    started = recorder.trigger(request.args.get('reason', 'http'))
+    return jsonify({'started': started, **recorder.get_stats()})
+
+@app.route('/color_thresholds')
+def color_thresholds():
+    # z.B. /color_thresholds?lower=5,150,150&upper=25,255,255
+    lower, upper = color_classifier.get_thresholds()
+    try:
+        lower = parse_hsv(request.args['lower']) if 'lower' in request.args else lower
+        upper = parse_hsv(request.args['upper']) if 'upper' in request.args else upper
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    color_classifier.set_thresholds(lower, upper)
+    lower, upper = color_classifier.get_thresholds()
+    return jsonify({'lower': lower, 'upper': upper})
+
 @app.route('/')
 def index():
     return '''
@@ -338,15 +432,29 @@ def index():
                     color: white;
                 }
 
-                #video {
+                #view {
+                    position: relative;
                     transform: scale(2);
                     transform-origin: top center;
-                    display: block;
+                    width: fit-content;
                     margin: 20px auto;
+                }
+
+                #video {
+                    display: block;
                     max-width: 100%;
                 }
 
-                #fps {
+                #overlay {
+                    position: absolute;
+                    left: 0;
+                    top: 0;
+                    width: 100%;
+                    height: 100%;
+                    pointer-events: none;
+                }
+
+                #fps, #sensor {
                     font-size: 1.2em;
                     font-weight: bold;
                     color: black;
@@ -365,10 +473,23 @@ def index():
                 <button id="btn-color" onclick="changeMode('color')">Farbtracking Orange</button>
             </div>
             <div id="fps">FPS: Berechnung...</div>
-            <img id="video" src="/video_feed?mode=hough" />
+            <div id="sensor">Sensor: Berechnung...</div>
+            <div id="view">
+                <img id="video" src="/video_feed?mode=hough" />
+                <canvas id="overlay"></canvas>
+            </div>
             
 
-            <script>
+            <script>''' + TELEMETRY_JS + '''
+                let currentMode = 'hough';
+                // Mit Telemetrie zeichnet der Browser den Ball, der Stream kommt ohne
+                let clientOverlay = false;
+
+                function videoSource(mode) {
+                    return '/video_feed?mode=' + mode + (clientOverlay ? '&overlay=client' : '') +
+                        '&t=' + Date.now();
+                }
+
                 function fetchFPS() {
                     fetch('/fps?t=' + Date.now())
                         .then(response => response.text())
@@ -378,11 +499,31 @@ def index():
                         .catch(console.error);
                 }
 
-                setInterval(fetchFPS, 1000);
-                fetchFPS();
+                // FPS und Ball kommen per WebSocket; unter Flask weiter per Polling
+                startTelemetry({canvas: 'overlay', fps: 'fps', hz: 60, mode: () => currentMode,
+                                fallback: () => { setInterval(fetchFPS, 1000); fetchFPS(); },
+                                connected: (on) => {
+                                    clientOverlay = on;
+                                    document.getElementById('video').src = videoSource(currentMode);
+                                }});
+
+                function fetchTiming() {
+                    fetch('/timing?t=' + Date.now())
+                        .then(response => response.json())
+                        .then(t => {
+                            document.getElementById('sensor').innerText =
+                                'Sensor: ' + t.sensor_fps.toFixed(1) + ' fps | verloren: ' + t.frames_dropped +
+                                ' | Latenz: ' + t.mean_latency_ms.toFixed(1) + ' ms';
+                        })
+                        .catch(console.error);
+                }
+
+                setInterval(fetchTiming, 1000);
+                fetchTiming();
 
                 function changeMode(mode) {
-                    document.getElementById('video').src = '/video_feed?mode=' + mode + '&t=' + Date.now();
+                    currentMode = mode;
+                    document.getElementById('video').src = videoSource(mode);
                     document.getElementById('btn-hough').classList.toggle('active', mode === 'hough');
                     document.getElementById('btn-color').classList.toggle('active', mode === 'color');
                 }
@@ -393,4 +534,6 @@ def index():
 
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, threaded=True)
+    # STREAM_SERVER=asyncio: alle Clients in einem Event-Loop statt einem Thread pro Stream
+    run_server(app, hub, host='0.0.0.0', port=5000, select_mode=select_mode,
+               websockets={'/telemetry': telemetry.websocket}, placement=placement)
@@ -0,0 +1,113 @@
+"""
+Latest-frame-wins Ringpuffer zwischen Capture- und Detektions-Thread
+"""
+import threading
+import numpy as np
+
+
+class FrameRing:
+    """
+    Kleiner, vorab allokierter Ringpuffer fuer Kamerabilder.
+
+    Der Capture-Thread schreibt jedes Bild mit put() in einen freien Slot,
+    der Detektions-Thread holt sich mit get_latest() immer nur das neueste
+    Bild. Aeltere, noch nicht abgeholte Bilder werden verworfen (gezaehlt in
+    frames_dropped). Der Slot, der gerade gelesen wird, wird beim Schreiben
+    uebersprungen, so dass der Leser ohne Kopie auf dem Bild arbeiten kann.
+    Zu jedem Slot wird ein Zeitstempel (z.B. SensorTimestamp) mitgefuehrt.
+
+    Args:
+        slots (int): Anzahl Slots (mindestens 3: lesen, neuestes, schreiben)
+    """
+
+    def __init__(self, slots=3):
+        if slots < 3:
+            raise ValueError("FrameRing needs at least 3 slots")
+        self.slots = slots
+        self.buffer = None
+        self.timestamps = [None] * slots
+        self.cond = threading.Condition()
+        self.latest_slot = None
+        self.reading_slot = None
+        self.write_slot = 0
+        self.seq = 0
+        self.closed = False
+
+        # Zaehler
+        self.frames_written = 0
+        self.frames_dropped = 0
+        self.frames_read = 0
+
+    def _allocate(self, frame):
+        # Puffer einmalig mit Form und Typ des ersten Bildes anlegen
+        self.buffer = np.empty((self.slots,) + frame.shape, dtype=frame.dtype)
+
+    def put(self, frame, timestamp=None):
+        """Kopiert ein Bild in den naechsten freien Slot und veroeffentlicht es."""
+        if self.buffer is None or self.buffer.shape[1:] != frame.shape \
+                or self.buffer.dtype != frame.dtype:
+            with self.cond:
+                self._allocate(frame)
+                self.latest_slot = None
+
+        # Slot waehlen, der weder gelesen wird noch das neueste Bild enthaelt
+        with self.cond:
+            busy = (self.reading_slot, self.latest_slot)
+        slot = self.write_slot
+        while slot in busy:
+            slot = (slot + 1) % self.slots
+
+        np.copyto(self.buffer[slot], frame)
+        self.timestamps[slot] = timestamp
+
+        with self.cond:
+            self.latest_slot = slot
+            self.seq += 1
+            self.frames_written += 1
+            self.cond.notify_all()
+        self.write_slot = (slot + 1) % self.slots
+
+    def get_latest(self, last_seq=0, timeout=None):
+        """
+        Wartet auf ein Bild, das neuer ist als last_seq, und gibt es zurueck.
+
+        Das Bild ist eine View in den Ringpuffer und bleibt gueltig, bis
+        release() oder get_latest() erneut aufgerufen wird.
+
+        Returns:
+            tuple: (seq, frame) oder (last_seq, None) bei Timeout/close()
+        """
+        with self.cond:
+            self.reading_slot = None
+            if not self.cond.wait_for(
+                    lambda: self.seq > last_seq or self.closed, timeout):
+                return last_seq, None
+            if self.closed and self.seq <= last_seq:
+                return last_seq, None
+
+            # Alles zwischen dem letzten gelesenen und dem neuesten Bild ist verloren
+            if last_seq:
+                self.frames_dropped += self.seq - last_seq - 1
+            else:
+                self.frames_dropped += self.seq - 1
+            self.frames_read += 1
+            self.reading_slot = self.latest_slot
+            return self.seq, self.buffer[self.reading_slot]
+
+    def read_timestamp(self):
+        """Zeitstempel des Bildes, das get_latest() zuletzt geliefert hat."""
+        with self.cond:
+            if self.reading_slot is None:
+                return None
+            return self.timestamps[self.reading_slot]
+
+    def release(self):
+        """Gibt den aktuell gelesenen Slot wieder fuer den Schreiber frei."""
+        with self.cond:
+            self.reading_slot = None
+
+    def close(self):
+        """Weckt wartende Leser auf, z.B. beim Beenden."""
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
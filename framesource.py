@@ -0,0 +1,556 @@
+"""
+Austauschbare Bildquellen: Picamera2, Wiedergabe von Aufnahmen, synthetischer Ball
+
+Alle Quellen bieten den Teil der Picamera2-API, den die Skripte nutzen
+(create_video_configuration, configure, set_controls, start, stop,
+capture_array, capture_request, camera_config, controls). Damit laufen die Flask-Apps und
+der Balltracker auch ohne Kamera, z.B. fuer Lasttests auf einem x86-Server.
+
+Auswahl ueber die Umgebungsvariable FRAME_SOURCE:
+    FRAME_SOURCE=camera                                   (Standard, Picamera2)
+    FRAME_SOURCE=synthetic                                (orange Ball, 500 fps)
+    FRAME_SOURCE=synthetic:speed=1500,noise=10,blur=0     (Optionen als key=value)
+    FRAME_SOURCE=replay:recordings/20250101-120000_http   (Aufnahme aus recorder.py)
+    FRAME_SOURCE=replay:wurf.avi,realtime=0,loop=1        (Video/Bildordner, max. Tempo)
+"""
+import os
+import glob
+import time
+from abc import ABC, abstractmethod
+import cv2
+import numpy as np
+from GSCrop import SENSOR_WIDTH, SENSOR_HEIGHT, CropController, set_camera_crop
+from yuv import yuv420_to_bgr
+
+# Picamera2-Standard fuer den Main-Stream einer Video-Konfiguration
+DEFAULT_FORMAT = "XBGR8888"
+DEFAULT_FRAME_DURATION_US = 2000
+BALL_BGR = (0, 140, 255)
+
+
+def bgr_to_format(bgr, pixel_format):
+    """BGR-Bild in das Speicherlayout von Picamera2 umwandeln."""
+    if pixel_format == "YUV420":
+        return cv2.cvtColor(bgr, cv2.COLOR_BGR2YUV_I420)
+    if pixel_format == "RGB888":
+        return bgr  # Picamera2 "RGB888" liegt als [B, G, R] im Speicher
+    if pixel_format == "BGR888":
+        return cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
+    if pixel_format == "XRGB8888":
+        return cv2.cvtColor(bgr, cv2.COLOR_BGR2BGRA)
+    if pixel_format in (None, "XBGR8888"):
+        return cv2.cvtColor(bgr, cv2.COLOR_BGR2RGBA)  # [R, G, B, 255]
+    raise ValueError(f"unsupported pixel format {pixel_format}")
+
+
+def format_to_bgr(frame, pixel_format, width=None, height=None):
+    """Umkehrung von bgr_to_format (fuer YUV420 mit Bildgroesse)."""
+    if pixel_format == "YUV420":
+        if height is None:
+            height = frame.shape[0] * 2 // 3
+        return yuv420_to_bgr(frame, width or frame.shape[1], height)
+    if pixel_format == "RGB888":
+        return frame
+    if pixel_format == "XRGB8888":
+        return cv2.cvtColor(frame, cv2.COLOR_BGRA2BGR)
+    if frame.ndim == 3 and frame.shape[2] == 4:
+        return cv2.cvtColor(frame, cv2.COLOR_RGBA2BGR)
+    return cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
+
+
+def render_background(kind, width, height, rng):
+    """Hintergrund fuer synthetische Szenen: "smooth" (Textur) oder "clutter" (viele Kanten)."""
+    if kind == "smooth":
+        gray = cv2.GaussianBlur(rng.integers(40, 110, (height, width), dtype=np.uint8), (0, 0), 6)
+        return cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
+    if kind == "clutter":
+        # Viele Kanten fuer Hough, aber entsaettigt, damit nichts orange ist
+        img = np.full((height, width, 3), 90, np.uint8)
+
+        def color():
+            return tuple(int(v) for v in int(rng.integers(0, 220)) + rng.integers(0, 25, 3))
+
+        n = max(1, width * height // 4000)
+        for _ in range(n):
+            p1 = tuple(int(v) for v in rng.integers(0, max(width, height), 2))
+            p2 = tuple(int(v) for v in rng.integers(0, max(width, height), 2))
+            cv2.line(img, p1, p2, color(), 2)
+        for _ in range(max(1, n // 4)):
+            p1 = tuple(int(v) for v in rng.integers(0, max(width, height), 2))
+            p2 = tuple(int(v) for v in rng.integers(0, max(width, height), 2))
+            cv2.rectangle(img, p1, p2, color(), -1)
+        return img
+    raise ValueError(f"unknown background {kind}")
+
+
+class _Request:
+    """Ersatz fuer den CompletedRequest von Picamera2 (make_array, get_metadata, release)."""
+
+    def __init__(self, frame, metadata):
+        self.frame = frame
+        self.metadata = metadata
+
+    def make_array(self, name="main"):
+        return self.frame
+
+    def get_metadata(self):
+        return dict(self.metadata)
+
+    def release(self):
+        pass
+
+
+class FrameSource(ABC):
+    """
+    Basis fuer Bildquellen ohne Kamera, mit Picamera2-kompatibler API.
+    Unterklassen liefern die Bilder ueber render(index).
+
+    Im Echtzeitbetrieb verhaelt sich die Quelle wie ein Sensor: Bilder
+    entstehen im Takt der FrameDurationLimits, wer zu langsam abholt,
+    bekommt das neueste Bild und verpasst die dazwischen (frames_skipped).
+    Ohne Echtzeit wird jedes Bild sofort geliefert (maximales Tempo).
+    capture_request() liefert dazu Metadaten wie Picamera2; der
+    SensorTimestamp ist der simulierte Belichtungsstart auf time.monotonic_ns().
+
+    Args:
+        realtime (bool): Im Kameratakt liefern statt so schnell wie moeglich
+    """
+
+    def __init__(self, realtime=True):
+        self.realtime = realtime
+        self.camera_config = None
+        self.controls = {}
+        self.size = None
+        self.pixel_format = DEFAULT_FORMAT
+        self.frame_duration_us = DEFAULT_FRAME_DURATION_US
+        self.crop = None  # (x_offset, y_offset, width, height) auf dem Sensor
+        self.started = False
+        self.start_time = None
+        self.start_ns = None
+        self.frame_index = -1
+
+        # Statistik
+        self.frames_delivered = 0
+        self.frames_skipped = 0
+
+    # --- Picamera2-kompatible API ---
+    def create_video_configuration(self, main=None, raw=None, controls=None, **kwargs):
+        main = dict(main or {})
+        main.setdefault("size", (640, 480))
+        main.setdefault("format", DEFAULT_FORMAT)
+        return {"main": main, "raw": raw, "controls": dict(controls or {})}
+
+    def configure(self, config):
+        self.camera_config = config
+        self.size = tuple(config["main"]["size"])
+        self.pixel_format = config["main"].get("format", DEFAULT_FORMAT)
+        self.set_controls(config.get("controls") or {})
+        if self.crop is None or self.crop[2:] != self.size:
+            # Ohne expliziten Crop: zentriert, wie set_camera_crop ohne Offset
+            width, height, x, y = CropController.snap(*self.size)
+            self.crop = (x, y, width, height)
+
+    def set_controls(self, controls):
+        self.controls.update(controls)
+        limits = controls.get("FrameDurationLimits")
+        if limits:
+            self.frame_duration_us = max(1, int(limits[0]))
+
+    def start(self):
+        if self.size is None:
+            raise RuntimeError("frame source must be configured before start")
+        self.started = True
+        self.start_time = time.perf_counter()
+        self.start_ns = time.monotonic_ns()
+        self.frame_index = -1
+
+    def stop(self):
+        self.started = False
+
+    def close(self):
+        self.stop()
+
+    def capture_array(self, name="main"):
+        if not self.started:
+            raise RuntimeError("frame source not started")
+        index = self._next_index()
+        self.frames_delivered += 1
+        return self.render(index)
+
+    def capture_request(self, name="main"):
+        if not self.started:
+            raise RuntimeError("frame source not started")
+        index = self._next_index()
+        self.frames_delivered += 1
+        frame = self.render(index)
+        return _Request(frame, self.metadata(index))
+
+    def metadata(self, index):
+        # Bild ist zum Zeitpunkt frame_time(index) fertig, belichtet wurde eine Bilddauer davor
+        if self.realtime:
+            ready_ns = self.start_ns + int(self.frame_time(index) * 1e9)
+        else:
+            ready_ns = time.monotonic_ns()
+        return {
+            "SensorTimestamp": ready_ns - self.frame_duration_us * 1000,
+            "FrameDuration": self.frame_duration_us,
+            "ExposureTime": self.exposure_time_us(),
+        }
+
+    def exposure_time_us(self):
+        return self.controls.get("ExposureTime", self.frame_duration_us)
+
+    # --- Crop wie auf dem Sensor ---
+    def set_crop(self, width, height, x_offset=None, y_offset=None):
+        width, height, x_offset, y_offset = CropController.snap(width, height, x_offset, y_offset)
+        self.crop = (x_offset, y_offset, width, height)
+        return True
+
+    # --- Takt ---
+    def frame_time(self, index):
+        """Zeit des Bildes index relativ zum Start in Sekunden."""
+        return index * self.frame_duration_us / 1_000_000.0
+
+    def frame_at(self, elapsed):
+        """Index des zuletzt fertigen Bildes zum Zeitpunkt elapsed."""
+        return int(elapsed * 1_000_000.0 // self.frame_duration_us)
+
+    def _next_index(self):
+        index = self.frame_index + 1
+        if self.realtime:
+            elapsed = time.perf_counter() - self.start_time
+            latest = self.frame_at(elapsed)
+            if latest > index:
+                # Zu langsam abgeholt: wie am Sensor nur das neueste Bild
+                self.frames_skipped += latest - index
+                index = latest
+            else:
+                delay = self.frame_time(index) - elapsed
+                if delay > 0:
+                    time.sleep(delay)
+        self.frame_index = index
+        return index
+
+    @abstractmethod
+    def render(self, index):
+        """
+        Bild index im konfigurierten Format und Crop erzeugen (von Unterklassen implementiert).
+
+        Args:
+            index (int): Bildnummer seit start(), Zeitpunkt ist frame_time(index)
+
+        Returns:
+            np.ndarray: Bild im Speicherlayout von Picamera2 (siehe bgr_to_format)
+
+        Raises:
+            EOFError: Die Quelle hat keine weiteren Bilder
+        """
+
+    def get_stats(self):
+        return {
+            "source": type(self).__name__,
+            "realtime": self.realtime,
+            "frames_delivered": self.frames_delivered,
+            "frames_skipped": self.frames_skipped,
+        }
+
+
+class SyntheticSource(FrameSource):
+    """
+    Rendert einen orangen Ball, der mit konstanter Geschwindigkeit ueber den
+    ganzen Sensor fliegt und an den Raendern abprallt. Ausgegeben wird der
+    aktuelle Crop, d.h. Crop-Verschiebungen wirken wie auf der Kamera.
+
+    Die Position haengt nur von der Bildnummer ab (Bildnummer * Bilddauer),
+    Laeufe sind also reproduzierbar. last_truth enthaelt die wahre Position
+    (x, y, r) im zuletzt gelieferten Bild oder None.
+
+    Args:
+        realtime (bool): Im Kameratakt liefern statt so schnell wie moeglich
+        speed (float): Geschwindigkeit in Sensor-Pixel pro Sekunde
+        angle (float): Flugrichtung in Grad
+        radius (float): Ballradius in Pixel
+        noise (int): Amplitude des Bildrauschens (0 = aus)
+        blur (bool): Bewegungsunschaerfe waehrend der Belichtung
+        exposure_us (int, optional): Belichtungszeit fuer die Unschaerfe, Standard ist die Bilddauer
+        background (str): "smooth" oder "clutter"
+        rotate180 (bool): Bild um 180 Grad drehen (Kamera ueber Kopf montiert)
+        seed (int): Startwert fuer Hintergrund und Rauschen
+    """
+
+    NOISE_BANK = 8
+
+    def __init__(self, realtime=True, speed=600.0, angle=35.0, radius=30.0, noise=6, blur=True,
+                 exposure_us=None, background="smooth", rotate180=False, seed=0):
+        super().__init__(realtime)
+        self.speed = float(speed)
+        self.angle = np.radians(float(angle))
+        self.radius = float(radius)
+        self.noise = int(noise)
+        self.blur = bool(blur)
+        self.exposure_us = exposure_us
+        self.rotate180 = bool(rotate180)
+        self.rng = np.random.default_rng(seed)
+        self.scene = render_background(background, SENSOR_WIDTH, SENSOR_HEIGHT, self.rng)
+        self.noise_bank = None
+        self.last_truth = None
+
+    def exposure_time_us(self):
+        return self.exposure_us or super().exposure_time_us()
+
+    def configure(self, config):
+        super().configure(config)
+        width, height = self.size
+        if self.noise:
+            # Rauschen einmal erzeugen und zyklisch verwenden (rng pro Bild waere zu langsam)
+            self.noise_bank = self.rng.integers(0, self.noise, (self.NOISE_BANK, height, width, 3),
+                                                dtype=np.uint8)
+
+    @staticmethod
+    def _reflect(u, low, high):
+        span = high - low
+        m = (u - low) % (2 * span)
+        return low + (m if m <= span else 2 * span - m)
+
+    def ball_position(self, t):
+        """Ballmittelpunkt in Sensor-Koordinaten zum Zeitpunkt t (Sekunden)."""
+        r = self.radius
+        x = SENSOR_WIDTH * 0.3 + self.speed * np.cos(self.angle) * t
+        y = SENSOR_HEIGHT * 0.3 + self.speed * np.sin(self.angle) * t
+        return (self._reflect(x, r, SENSOR_WIDTH - r), self._reflect(y, r, SENSOR_HEIGHT - r))
+
+    def render(self, index):
+        width, height = self.size
+        x0, y0, crop_w, crop_h = self.crop
+        t = self.frame_time(index)
+        bx, by = self.ball_position(t)
+        bx -= x0
+        by -= y0
+
+        frame = np.empty((height, width, 3), np.uint8)
+        view = self.scene[y0:y0 + height, x0:x0 + width]
+        frame[:view.shape[0], :view.shape[1]] = view
+        frame[view.shape[0]:] = 90
+        frame[:, view.shape[1]:] = 90
+        self._draw_ball(frame, bx, by, t)
+
+        if self.noise_bank is not None:
+            cv2.add(frame, self.noise_bank[index % self.NOISE_BANK], dst=frame)
+        if self.rotate180:
+            frame = cv2.rotate(frame, cv2.ROTATE_180)
+            bx, by = width - 1 - bx, height - 1 - by
+
+        r = self.radius
+        visible = -r < bx < width + r and -r < by < height + r
+        self.last_truth = (float(bx), float(by), r) if visible else None
+        return bgr_to_format(frame, self.pixel_format)
+
+    def _draw_ball(self, frame, bx, by, t):
+        r = self.radius
+        height, width = frame.shape[:2]
+        exposure = (self.exposure_us or self.frame_duration_us) / 1_000_000.0
+        streak = self.speed * exposure if self.blur else 0.0
+        margin = int(r + streak) + 3
+        px0, py0 = max(0, int(bx) - margin), max(0, int(by) - margin)
+        px1, py1 = min(width, int(bx) + margin + 1), min(height, int(by) + margin + 1)
+        if px1 <= px0 or py1 <= py0:
+            return
+
+        # Ballmaske im Ausschnitt, Subpixel-genau gezeichnet
+        shift = 4
+        mask = np.zeros((py1 - py0, px1 - px0), np.float32)
+        center = (int(round((bx - px0) * 16)), int(round((by - py0) * 16)))
+        cv2.circle(mask, center, int(round(r * 16)), 1.0, -1, cv2.LINE_AA, shift)
+        if streak >= 1.0:
+            # Bewegungsunschaerfe: Maske entlang der momentanen Flugrichtung verschmieren
+            dx, dy = np.subtract(self.ball_position(t + 1e-4), self.ball_position(t))
+            norm = np.hypot(dx, dy) or 1.0
+            length = int(np.ceil(streak)) | 1
+            kernel = np.zeros((length, length), np.float32)
+            c = length // 2
+            cv2.line(kernel, (int(round(c - dx / norm * c)), int(round(c - dy / norm * c))),
+                     (int(round(c + dx / norm * c)), int(round(c + dy / norm * c))), 1.0, 1)
+            kernel /= kernel.sum()
+            mask = cv2.filter2D(mask, -1, kernel)
+
+        patch = frame[py0:py1, px0:px1].astype(np.float32)
+        alpha = mask[..., None]
+        patch = patch * (1.0 - alpha) + np.array(BALL_BGR, np.float32) * alpha
+        frame[py0:py1, px0:px1] = patch.astype(np.uint8)
+
+
+class ReplaySource(FrameSource):
+    """
+    Spielt Aufnahmen ab: Ordner aus recorder.py (Rohbilder mit Zeitstempeln),
+    Videodateien oder Ordner mit Einzelbildern.
+
+    Im Echtzeitbetrieb bestimmen die aufgezeichneten Zeitstempel (bzw. die
+    Bilddauer) den Takt. Bilder werden in das konfigurierte Format
+    umgewandelt und bei abweichender Groesse skaliert.
+
+    Args:
+        path (str): Aufnahmeordner, Video oder Bildordner
+        realtime (bool): Im Originaltakt liefern statt so schnell wie moeglich
+        loop (bool): Am Ende von vorne beginnen, sonst EOFError
+        preload (bool): Video/Bilder vorab dekodieren (fuer Lasttests mit max. Tempo)
+    """
+
+    def __init__(self, path, realtime=True, loop=True, preload=True):
+        super().__init__(realtime)
+        self.path = path
+        self.loop = bool(loop)
+        self.source_format = "RGB888"  # BGR wie von OpenCV
+        self.timestamps = None
+        self.frames = None
+        self.meta = None
+        self.capture = None
+
+        if os.path.isdir(path) and os.path.exists(os.path.join(path, "info.json")):
+            # Rohaufnahme aus recorder.py, wird nur gemappt
+            from recorder import load_recording
+            info, self.meta, self.raw = load_recording(path)
+            self.source_format = info.get("capture_format") or DEFAULT_FORMAT
+            self.count = len(self.meta)
+            ts = self.meta["timestamp"]
+            self.timestamps = ts - ts[0]
+        elif os.path.isdir(path):
+            names = sorted(glob.glob(os.path.join(path, "*")))
+            self.frames = [img for img in (cv2.imread(n) for n in names) if img is not None]
+            self.count = len(self.frames)
+        else:
+            cap = cv2.VideoCapture(path)
+            fps = cap.get(cv2.CAP_PROP_FPS)
+            if preload:
+                self.frames = []
+                while True:
+                    ok, img = cap.read()
+                    if not ok:
+                        break
+                    self.frames.append(img)
+                cap.release()
+                self.count = len(self.frames)
+            else:
+                self.capture = cap
+                self.count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            if fps and fps > 0:
+                self.timestamps = np.arange(self.count) / fps
+        if not self.count:
+            raise RuntimeError(f"no frames in {path}")
+
+        if self.timestamps is not None and self.count > 1:
+            # Dauer einer Runde inkl. letztem Bild
+            self.lap = self.timestamps[-1] + float(np.median(np.diff(self.timestamps)))
+        else:
+            self.lap = None
+
+    def frame_time(self, index):
+        if self.timestamps is None or self.lap is None:
+            return super().frame_time(index)
+        lap, i = divmod(index, self.count)
+        return lap * self.lap + self.timestamps[i]
+
+    def frame_at(self, elapsed):
+        if self.timestamps is None or self.lap is None:
+            return super().frame_at(elapsed)
+        lap = int(elapsed // self.lap)
+        i = int(np.searchsorted(self.timestamps, elapsed - lap * self.lap, side="right")) - 1
+        return lap * self.count + max(i, 0)
+
+    def render(self, index):
+        if index >= self.count and not self.loop:
+            raise EOFError("replay finished")
+        i = index % self.count
+
+        if self.meta is not None:
+            from recorder import recording_frame
+            frame = recording_frame(self.raw, self.meta[i])
+            if self.source_format == self.pixel_format and self._same_size(frame):
+                return np.array(frame)  # Kopie, Aufrufer duerfen hineinzeichnen
+            height = int(self.meta[i]["height"]) * 2 // 3 if self.source_format == "YUV420" else None
+            bgr = format_to_bgr(frame, self.source_format, int(self.meta[i]["width"]), height)
+        elif self.frames is not None:
+            bgr = self.frames[i]
+        else:
+            if i == 0:
+                self.capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ok, bgr = self.capture.read()
+            if not ok:
+                raise EOFError("replay finished")
+
+        width, height = self.size
+        if bgr.shape[1] != width or bgr.shape[0] != height:
+            bgr = cv2.resize(bgr, (width, height), interpolation=cv2.INTER_AREA)
+        out = bgr_to_format(bgr, self.pixel_format)
+        return out.copy() if out is bgr else out
+
+    def _same_size(self, frame):
+        width, height = self.size
+        if self.pixel_format == "YUV420":
+            return frame.shape[1] == width and frame.shape[0] == height * 3 // 2
+        return frame.shape[1] == width and frame.shape[0] == height
+
+
+# --- Auswahl ---
+def _parse_value(text):
+    lowered = text.lower()
+    if lowered in ("true", "yes", "on"):
+        return True
+    if lowered in ("false", "no", "off"):
+        return False
+    for cast in (int, float):
+        try:
+            return cast(text)
+        except ValueError:
+            pass
+    return text
+
+
+def open_frame_source(spec=None, rotate180=False):
+    """
+    Bildquelle nach spec oder FRAME_SOURCE oeffnen (Standard: Picamera2).
+
+    Args:
+        spec (str, optional): "camera", "synthetic[:key=value,...]" oder
+            "replay:<pfad>[,key=value,...]"
+        rotate180 (bool): Fuer die synthetische Quelle: Kamera ist ueber Kopf
+            montiert (wie beim dynamischen Tracker)
+
+    Returns:
+        Picamera2 oder FrameSource
+    """
+    spec = spec or os.environ.get("FRAME_SOURCE", "camera")
+    kind, _, rest = spec.partition(":")
+    parts = [p for p in rest.split(",") if p] if rest else []
+
+    if kind == "camera":
+        from picamera2 import Picamera2
+        return Picamera2()
+
+    if kind == "replay":
+        if not parts:
+            raise ValueError("replay needs a path, e.g. replay:recordings/<name>")
+        path, parts = parts[0], parts[1:]
+    options = {}
+    for part in parts:
+        key, _, value = part.partition("=")
+        options[key.strip()] = _parse_value(value.strip())
+
+    if kind == "synthetic":
+        options.setdefault("rotate180", rotate180)
+        return SyntheticSource(**options)
+    if kind == "replay":
+        return ReplaySource(path, **options)
+    raise ValueError(f"unknown frame source {spec}")
+
+
+def crop_setter(source):
+    """Funktion (width, height, x, y) fuer den Crop dieser Quelle; None = Sensor per GSCrop."""
+    return source.set_crop if isinstance(source, FrameSource) else None
+
+
+def set_source_crop(source, width, height, x_offset=None, y_offset=None):
+    """Wie GSCrop.set_camera_crop, setzt bei Quellen ohne Kamera nur deren Crop."""
+    setter = crop_setter(source)
+    if setter is not None:
+        return setter(width, height, x_offset, y_offset)
+    return set_camera_crop(width, height, x_offset, y_offset)
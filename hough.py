@@ -0,0 +1,220 @@
+"""
+Hough-Kreisdetektion mit adaptivem Radiusband
+"""
+import time
+import cv2
+from pyramid import PyramidHoughDetector
+
+
+class AdaptiveHoughDetector:
+    """
+    Gemeinsamer Hough-Detektor fuer alle Skripte.
+
+    Die Laufzeit von HoughCircles waechst mit der Breite des Radiusbands.
+    Im adaptiven Modus wird nach einem Treffer nur noch in einem Band um
+    den zuletzt bestaetigten Radius gesucht. minDist waechst mit dem Band
+    (naehere Kreise sind derselbe Ball), param2 wird gesenkt, da im schmalen
+    Band kaum Fehlkreise entstehen. Bei jedem Fehlschlag wird das Band um
+    widen_factor verbreitert, bis es wieder den vollen Bereich
+    min_radius..max_radius abdeckt.
+
+    Ganzbildsuchen auf grossen Bildern laufen optional grob-zu-fein ueber
+    den PyramidHoughDetector, mit demselben Radiusband.
+
+    Args:
+        min_radius (int): Kleinster Radius des vollen Suchbereichs
+        max_radius (int): Groesster Radius des vollen Suchbereichs
+        dp (float): Aufloesung des Hough-Akkumulators
+        min_dist (float): Minimaler Abstand zwischen Kreisen (volles Band)
+        param1 (float): Obere Canny-Schwelle
+        param2 (float): Akkumulator-Schwelle fuer das volle Band
+        blur (int): Kernelgroesse des Median-Filters (0 = aus)
+        adaptive (bool): Radiusband an den letzten Radius anpassen
+        band_factor (float): Halbe Bandbreite als Anteil des letzten Radius
+        min_band (int): Minimale halbe Bandbreite in Pixel
+        widen_factor (float): Verbreiterung des Bands pro Fehlschlag
+        narrow_param2_factor (float): Faktor fuer param2 im schmalen Band
+        pyramid_min_width (int, optional): Ganzbildsuchen ab dieser Bildbreite grob-zu-fein
+    """
+
+    def __init__(self, min_radius=20, max_radius=100, dp=1.5, min_dist=50, param1=100,
+                 param2=30, blur=5, adaptive=True, band_factor=0.2, min_band=4,
+                 widen_factor=2.0, narrow_param2_factor=0.8, pyramid_min_width=None):
+        self.min_radius = min_radius
+        self.max_radius = max_radius
+        self.dp = dp
+        self.min_dist = min_dist
+        self.param1 = param1
+        self.param2 = param2
+        self.blur = blur
+        self.adaptive = adaptive
+        self.band_factor = band_factor
+        self.min_band = min_band
+        self.widen_factor = widen_factor
+        self.narrow_param2_factor = narrow_param2_factor
+        self.pyramid_min_width = pyramid_min_width
+        self.pyramid = None
+        if pyramid_min_width is not None:
+            self.pyramid = PyramidHoughDetector(min_radius, max_radius, dp=dp,
+                                                min_dist=min_dist, param1=param1,
+                                                param2=param2)
+        self.reset()
+
+        # Statistik
+        self.calls = 0
+        self.hits = 0
+        self.misses = 0
+        self.narrow_calls = 0
+        self.last_ms = 0.0
+        self.mean_ms_full = 0.0
+        self.mean_ms_narrow = 0.0
+
+    def reset(self):
+        """Zurueck auf das volle Radiusband, z.B. nach einem Moduswechsel."""
+        self.last_radius = None
+        self.half_band = None
+
+    def band(self):
+        """Aktuelles Radiusband (min, max) in Pixel."""
+        if not self.adaptive or self.last_radius is None:
+            return self.min_radius, self.max_radius
+        low = max(self.min_radius, int(self.last_radius - self.half_band))
+        high = min(self.max_radius, int(self.last_radius + self.half_band + 0.5) + 1)
+        return low, high
+
+    def _parameters(self, low, high):
+        # Kreise naeher als der kleinste Radius sind derselbe Ball
+        min_dist = max(self.min_dist, low)
+        # Im schmalen Band gibt es kaum Fehlkreise, die Schwelle darf lockerer sein
+        # (hilft bei Bewegungsunschaerfe)
+        if (low, high) != (self.min_radius, self.max_radius):
+            return min_dist, self.param2 * self.narrow_param2_factor
+        return min_dist, self.param2
+
+    def search_parameters(self):
+        """
+        Parameter fuer die naechste Suche aus dem aktuellen Band.
+
+        Returns:
+            tuple: (low, high, min_dist, param2)
+        """
+        low, high = self.band()
+        min_dist, param2 = self._parameters(low, high)
+        return low, high, min_dist, param2
+
+    def detect(self, frame, roi=None):
+        """
+        Sucht den staerksten Kreis im Bild oder im Fenster roi = (x0, y0, x1, y1).
+
+        Args:
+            frame (np.ndarray): Graustufen- (z.B. Y-Ebene) oder BGR-Bild
+            roi (tuple, optional): Suchfenster
+
+        Returns:
+            tuple: (found, (x, y, r)) in Bildkoordinaten, sonst (False, (None, None, None))
+        """
+        start = time.perf_counter()
+        parameters = self.search_parameters()
+        found, dimensions = self.detect_with(frame, roi, *parameters)
+        self.feedback(found, dimensions[2], parameters, (time.perf_counter() - start) * 1000.0)
+        return found, dimensions
+
+    def detect_with(self, frame, roi, low, high, min_dist, param2):
+        """
+        Eine Suche mit festen Parametern, ohne das Band zu veraendern.
+
+        Wird von detect() und von den Worker-Prozessen der parallelen
+        Detektion verwendet (dort kommen die Parameter vom Hauptprozess).
+        """
+        x0, y0 = (roi[0], roi[1]) if roi is not None else (0, 0)
+        search = frame[roi[1]:roi[3], roi[0]:roi[2]] if roi is not None else frame
+        if search.ndim == 2:
+            # Y-Ebene aus YUV420: schon ein Graustufenbild
+            gray = search
+        else:
+            gray = cv2.cvtColor(search, cv2.COLOR_BGR2GRAY)
+
+        if roi is None and self.pyramid is not None and gray.shape[1] >= self.pyramid_min_width:
+            found, dimensions = self.pyramid.detect(gray, low, high, min_dist, param2)
+        else:
+            found, dimensions = self._hough(gray, low, high, min_dist, param2)
+        if found:
+            x, y, r = dimensions
+            dimensions = (x + x0, y + y0, r)
+        return found, dimensions
+
+    def feedback(self, found, radius, parameters, elapsed_ms):
+        """
+        Ergebnis einer Suche mit search_parameters() eintragen (Band und Statistik).
+
+        Args:
+            found (bool): Kreis gefunden
+            radius (float): Gefundener Radius
+            parameters (tuple): Die verwendeten (low, high, min_dist, param2)
+            elapsed_ms (float): Laufzeit der Suche
+        """
+        low, high = parameters[:2]
+        narrow = (low, high) != (self.min_radius, self.max_radius)
+        self._update_band(found, radius)
+        self._record(found, narrow, elapsed_ms)
+
+    def _hough(self, gray, low, high, min_dist, param2):
+        blurred = cv2.medianBlur(gray, self.blur) if self.blur else gray
+        circles = cv2.HoughCircles(blurred, cv2.HOUGH_GRADIENT, dp=self.dp, minDist=min_dist,
+                                   param1=self.param1, param2=param2,
+                                   minRadius=low, maxRadius=high)
+        if circles is None:
+            return False, (None, None, None)
+        x, y, r = circles[0][0]
+        return True, (float(x), float(y), float(r))
+
+    def _update_band(self, found, radius):
+        if not self.adaptive:
+            return
+        if found:
+            self.last_radius = radius
+            self.half_band = max(self.min_band, radius * self.band_factor)
+        elif self.last_radius is not None:
+            # Schrittweise verbreitern, bis das volle Band wieder erreicht ist
+            self.half_band *= self.widen_factor
+            low, high = self.band()
+            if low <= self.min_radius and high >= self.max_radius:
+                self.reset()
+
+    def _record(self, found, narrow, elapsed_ms):
+        self.calls += 1
+        if found:
+            self.hits += 1
+        else:
+            self.misses += 1
+        self.last_ms = elapsed_ms
+        # Gleitender Mittelwert getrennt fuer schmales und volles Band
+        if narrow:
+            self.narrow_calls += 1
+            if self.narrow_calls == 1:
+                self.mean_ms_narrow = elapsed_ms
+            else:
+                self.mean_ms_narrow += 0.1 * (elapsed_ms - self.mean_ms_narrow)
+        else:
+            if self.calls - self.narrow_calls == 1:
+                self.mean_ms_full = elapsed_ms
+            else:
+                self.mean_ms_full += 0.1 * (elapsed_ms - self.mean_ms_full)
+
+    def get_stats(self):
+        low, high = self.band()
+        data = {
+            "adaptive": self.adaptive,
+            "band": [low, high],
+            "calls": self.calls,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / self.calls, 3) if self.calls else 0.0,
+            "narrow_calls": self.narrow_calls,
+            "last_ms": round(self.last_ms, 3),
+            "mean_ms_full": round(self.mean_ms_full, 3),
+            "mean_ms_narrow": round(self.mean_ms_narrow, 3),
+        }
+        if self.pyramid is not None:
+            data["pyramid"] = self.pyramid.get_stats()
+        return data
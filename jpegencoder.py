@@ -0,0 +1,169 @@
+"""
+JPEG-Encoding fuer die Vorschau ausserhalb des Tracking-Loops
+"""
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+
+
+class PreviewEncoder:
+    """
+    Kodiert Vorschaubilder in einem Thread-Pool mit eigener, niedriger Rate.
+
+    submit() blockiert nie: Bilder werden verworfen, wenn die Vorschaurate
+    erreicht ist, alle Worker beschaeftigt sind oder niemand zuschaut.
+    Qualitaet und Aufloesung werden nach jedem Bild an das Bandbreiten- und
+    CPU-Budget angepasst.
+
+    Args:
+        publish (callable): publish(key, jpeg_bytes), z.B. StreamHub.publish
+        preview_fps (float): Maximale Vorschaurate pro Stream
+        workers (int): Anzahl Encoder-Threads (cv2.imencode gibt den GIL frei)
+        target_bandwidth (float, optional): Ziel in Bytes/s pro Stream
+        cpu_budget (float, optional): Anteil eines Kerns, den das Encoding pro Stream nutzen darf
+        has_clients (callable, optional): has_clients(key) -> bool; ohne Clients wird nicht kodiert
+        quality (int): Start-JPEG-Qualitaet
+        min_quality (int): Untergrenze der Qualitaet
+        max_quality (int): Obergrenze der Qualitaet
+        min_scale (float): Kleinster Skalierungsfaktor der Aufloesung
+        metrics (Metrics, optional): Bekommt die Dauer von Skalierung und
+            Encoding als Schritt "encode"
+        placement (ThreadPlacement, optional): Jeder Encoder-Thread wendet
+            beim Start die Vorgaben der Stufe "encode" an
+    """
+
+    def __init__(self, publish, preview_fps=30.0, workers=2, target_bandwidth=None,
+                 cpu_budget=None, has_clients=None, quality=80, min_quality=30,
+                 max_quality=90, min_scale=0.25, metrics=None, placement=None):
+        self.publish = publish
+        self.preview_fps = preview_fps
+        self.target_bandwidth = target_bandwidth
+        self.cpu_budget = cpu_budget
+        self.has_clients = has_clients
+        self.min_quality = min_quality
+        self.max_quality = max_quality
+        self.min_scale = min_scale
+        self.workers = workers
+        self.encode_stage = metrics.stage("encode") if metrics is not None else None
+        if placement is not None:
+            self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="jpeg",
+                                           initializer=placement.apply, initargs=("encode",))
+        else:
+            self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="jpeg")
+        self.lock = threading.Lock()
+
+        # Zustand pro Stream (key): Qualitaet, Skalierung, letzte Einreichung
+        self.start_quality = quality
+        self.streams = {}
+        self.in_flight = 0
+
+        # Statistik
+        self.frames_encoded = 0
+        self.frames_skipped = 0
+        self.last_encode_ms = 0.0
+        self.last_size = 0
+
+    def _stream(self, key):
+        state = self.streams.get(key)
+        if state is None:
+            state = {"quality": self.start_quality, "scale": 1.0, "last_submit": 0.0}
+            self.streams[key] = state
+        return state
+
+    def submit(self, key, frame, copy=True, render=None):
+        """
+        Bild zur Kodierung anbieten. Gibt True zurueck, wenn es angenommen wurde.
+
+        Mit copy=False darf der Aufrufer das Bild danach nicht mehr veraendern.
+        render(frame) -> BGR-Bild laeuft im Worker vor dem Encoding, z.B. fuer
+        die Farbkonvertierung und das Overlay, damit diese nur fuer
+        tatsaechlich kodierte Bilder anfallen.
+        """
+        if self.has_clients is not None and not self.has_clients(key):
+            with self.lock:
+                self.frames_skipped += 1
+            return False
+        now = time.perf_counter()
+        with self.lock:
+            state = self._stream(key)
+            if self.preview_fps and now - state["last_submit"] < 1.0 / self.preview_fps:
+                self.frames_skipped += 1
+                return False
+            if self.in_flight >= self.workers:
+                self.frames_skipped += 1
+                return False
+            state["last_submit"] = now
+            self.in_flight += 1
+            quality = state["quality"]
+            scale = state["scale"]
+
+        # Kopie, da der Tracking-Loop das Bild weiterverwendet
+        if copy:
+            frame = frame.copy()
+        self.pool.submit(self._encode, key, frame, quality, scale, render)
+        return True
+
+    def _encode(self, key, frame, quality, scale, render=None):
+        try:
+            start = time.perf_counter()
+            if render is not None:
+                frame = render(frame)
+            encode_start = time.perf_counter()
+            if scale < 1.0:
+                frame = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+            ret, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, int(quality)])
+            end = time.perf_counter()
+            encode_s = end - start
+            if self.encode_stage is not None:
+                self.encode_stage.observe(end - encode_start)
+            if not ret:
+                return
+            frame_bytes = buffer.tobytes()
+            self.publish(key, frame_bytes)
+
+            with self.lock:
+                self.frames_encoded += 1
+                self.last_encode_ms = encode_s * 1000.0
+                self.last_size = len(frame_bytes)
+                self._adapt(self._stream(key), len(frame_bytes), encode_s)
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+    def _adapt(self, state, size, encode_s):
+        rate = self.preview_fps or 1.0
+        too_big = self.target_bandwidth and size * rate > 1.1 * self.target_bandwidth
+        too_slow = self.cpu_budget and encode_s * rate > self.cpu_budget
+        has_room = ((not self.target_bandwidth or size * rate < 0.8 * self.target_bandwidth)
+                    and (not self.cpu_budget or encode_s * rate < 0.7 * self.cpu_budget))
+
+        if too_slow:
+            # CPU ist ueber Budget: Aufloesung reduziert die Kosten am staerksten
+            state["scale"] = max(self.min_scale, state["scale"] * 0.8)
+        elif too_big:
+            # Erst Qualitaet, dann Aufloesung reduzieren
+            if state["quality"] > self.min_quality:
+                state["quality"] = max(self.min_quality, state["quality"] - 5)
+            else:
+                state["scale"] = max(self.min_scale, state["scale"] * 0.8)
+        elif has_room:
+            # Erst Aufloesung, dann Qualitaet wieder erhoehen
+            if state["scale"] < 1.0:
+                state["scale"] = min(1.0, state["scale"] * 1.1)
+            elif state["quality"] < self.max_quality:
+                state["quality"] = min(self.max_quality, state["quality"] + 2)
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                "frames_encoded": self.frames_encoded,
+                "frames_skipped": self.frames_skipped,
+                "last_encode_ms": round(self.last_encode_ms, 2),
+                "last_size": self.last_size,
+                "streams": {key: {"quality": s["quality"], "scale": round(s["scale"], 2)}
+                            for key, s in self.streams.items()},
+            }
+
+    def shutdown(self):
+        self.pool.shutdown(wait=True)
@@ -0,0 +1,123 @@
+"""
+Kalman-Filter fuer die Ballbewegung in Sensor-Koordinaten
+"""
+import numpy as np
+
+
+class BallKalman:
+    """
+    Kalman-Filter mit konstanter Geschwindigkeit ("cv") oder konstanter
+    Beschleunigung ("ca") pro Achse.
+
+    Zustand pro Achse: [Position, Geschwindigkeit(, Beschleunigung)] in
+    Pixel bzw. Pixel/s und Pixel/s^2. Zeiten in Sekunden, z.B. aus
+    time.perf_counter() oder dem Sensor-Zeitstempel.
+
+    Args:
+        model (str): "cv" oder "ca"
+        process_noise (float): Spektrale Dichte des Prozessrauschens (Beschleunigung bzw. Ruck)
+        measurement_std (float): Standardabweichung der Messung in Pixel
+    """
+
+    def __init__(self, model="ca", process_noise=None, measurement_std=2.0):
+        if model not in ("cv", "ca"):
+            raise ValueError("model must be 'cv' or 'ca'")
+        self.model = model
+        self.order = 2 if model == "cv" else 3
+        if process_noise is None:
+            process_noise = 5e5 if model == "cv" else 5e7
+        self.process_noise = process_noise
+        self.measurement_std = measurement_std
+
+        n = 2 * self.order
+        self.H = np.zeros((2, n))
+        self.H[0, 0] = 1.0
+        self.H[1, self.order] = 1.0
+        self.R = np.eye(2) * measurement_std ** 2
+        self.reset()
+
+    def reset(self):
+        n = 2 * self.order
+        self.x = np.zeros(n)
+        self.P = np.eye(n)
+        self.t = None
+        self.updates = 0
+
+    @property
+    def initialized(self):
+        return self.t is not None
+
+    def _axis_blocks(self, dt):
+        # Transitions- und Rauschmatrix fuer eine Achse
+        if self.order == 2:
+            F = np.array([[1.0, dt],
+                          [0.0, 1.0]])
+            Q = np.array([[dt ** 3 / 3, dt ** 2 / 2],
+                          [dt ** 2 / 2, dt]])
+        else:
+            F = np.array([[1.0, dt, 0.5 * dt ** 2],
+                          [0.0, 1.0, dt],
+                          [0.0, 0.0, 1.0]])
+            Q = np.array([[dt ** 5 / 20, dt ** 4 / 8, dt ** 3 / 6],
+                          [dt ** 4 / 8, dt ** 3 / 3, dt ** 2 / 2],
+                          [dt ** 3 / 6, dt ** 2 / 2, dt]])
+        return F, Q * self.process_noise
+
+    def _matrices(self, dt):
+        F_axis, Q_axis = self._axis_blocks(dt)
+        o = self.order
+        F = np.zeros((2 * o, 2 * o))
+        Q = np.zeros((2 * o, 2 * o))
+        F[:o, :o] = F[o:, o:] = F_axis
+        Q[:o, :o] = Q[o:, o:] = Q_axis
+        return F, Q
+
+    def predict(self, t):
+        """Zustand bis zum Zeitpunkt t fortschreiben."""
+        if self.t is None:
+            return
+        dt = t - self.t
+        if dt <= 0:
+            return
+        F, Q = self._matrices(dt)
+        self.x = F @ self.x
+        self.P = F @ self.P @ F.T + Q
+        self.t = t
+
+    def update(self, x, y, t):
+        """Messung (x, y) zum Zeitpunkt t einarbeiten."""
+        o = self.order
+        if self.t is None:
+            # Erste Messung: Position setzen, Geschwindigkeit unbekannt
+            self.x[:] = 0.0
+            self.x[0] = x
+            self.x[o] = y
+            self.P = np.eye(2 * o) * 1e6
+            self.P[0, 0] = self.P[o, o] = self.measurement_std ** 2
+            self.t = t
+            self.updates = 1
+            return
+
+        self.predict(t)
+        z = np.array([x, y], dtype=float)
+        innovation = z - self.H @ self.x
+        S = self.H @ self.P @ self.H.T + self.R
+        K = self.P @ self.H.T @ np.linalg.inv(S)
+        self.x = self.x + K @ innovation
+        self.P = (np.eye(2 * o) - K @ self.H) @ self.P
+        self.updates += 1
+
+    def position(self):
+        return self.x[0], self.x[self.order]
+
+    def velocity(self):
+        return self.x[1], self.x[self.order + 1]
+
+    def predict_position(self, t):
+        """Vorhergesagte Position zum Zeitpunkt t, ohne den Zustand zu aendern."""
+        if self.t is None:
+            return None
+        dt = max(0.0, t - self.t)
+        F_axis, _ = self._axis_blocks(dt)
+        o = self.order
+        return (float(F_axis[0] @ self.x[:o]), float(F_axis[0] @ self.x[o:]))
@@ -23,9 +23,11 @@ tracker = Balltracker(width=640, height=640)
 # Start detection in a thread
 tracker.start_balltracker(mode="color")
 
+# Polling loop on its own core, e.g. THREAD_PLACEMENT="main:cpus=0;capture:cpus=1;detect:cpus=2-3,fifo=50"
+tracker.placement.apply("main")
 
-# Get the ball position
-while True:
-    pos = tracker.get_position()  # (x, y, z)
-    print(pos)
-    time.sleep(0.05)  # every 50 ms
\ No newline at end of file
+
+# Get every ball position (no duplicates, nothing missed)
+for sample in tracker.samples():
+    # sample: seq, timestamp_ns, x, y, z, radius, confidence, found, latency_ms
+    print(sample.seq, (sample.x, sample.y, sample.z), sample.confidence)
\ No newline at end of file
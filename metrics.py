@@ -0,0 +1,235 @@
+"""
+Latenz-Histogramme pro Verarbeitungsschritt und Prometheus-Export (/metrics)
+"""
+import bisect
+import math
+import threading
+import time
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Logarithmische Grenzen von 10 us bis ~1.3 s (Faktor ~1.5), passend fuer 2 ms Bilddauer
+DEFAULT_BUCKETS = tuple(round(10e-6 * 1.5 ** i, 9) for i in range(30))
+
+
+def _labels(labels, extra=None):
+    items = list((labels or {}).items()) + list((extra or {}).items())
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+
+def _format(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class LatencyHistogram:
+    """
+    Histogramm mit festen Grenzen; observe() kostet nur ein bisect und zwei
+    Additionen. Kumuliert wird erst beim Export.
+
+    Args:
+        buckets (tuple): Obere Grenzen in Sekunden, aufsteigend
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.bounds = list(buckets)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+        # Encoder-Worker und Clients schreiben aus mehreren Threads
+        self.lock = threading.Lock()
+
+    def observe(self, seconds):
+        i = bisect.bisect_left(self.bounds, seconds)
+        with self.lock:
+            self.counts[i] += 1
+            self.sum += seconds
+            self.count += 1
+
+    def mean(self):
+        return self.sum / self.count if self.count else 0.0
+
+    def quantile(self, q):
+        """Naeherung ueber die Obergrenze des Buckets, in dem das Quantil liegt."""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for bound, n in zip(self.bounds, self.counts):
+            seen += n
+            if seen >= target:
+                return bound
+        return math.inf
+
+    def samples(self):
+        with self.lock:
+            counts = list(self.counts)
+            total, count = self.sum, self.count
+        cumulative = 0
+        for bound, n in zip(self.bounds + [math.inf], counts):
+            cumulative += n
+            yield bound, cumulative
+        yield "sum", total
+        yield "count", count
+
+
+class Counter:
+    """Zaehler; mit fn wird der Wert erst beim Export gelesen (kein Aufwand im Loop)."""
+
+    def __init__(self, fn=None):
+        self.value = 0
+        self.fn = fn
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def get(self):
+        return self.fn() if self.fn is not None else self.value
+
+
+class Metrics:
+    """
+    Sammelt Histogramme, Zaehler und Gauges eines Skripts und rendert sie im
+    Prometheus-Textformat.
+
+    Die Schritte werden mit perf_counter vor und nach dem Schritt gemessen
+    und mit metrics.stage(name).observe(dt) eingetragen. frame_done(dt)
+    traegt die Dauer des ganzen Bildes ein und zaehlt Ueberlaeufe, wenn
+    frame_budget gesetzt ist. Die Kosten einer Messung werden beim Start
+    einmal bestimmt; metrics_overhead_ratio ist die Summe aller Messkosten
+    geteilt durch die Laufzeit, also Kosten pro Bild / Bilddauer, egal in
+    welchem Thread gemessen wird.
+
+    Args:
+        prefix (str): Praefix aller Metriknamen
+        frame_budget (float, optional): Zeit pro Bild in Sekunden, darueber zaehlt ein Ueberlauf
+    """
+
+    def __init__(self, prefix="balltracker", frame_budget=None):
+        self.prefix = prefix
+        self.frame_budget = frame_budget
+        self.families = {}  # name -> (typ, hilfe, {labels: metrik})
+        self.lock = threading.Lock()
+        self.created = time.perf_counter()
+
+        self.frame = self.histogram("frame_seconds", "Processing time per frame")
+        self.overruns = self.counter("overruns_total", "Frames that exceeded the frame budget")
+        self.detections = {
+            result: self.counter("detections_total", "Detection attempts by result",
+                                 {"result": result})
+            for result in ("hit", "miss")
+        }
+        self.gauge("detection_hit_ratio", "Share of detection attempts that found the ball",
+                   self.hit_ratio)
+
+        self.observation_cost = self.measure_overhead()
+        self.gauge("metrics_observation_seconds",
+                   "Measured cost of one timed observation (two perf_counter calls and observe)",
+                   lambda: self.observation_cost)
+        self.gauge("metrics_overhead_ratio",
+                   "Estimated share of run time spent collecting metrics", self.overhead_ratio)
+
+    # --- Registrierung ---
+    def _register(self, kind, name, help_text, labels, factory):
+        key = tuple(sorted((labels or {}).items()))
+        with self.lock:
+            family = self.families.setdefault(name, (kind, help_text, {}))
+            if family[0] != kind:
+                raise ValueError(f"metric {name} already registered as {family[0]}")
+            metric = family[2].get(key)
+            if metric is None:
+                metric = factory()
+                family[2][key] = metric
+        return metric
+
+    def histogram(self, name, help_text, labels=None, buckets=DEFAULT_BUCKETS):
+        return self._register("histogram", name, help_text, labels,
+                              lambda: LatencyHistogram(buckets))
+
+    def counter(self, name, help_text, labels=None, fn=None):
+        return self._register("counter", name, help_text, labels, lambda: Counter(fn))
+
+    def gauge(self, name, help_text, fn, labels=None):
+        return self._register("gauge", name, help_text, labels, lambda: Counter(fn))
+
+    def stage(self, name):
+        """Histogramm eines Verarbeitungsschritts (capture, convert, detect, ...)."""
+        return self.histogram("stage_seconds", "Latency per processing stage", {"stage": name})
+
+    # --- Eintragen ---
+    def frame_done(self, seconds):
+        self.frame.observe(seconds)
+        if self.frame_budget is not None and seconds > self.frame_budget:
+            self.overruns.inc()
+
+    def detection(self, found):
+        self.detections["hit" if found else "miss"].inc()
+
+    # --- Auswertung ---
+    def hit_ratio(self):
+        hits = self.detections["hit"].value
+        total = hits + self.detections["miss"].value
+        return hits / total if total else 0.0
+
+    @staticmethod
+    def measure_overhead(samples=20000):
+        """Kosten einer Messung (perf_counter davor/danach + observe) in Sekunden."""
+        histogram = LatencyHistogram()
+        perf_counter = time.perf_counter
+        start = perf_counter()
+        for _ in range(samples):
+            t0 = perf_counter()
+            histogram.observe(perf_counter() - t0)
+        return (perf_counter() - start) / samples
+
+    def observations(self):
+        with self.lock:
+            histograms = [m for kind, _, metrics in self.families.values()
+                          if kind == "histogram" for m in metrics.values()]
+        return sum(h.count for h in histograms)
+
+    def overhead_ratio(self):
+        elapsed = time.perf_counter() - self.created
+        return self.observations() * self.observation_cost / elapsed if elapsed > 0 else 0.0
+
+    def summary(self):
+        """Mittelwert und p99 pro Schritt in ms, fuer /stats."""
+        stages = self.families.get("stage_seconds", (None, None, {}))[2]
+        data = {dict(key)["stage"]: {"mean_ms": round(h.mean() * 1000.0, 3),
+                                     "p99_ms": round(h.quantile(0.99) * 1000.0, 3),
+                                     "count": h.count}
+                for key, h in list(stages.items())}
+        data["frame"] = {"mean_ms": round(self.frame.mean() * 1000.0, 3),
+                         "p99_ms": round(self.frame.quantile(0.99) * 1000.0, 3),
+                         "count": self.frame.count}
+        data["overhead_ratio"] = round(self.overhead_ratio(), 5)
+        return data
+
+    # --- Export ---
+    def render(self):
+        """Alle Metriken im Prometheus-Textformat."""
+        lines = []
+        with self.lock:
+            families = [(name, kind, help_text, list(metrics.items()))
+                        for name, (kind, help_text, metrics) in self.families.items()]
+        for name, kind, help_text, metrics in families:
+            full = f"{self.prefix}_{name}"
+            lines.append(f"# HELP {full} {help_text}")
+            lines.append(f"# TYPE {full} {kind}")
+            for key, metric in metrics:
+                labels = dict(key)
+                if kind == "histogram":
+                    for bound, value in metric.samples():
+                        if bound == "sum":
+                            lines.append(f"{full}_sum{_labels(labels)} {_format(value)}")
+                        elif bound == "count":
+                            lines.append(f"{full}_count{_labels(labels)} {value}")
+                        else:
+                            le = _format(bound) if bound == math.inf else repr(bound)
+                            lines.append(f"{full}_bucket{_labels(labels, {'le': le})} {value}")
+                else:
+                    lines.append(f"{full}{_labels(labels)} {_format(metric.get())}")
+        return "\n".join(lines) + "\n"
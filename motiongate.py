@@ -0,0 +1,175 @@
+"""
+Bewegungsfilter vor den Detektoren: nur dort suchen, wo sich etwas geaendert hat
+"""
+import time
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    """
+    Vergleicht jedes Bild mit einem laufenden Hintergrundmodell.
+
+    Beim Global-Shutter-Sensor mit ruhigem Hintergrund aendern sich die
+    meisten Pixel von Bild zu Bild nicht. Das Bild wird auf 1/scale
+    verkleinert (INTER_AREA mittelt zugleich das Rauschen weg), mit dem
+    Hintergrund verglichen und die geaenderten Bereiche als Rechtecke im
+    Originalbild geliefert. Der Hintergrund folgt langsam (learning_rate),
+    damit Belichtungsdrift und liegengebliebene Objekte verschwinden.
+
+    Ergebnis von regions():
+        None  -> keine Aussage (Einlernen, fast alles geaendert): ganzes Bild
+        []    -> keine Aenderung, Detektion kann entfallen
+        [roi] -> nur in diesen Fenstern (x0, y0, x1, y1) suchen
+
+    Args:
+        scale (int): Verkleinerungsfaktor fuer den Vergleich
+        threshold (int): Grauwertdifferenz, ab der ein Pixel als geaendert gilt
+        learning_rate (float): Anteil des neuen Bildes am Hintergrund pro Bild
+        min_pixels (int): Kleinere Aenderungen (Pixel im verkleinerten Bild) sind Rauschen
+        padding (int): Rand um jedes Fenster in Pixel des Originalbilds
+        max_regions (int): Hoechstens so viele Fenster, die groessten zuerst
+        max_changed (float): Ab diesem Anteil geaenderter Flaeche ganzes Bild
+        warmup (int): Anzahl Bilder zum Einlernen des Hintergrunds
+    """
+
+    def __init__(self, scale=4, threshold=12, learning_rate=0.05, min_pixels=3, padding=16,
+                 max_regions=3, max_changed=0.5, warmup=10):
+        self.scale = scale
+        self.threshold = threshold
+        self.learning_rate = learning_rate
+        self.min_pixels = min_pixels
+        self.padding = padding
+        self.max_regions = max_regions
+        self.max_changed = max_changed
+        self.warmup = warmup
+        self.reset()
+
+        # Statistik
+        self.frames = 0
+        self.frames_unchanged = 0
+        self.frames_gated = 0
+        self.frames_full = 0
+        self.last_regions = 0
+        self.last_ms = 0.0
+        self.mean_ms = 0.0
+
+    def reset(self):
+        """Hintergrund verwerfen, z.B. nach einer Crop-Aenderung oder neuer Belichtung."""
+        self.background = None
+        self.learned = 0
+        self._key = None
+        self._result = None
+
+    def regions(self, frame, key=None):
+        """
+        Geaenderte Bereiche des Bildes.
+
+        Args:
+            frame (np.ndarray): Graustufenbild (z.B. Y-Ebene) oder RGB/BGR (gruener Kanal)
+            key (optional): Kennung des Bildes (z.B. SensorTimestamp); derselbe key
+                liefert das gespeicherte Ergebnis, wenn mehrere Detektoren dasselbe
+                Bild bekommen
+
+        Returns:
+            list: Fenster (x0, y0, x1, y1), [] ohne Aenderung oder None fuer das ganze Bild
+        """
+        if key is not None and key == self._key:
+            return self._result
+        start = time.perf_counter()
+        height, width = frame.shape[:2]
+        small = cv2.resize(frame, (width // self.scale, height // self.scale),
+                           interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = small[:, :, 1]
+
+        if self.background is None or self.background.shape != small.shape:
+            self.background = small.astype(np.float32)
+            self.learned = 1
+            result = None
+        elif self.learned < self.warmup:
+            # Einlernen: Mittelwert der ersten Bilder, noch keine Aussage
+            self.learned += 1
+            cv2.accumulateWeighted(small, self.background, 1.0 / self.learned)
+            result = None
+        else:
+            diff = cv2.absdiff(small, cv2.convertScaleAbs(self.background))
+            cv2.accumulateWeighted(small, self.background, self.learning_rate)
+            result = self._boxes(diff > self.threshold, width, height)
+
+        self._record(result, (time.perf_counter() - start) * 1000.0)
+        self._key = key
+        self._result = result
+        return result
+
+    def _boxes(self, changed, width, height):
+        changed = changed.view(np.uint8)
+        count, _, stats, _ = cv2.connectedComponentsWithStatsWithAlgorithm(
+            changed, 8, cv2.CV_32S, cv2.CCL_GRANA)
+        stats = stats[1:]
+        stats = stats[stats[:, cv2.CC_STAT_AREA] >= self.min_pixels]
+        if not len(stats):
+            return []
+        if stats[:, cv2.CC_STAT_AREA].sum() >= self.max_changed * changed.size:
+            # z.B. Belichtungswechsel oder Kamera bewegt
+            return None
+        stats = stats[np.argsort(-stats[:, cv2.CC_STAT_AREA])][:self.max_regions]
+
+        boxes = []
+        for x, y, w, h, _ in stats:
+            x0 = max(0, int(x) * self.scale - self.padding)
+            y0 = max(0, int(y) * self.scale - self.padding)
+            x1 = min(width, int(x + w) * self.scale + self.padding)
+            y1 = min(height, int(y + h) * self.scale + self.padding)
+            boxes.append((x0, y0, x1, y1))
+        return boxes
+
+    def _record(self, result, elapsed_ms):
+        self.frames += 1
+        if result is None:
+            self.frames_full += 1
+            self.last_regions = 0
+        elif not result:
+            self.frames_unchanged += 1
+            self.last_regions = 0
+        else:
+            self.frames_gated += 1
+            self.last_regions = len(result)
+        self.last_ms = elapsed_ms
+        if self.frames == 1:
+            self.mean_ms = elapsed_ms
+        else:
+            self.mean_ms += 0.1 * (elapsed_ms - self.mean_ms)
+
+    def get_stats(self):
+        return {
+            "frames": self.frames,
+            "frames_unchanged": self.frames_unchanged,
+            "frames_gated": self.frames_gated,
+            "frames_full": self.frames_full,
+            "last_regions": self.last_regions,
+            "last_ms": round(self.last_ms, 3),
+            "mean_ms": round(self.mean_ms, 3),
+        }
+
+
+def gated(detect, regions):
+    """
+    detect(frame, roi=None) -> (frame, found, (x, y, r)) auf die Bewegungsfenster beschraenken.
+
+    Aufrufe mit roi (z.B. vorhergesagtes Fenster aus detect_with_roi) laufen
+    unveraendert; eine Ganzbildsuche wird durch die Suche in den Fenstern
+    ersetzt. Bei regions None bleibt detect unveraendert.
+    """
+    if regions is None:
+        return detect
+
+    def detect_in_regions(frame, roi=None):
+        if roi is not None:
+            return detect(frame, roi)
+        for region in regions:
+            frame, found, dimensions = detect(frame, region)
+            if found:
+                return frame, found, dimensions
+        return frame, False, (None, None, None)
+    return detect_in_regions
@@ -0,0 +1,272 @@
+"""
+Hough-Detektion parallel in Worker-Prozessen, Ergebnisse in Bildreihenfolge
+
+HoughCircles laeuft in einem Thread; auf dem Pi 5 bleiben drei Kerne frei.
+Der Hauptprozess schreibt jedes Bild einmal in einen freien Slot im Shared
+Memory (bei RGB direkt als Graustufen per cvtColor(dst=...)), die Worker
+bekommen nur (seq, Slot, Suchparameter) ueber eine Queue und antworten mit
+dem Ergebnis. collect() gibt die Ergebnisse in seq-Reihenfolge zurueck.
+
+Der Durchsatz waechst mit der Anzahl Worker, solange ein einzelner
+Detektor langsamer als der Sensor ist. Dafuer kommt jedes Ergebnis etwas
+spaeter: Queue-Transfer, Warten auf einen freien Worker und Warten auf
+aeltere Bilder (Umsortieren). Beides wird gemessen (overhead_ms, reorder_ms).
+"""
+import collections
+import multiprocessing
+import queue
+import time
+import cv2
+import numpy as np
+from multiprocessing import shared_memory
+from hough import AdaptiveHoughDetector
+
+# Ein Ergebnis in Bildreihenfolge; dimensions = (x, y, r) oder (None, None, None)
+ParallelResult = collections.namedtuple(
+    "ParallelResult",
+    ["seq", "found", "dimensions", "roi", "roi_hit", "timestamp", "compute_ms", "overhead_ms",
+     "reorder_ms"])
+
+# Parameter des Detektors, die die Worker uebernehmen (das Band kommt pro Bild)
+_CONFIG = ("min_radius", "max_radius", "dp", "min_dist", "param1", "param2", "blur",
+           "pyramid_min_width")
+
+
+def _worker(shm_name, slot_bytes, config, tasks, results):
+    # Ein Thread pro Prozess, die Parallelitaet kommt von den Prozessen
+    cv2.setNumThreads(1)
+    shm = shared_memory.SharedMemory(name=shm_name)
+    detector = AdaptiveHoughDetector(adaptive=False, **config)
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            seq, slot, shape, roi, parameters = task
+            frame = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf, offset=slot * slot_bytes)
+            start = time.perf_counter()
+            roi_hit = None
+            found = False
+            if roi is not None:
+                found, dimensions = detector.detect_with(frame, roi, *parameters)
+                roi_hit = found
+            if not found:
+                # Wie detect_with_roi: nach einem Fehlschlag im ganzen Bild suchen
+                found, dimensions = detector.detect_with(frame, None, *parameters)
+            del frame
+            results.put((seq, slot, found, dimensions, roi_hit, time.perf_counter() - start,
+                         time.monotonic_ns()))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        shm.close()
+
+
+class ParallelHoughDetector:
+    """
+    Verteilt Bilder auf Worker-Prozesse und sortiert die Ergebnisse wieder.
+
+    Das adaptive Radiusband bleibt im Hauptprozess: submit() nimmt die
+    aktuellen Suchparameter von detector, collect() meldet die Ergebnisse in
+    Reihenfolge an detector zurueck. Bei n Workern sieht das Band also
+    Ergebnisse, die bis zu n Bilder alt sind.
+
+    Ist kein Slot frei (alle Worker beschaeftigt, Queue voll), wird das Bild
+    nicht angenommen (frames_skipped), wie beim FrameRing zaehlt nur das
+    neueste Bild.
+
+    Args:
+        detector (AdaptiveHoughDetector): Liefert Parameter und Band
+        frame_shape (tuple): Groesste Bildform (height, width) der Graustufenbilder
+        workers (int): Anzahl Worker-Prozesse (Pi 5: 3, ein Kern bleibt fuer Capture)
+        slots (int, optional): Bilder im Umlauf, Standard 2 pro Worker
+        start_method (str): "fork" startet ohne erneuten Import des Hauptskripts
+            (Skripte ohne __main__-Schutz), aber nur sicher, solange der
+            Prozess noch keine Kamera (Picamera2-Threads, offene fds) hat:
+            den Pool also vor open_frame_source() anlegen. "spawn" und
+            "forkserver" sind danach moeglich, importieren aber cv2/numpy
+            (und bei spawn das Hauptskript) in jedem Worker neu und
+            verzoegern damit den Start
+        metrics (Metrics, optional): Bekommt Zusatzlatenz und Umsortier-Wartezeit
+    """
+
+    def __init__(self, detector, frame_shape, workers=3, slots=None, start_method="fork",
+                 metrics=None):
+        self.detector = detector
+        self.frame_shape = tuple(frame_shape)
+        self.workers = workers
+        self.slots = slots or 2 * workers
+        self.slot_bytes = int(np.prod(self.frame_shape))
+        self.shm = shared_memory.SharedMemory(create=True, size=self.slot_bytes * self.slots)
+        self.free = list(range(self.slots))
+
+        context = multiprocessing.get_context(start_method)
+        self.tasks = context.Queue()
+        self.results = context.Queue()
+        config = {name: getattr(detector, name) for name in _CONFIG}
+        self.processes = [
+            context.Process(target=_worker, name=f"hough-{i}", daemon=True,
+                            args=(self.shm.name, self.slot_bytes, config, self.tasks,
+                                  self.results))
+            for i in range(workers)]
+        for process in self.processes:
+            process.start()
+
+        self.seq = 0
+        self.next_seq = 1
+        self.pending = {}  # seq -> (timestamp, submit_ns, parameters, roi)
+        self.done = {}  # seq -> Ergebnis eines Workers, wartet auf aeltere Bilder
+
+        # Statistik
+        self.frames_submitted = 0
+        self.frames_completed = 0
+        self.frames_skipped = 0
+        self.mean_compute_ms = 0.0
+        self.mean_overhead_ms = 0.0
+        self.mean_reorder_ms = 0.0
+        self._started = time.perf_counter()
+
+        self.overhead_histogram = None
+        self.reorder_histogram = None
+        if metrics is not None:
+            self.overhead_histogram = metrics.histogram(
+                "parallel_detect_overhead_seconds",
+                "Latency added by parallel detection (submit to ordered result minus compute)")
+            self.reorder_histogram = metrics.histogram(
+                "parallel_detect_reorder_seconds",
+                "Time a finished result waits for older frames")
+            metrics.counter("frames_dropped_total", "Frames lost on the way",
+                            {"where": "parallel_detect"}, fn=lambda: self.frames_skipped)
+
+    @property
+    def in_flight(self):
+        return len(self.pending)
+
+    def submit(self, frame, roi=None, timestamp=None, convert=None):
+        """
+        Ein Bild an die Worker geben.
+
+        Args:
+            frame (np.ndarray): Graustufenbild (z.B. Y-Ebene) oder mit convert ein Farbbild
+            roi (tuple, optional): Suchfenster (x0, y0, x1, y1), Fehlschlag -> ganzes Bild
+            timestamp (optional): Wird mit dem Ergebnis zurueckgegeben (z.B. SensorTimestamp)
+            convert (int, optional): cv2-Farbcode nach Graustufen (z.B. cv2.COLOR_RGB2GRAY),
+                die Konvertierung schreibt direkt in den Slot
+
+        Returns:
+            int: seq des Bildes oder None, wenn kein Slot frei war
+        """
+        if not self.free:
+            self.frames_skipped += 1
+            return None
+        shape = frame.shape[:2]
+        if shape[0] * shape[1] > self.slot_bytes:
+            raise ValueError(f"frame {shape} larger than slot {self.frame_shape}")
+        slot = self.free.pop()
+        view = np.ndarray(shape, dtype=np.uint8, buffer=self.shm.buf,
+                          offset=slot * self.slot_bytes)
+        if convert is not None:
+            cv2.cvtColor(frame, convert, dst=view)
+        else:
+            np.copyto(view, frame)
+        del view
+
+        parameters = self.detector.search_parameters()
+        self.seq += 1
+        self.pending[self.seq] = (timestamp, time.monotonic_ns(), parameters, roi)
+        self.tasks.put((self.seq, slot, shape, roi, parameters))
+        self.frames_submitted += 1
+        return self.seq
+
+    def collect(self, timeout=0.0):
+        """
+        Fertige Ergebnisse in Bildreihenfolge.
+
+        Args:
+            timeout (float): So lange auf das erste Ergebnis warten (0 = nur abholen)
+
+        Returns:
+            list: ParallelResult, evtl. leer
+        """
+        block = timeout > 0
+        while self.pending:
+            try:
+                item = self.results.get(block, timeout) if block else self.results.get_nowait()
+            except queue.Empty:
+                self._check_workers()
+                break
+            block = False
+            seq, slot, found, dimensions, roi_hit, compute_s, finished_ns = item
+            self.free.append(slot)
+            self.done[seq] = (found, dimensions, roi_hit, compute_s, finished_ns)
+
+        ordered = []
+        now = time.monotonic_ns()
+        while self.next_seq in self.done:
+            seq = self.next_seq
+            self.next_seq += 1
+            found, dimensions, roi_hit, compute_s, finished_ns = self.done.pop(seq)
+            timestamp, submit_ns, parameters, roi = self.pending.pop(seq)
+            self.detector.feedback(found, dimensions[2], parameters, compute_s * 1000.0)
+
+            overhead_s = max(0.0, (now - submit_ns) / 1e9 - compute_s)
+            reorder_s = max(0.0, (now - finished_ns) / 1e9)
+            self._record(compute_s, overhead_s, reorder_s)
+            ordered.append(ParallelResult(seq, found, dimensions, roi, roi_hit, timestamp,
+                                          compute_s * 1000.0, overhead_s * 1000.0,
+                                          reorder_s * 1000.0))
+        return ordered
+
+    def drain(self, timeout=1.0):
+        """Wartet auf alle Bilder im Umlauf, z.B. vor einem Moduswechsel."""
+        ordered = []
+        deadline = time.monotonic() + timeout
+        while self.pending and time.monotonic() < deadline:
+            ordered.extend(self.collect(timeout=max(0.001, deadline - time.monotonic())))
+        return ordered
+
+    def _check_workers(self):
+        dead = [p.name for p in self.processes if not p.is_alive()]
+        if dead:
+            raise RuntimeError(f"hough worker(s) {dead} died")
+
+    def _record(self, compute_s, overhead_s, reorder_s):
+        self.frames_completed += 1
+        if self.frames_completed == 1:
+            self.mean_compute_ms = compute_s * 1000.0
+            self.mean_overhead_ms = overhead_s * 1000.0
+            self.mean_reorder_ms = reorder_s * 1000.0
+        else:
+            self.mean_compute_ms += 0.05 * (compute_s * 1000.0 - self.mean_compute_ms)
+            self.mean_overhead_ms += 0.05 * (overhead_s * 1000.0 - self.mean_overhead_ms)
+            self.mean_reorder_ms += 0.05 * (reorder_s * 1000.0 - self.mean_reorder_ms)
+        if self.overhead_histogram is not None:
+            self.overhead_histogram.observe(overhead_s)
+            self.reorder_histogram.observe(reorder_s)
+
+    def close(self):
+        for _ in self.processes:
+            self.tasks.put(None)
+        for process in self.processes:
+            process.join(timeout=1.0)
+            if process.is_alive():
+                process.terminate()
+        self.tasks.close()
+        self.results.close()
+        self.shm.close()
+        self.shm.unlink()
+
+    def get_stats(self):
+        elapsed = time.perf_counter() - self._started
+        return {
+            "workers": self.workers,
+            "slots": self.slots,
+            "in_flight": self.in_flight,
+            "frames_submitted": self.frames_submitted,
+            "frames_completed": self.frames_completed,
+            "frames_skipped": self.frames_skipped,
+            "throughput_fps": round(self.frames_completed / elapsed, 1) if elapsed > 0 else 0.0,
+            "mean_compute_ms": round(self.mean_compute_ms, 3),
+            "mean_overhead_ms": round(self.mean_overhead_ms, 3),
+            "mean_reorder_ms": round(self.mean_reorder_ms, 3),
+        }
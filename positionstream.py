@@ -0,0 +1,155 @@
+"""
+Zeitgestempelte, nummerierte Ballpositionen vom Detektions-Thread an beliebig viele Leser
+"""
+import collections
+import threading
+
+# Eine Messung; seq zaehlt jedes verarbeitete Bild, auch ohne Ball (found=False)
+PositionSample = collections.namedtuple(
+    "PositionSample",
+    ["seq", "timestamp_ns", "x", "y", "z", "radius", "confidence", "found", "latency_ms"])
+
+
+class PositionStream:
+    """
+    Veroeffentlicht Positionen ohne Lock im Schreibpfad.
+
+    Der Detektions-Thread ist der einzige Schreiber. publish() legt ein
+    unveraenderliches PositionSample an und tauscht nur die Referenz auf das
+    neueste Sample aus (unter dem GIL atomar, wie ein Single-Writer-Slot);
+    Leser sehen immer ein vollstaendiges Sample. Die Condition wird nur
+    benachrichtigt, wenn tatsaechlich jemand in wait_next() wartet.
+
+    Eine kurze Historie (deque, append ist threadsicher) erlaubt Iteratoren
+    und Abonnenten, jedes Sample in Reihenfolge zu sehen, solange sie nicht
+    mehr als history Samples zurueckliegen; sonst zaehlt missed.
+
+    Args:
+        history (int): Anzahl Samples, die fuer langsame Leser aufgehoben werden
+    """
+
+    def __init__(self, history=256):
+        self.latest = None
+        self.history = collections.deque(maxlen=history)
+        self.cond = threading.Condition()
+        self.waiters = 0
+        self.seq = 0
+        self.closed = False
+
+        # Abonnenten laufen in einem eigenen Thread, nie im Detektions-Thread
+        self.callbacks = []
+        self.dispatcher = None
+        self.missed = 0
+
+    # --- Schreiber (Detektions-Thread) ---
+    def publish(self, x, y, z, radius, confidence, found, timestamp_ns, latency_ms=None):
+        self.seq += 1
+        sample = PositionSample(self.seq, timestamp_ns, x, y, z, radius, confidence, found,
+                                latency_ms)
+        self.history.append(sample)
+        self.latest = sample
+        if self.waiters:
+            with self.cond:
+                self.cond.notify_all()
+        return sample
+
+    def close(self):
+        """Weckt alle Leser auf, z.B. beim Beenden."""
+        self.closed = True
+        with self.cond:
+            self.cond.notify_all()
+        if self.dispatcher is not None:
+            self.dispatcher.join()
+            self.dispatcher = None
+
+    # --- Leser ---
+    def wait_next(self, timeout=None, after=None):
+        """
+        Wartet auf ein Sample, das neuer ist als after (Standard: das aktuelle).
+
+        Args:
+            timeout (float, optional): Maximale Wartezeit in Sekunden
+            after (int, optional): Sequenznummer des zuletzt gesehenen Samples
+
+        Returns:
+            PositionSample: Neuestes Sample oder None bei Timeout/close()
+        """
+        if after is None:
+            latest = self.latest
+            after = latest.seq if latest is not None else 0
+        sample = self.latest
+        if sample is not None and sample.seq > after:
+            return sample
+        with self.cond:
+            self.waiters += 1
+            try:
+                self.cond.wait_for(lambda: self.closed or (self.latest is not None
+                                                          and self.latest.seq > after), timeout)
+            finally:
+                self.waiters -= 1
+        sample = self.latest
+        if sample is None or sample.seq <= after:
+            return None
+        return sample
+
+    def since(self, after):
+        """Alle noch vorhandenen Samples mit seq > after, in Reihenfolge."""
+        samples = [s for s in tuple(self.history) if s.seq > after]
+        if samples and samples[0].seq > after + 1 and after:
+            # Leser war zu langsam, die Historie reicht nicht zurueck
+            self.missed += samples[0].seq - after - 1
+        return samples
+
+    def samples(self, timeout=None, after=None):
+        """
+        Iterator ueber alle neuen Samples in Reihenfolge (blockiert).
+
+        Endet bei close() oder wenn timeout Sekunden lang nichts kam.
+        """
+        if after is None:
+            latest = self.latest
+            after = latest.seq if latest is not None else 0
+        while not self.closed:
+            if self.wait_next(timeout, after) is None:
+                return
+            for sample in self.since(after):
+                after = sample.seq
+                yield sample
+
+    __iter__ = samples
+
+    def subscribe(self, callback):
+        """
+        callback(sample) fuer jedes neue Sample aufrufen.
+
+        Die Aufrufe laufen in einem Dispatcher-Thread; ein langsamer Callback
+        bremst also nicht die Detektion, verpasst aber evtl. Samples.
+
+        Returns:
+            callable: Aufrufen, um das Abo zu beenden
+        """
+        self.callbacks.append(callback)
+        if self.dispatcher is None:
+            self.dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+            self.dispatcher.start()
+
+        def unsubscribe():
+            if callback in self.callbacks:
+                self.callbacks.remove(callback)
+        return unsubscribe
+
+    def _dispatch(self):
+        for sample in self.samples(timeout=None):
+            for callback in list(self.callbacks):
+                try:
+                    callback(sample)
+                except Exception as e:
+                    print(f"position callback failed: {e}")
+
+    def get_stats(self):
+        latest = self.latest
+        return {
+            "seq": latest.seq if latest is not None else 0,
+            "subscribers": len(self.callbacks),
+            "missed": self.missed,
+        }
@@ -0,0 +1,246 @@
+"""
+Grob-zu-fein Hough-Detektion fuer grosse Bilder (z.B. 800x800 oder 640x480)
+
+HoughCircles auf dem vollen Bild ist teuer, vor allem bei einem breiten
+Radiusband. Hier wird zuerst auf einem um 2x oder 4x verkleinerten Bild nach
+Kandidaten gesucht und danach nur in einem kleinen Ausschnitt in voller
+Aufloesung verfeinert.
+"""
+import time
+import cv2
+import numpy as np
+
+
+class PyramidHoughDetector:
+    """
+    Zweistufige Kreisdetektion auf einem Graustufenbild.
+
+    1. Grob: HoughCircles auf dem verkleinerten Bild mit skaliertem
+       Radiusband liefert Kandidaten (nach Stimmen sortiert).
+    2. Fein: Auf Strahlen durch den groben Kreis wird in voller Aufloesung
+       die staerkste Helligkeitskante gesucht und an diese Kantenpunkte ein
+       Kreis per kleinster Quadrate angepasst. Das liefert Mittelpunkt und
+       Radius mit Subpixel-Genauigkeit.
+       Kandidaten mit zu wenig Kanten auf dem Kreis werden verworfen.
+
+    Die Hough-Parameter entsprechen denen von cv2.HoughCircles in voller
+    Aufloesung und werden fuer die grobe Stufe intern skaliert.
+
+    Args:
+        min_radius (int): Kleinster Radius in voller Aufloesung
+        max_radius (int): Groesster Radius in voller Aufloesung
+        factor (int): Verkleinerung fuer die grobe Stufe (2 oder 4); None waehlt
+            den groessten Faktor, bei dem min_radius noch mindestens
+            min_coarse_radius Pixel hat
+        dp (float): Aufloesung des Hough-Akkumulators (wie HoughCircles)
+        min_dist (float): Minimaler Abstand zwischen Kreisen in voller Aufloesung
+        param1 (float): Obere Canny-Schwelle (wie HoughCircles)
+        param2 (float): Akkumulator-Schwelle in voller Aufloesung
+        max_candidates (int): So viele Kandidaten werden hoechstens verfeinert
+        min_support (float): Mindestanteil der Strahlen mit einer Kante auf dem Kreis
+        rays (int): Anzahl Strahlen fuer die Verfeinerung
+        min_edge_step (float): Minimale Helligkeitsaenderung pro Pixel an der Kante
+        min_coarse_radius (int): Kleinster sinnvoller Radius im verkleinerten Bild
+    """
+
+    def __init__(self, min_radius=20, max_radius=100, factor=None, dp=1.5, min_dist=50,
+                 param1=100, param2=30, max_candidates=3, min_support=0.3,
+                 rays=96, min_edge_step=4.0, min_coarse_radius=5):
+        if factor is None:
+            factor = 4 if min_radius / 4 >= min_coarse_radius else 2
+        if factor not in (2, 4):
+            raise ValueError("factor must be 2 or 4")
+        self.min_radius = min_radius
+        self.max_radius = max_radius
+        self.factor = factor
+        self.dp = dp
+        self.min_dist = min_dist
+        self.param1 = param1
+        self.param2 = param2
+        self.max_candidates = max_candidates
+        self.min_support = min_support
+        self.rays = rays
+        self.min_edge_step = min_edge_step
+
+        # Statistik: letzte Laufzeiten und gleitender Mittelwert pro Stufe
+        self.last_coarse_ms = 0.0
+        self.last_refine_ms = 0.0
+        self.mean_coarse_ms = 0.0
+        self.mean_refine_ms = 0.0
+        self.detections = 0
+        self.misses = 0
+        self.rejected_candidates = 0
+
+    # --- Grobe Stufe ---
+    def _coarse(self, gray, min_radius, max_radius, min_dist, param2):
+        f = self.factor
+        small = gray
+        for _ in range(f // 2):
+            # pyrDown glaettet und halbiert, ersetzt den Median-Filter im vollen Bild
+            small = cv2.pyrDown(small)
+        small = cv2.medianBlur(small, 3)
+        # Stimmen pro Kreis wachsen mit dem Umfang, die Schwelle schrumpft mit
+        circles = cv2.HoughCircles(small, cv2.HOUGH_GRADIENT, dp=self.dp,
+                                   minDist=max(1.0, min_dist / f),
+                                   param1=self.param1, param2=max(8.0, param2 / f),
+                                   minRadius=max(1, int(min_radius / f)),
+                                   maxRadius=int(np.ceil(max_radius / f)) + 1)
+        if circles is None:
+            return []
+        # Koordinaten zurueck ins volle Bild (Pixelmitten beachten)
+        return [((x + 0.5) * f - 0.5, (y + 0.5) * f - 0.5, r * f)
+                for x, y, r in circles[0][:self.max_candidates]]
+
+    # --- Feine Stufe ---
+    def _refine(self, gray, candidate):
+        cx, cy, r = candidate
+        # Ring um den groben Kreis, Breite deckt den Fehler der groben Stufe ab
+        band = 1.5 * self.factor + 2
+        edges = self._radial_edges(gray, cx, cy, r, band)
+        if edges is None:
+            return None
+        xs, ys = edges
+
+        inliers = np.ones(xs.size, dtype=bool)
+        for _ in range(3):
+            if np.count_nonzero(inliers) < 8:
+                return None
+            fit = self._fit_circle(xs[inliers], ys[inliers])
+            if fit is None:
+                return None
+            cx, cy, r = fit
+            # Ausreisser (Kanten von Hintergrund oder Hand) verwerfen und neu anpassen
+            inliers = np.abs(np.hypot(xs - cx, ys - cy) - r) < 1.5
+
+        if not self.min_radius <= r <= self.max_radius:
+            return None
+        # Anteil der Strahlen mit einer Kante auf dem Kreis
+        if np.count_nonzero(inliers) < self.min_support * self.rays:
+            return None
+        return cx, cy, r
+
+    def _radial_edges(self, gray, cx, cy, r, band):
+        # Helligkeitsprofile entlang von Strahlen durch den groben Kreis (0.5 px Schritte)
+        angles = np.arange(self.rays) * (2 * np.pi / self.rays)
+        steps = r + np.arange(-band, band + 0.25, 0.5)
+        cos = np.cos(angles)[:, None]
+        sin = np.sin(angles)[:, None]
+        map_x = (cx + steps * cos).astype(np.float32)
+        map_y = (cy + steps * sin).astype(np.float32)
+        profiles = cv2.remap(gray, map_x, map_y, cv2.INTER_LINEAR,
+                             borderMode=cv2.BORDER_CONSTANT, borderValue=0).astype(np.float32)
+        inside = ((map_x >= 0) & (map_x <= gray.shape[1] - 1) &
+                  (map_y >= 0) & (map_y <= gray.shape[0] - 1)).all(axis=1)
+
+        # Ableitung ueber 1 px, leicht geglaettet; Vorzeichen ueber alle Strahlen bestimmen
+        grad = profiles[:, 2:] - profiles[:, :-2]
+        grad = grad[:, :-2] + 2 * grad[:, 1:-1] + grad[:, 2:]
+        if grad.size == 0:
+            return None
+        if grad[inside].sum() < 0:
+            grad = -grad
+        peak = np.argmax(grad, axis=1)
+        rows = np.arange(self.rays)
+        strong = inside & (grad[rows, peak] >= 4 * self.min_edge_step)
+        strong &= (peak > 0) & (peak < grad.shape[1] - 1)
+        if np.count_nonzero(strong) < 8:
+            return None
+
+        # Subpixel-Maximum per Parabel durch drei Punkte
+        rows = rows[strong]
+        peak = peak[strong]
+        g0 = grad[rows, peak - 1]
+        g1 = grad[rows, peak]
+        g2 = grad[rows, peak + 1]
+        denom = g0 - 2 * g1 + g2
+        delta = np.where(denom < 0, 0.5 * (g0 - g2) / np.where(denom < 0, denom, -1), 0.0)
+        # Index im Gradienten -> Position im Profil (zwei Differenzen verschieben um 2 Schritte)
+        dist = steps[0] + (peak + delta + 2) * 0.5
+        return cx + dist * cos[rows, 0], cy + dist * sin[rows, 0]
+
+    @staticmethod
+    def _fit_circle(xs, ys):
+        # Algebraischer Kreisfit (Kasa): x^2 + y^2 + D x + E y + F = 0
+        mx, my = xs.mean(), ys.mean()
+        u = xs - mx
+        v = ys - my
+        # Normalgleichungen direkt loesen (3x3), schneller als lstsq
+        uu = u * u
+        vv = v * v
+        uv = u * v
+        w = uu + vv
+        M = np.array([[uu.sum(), uv.sum(), 0.0],
+                      [uv.sum(), vv.sum(), 0.0],
+                      [0.0, 0.0, float(u.size)]])
+        rhs = -np.array([(u * w).sum(), (v * w).sum(), w.sum()])
+        try:
+            D, E, F = np.linalg.solve(M, rhs)
+        except np.linalg.LinAlgError:
+            return None
+        cx = -D / 2
+        cy = -E / 2
+        r2 = cx * cx + cy * cy - F
+        if r2 <= 0:
+            return None
+        return float(cx + mx), float(cy + my), float(np.sqrt(r2))
+
+    def detect(self, gray, min_radius=None, max_radius=None, min_dist=None, param2=None):
+        """
+        Sucht den staerksten Kreis im Graustufenbild.
+
+        Args:
+            gray (np.ndarray): Graustufenbild (z.B. Y-Ebene aus YUV420), wird nicht veraendert
+            min_radius (int, optional): Engeres Radiusband fuer diesen Aufruf
+            max_radius (int, optional): Engeres Radiusband fuer diesen Aufruf
+            min_dist (float, optional): minDist fuer diesen Aufruf
+            param2 (float, optional): Akkumulator-Schwelle fuer diesen Aufruf
+
+        Returns:
+            tuple: (found, (x, y, r)) mit Subpixel-Koordinaten im Bild,
+            sonst (False, (None, None, None))
+        """
+        start = time.perf_counter()
+        candidates = self._coarse(
+            gray,
+            self.min_radius if min_radius is None else min_radius,
+            self.max_radius if max_radius is None else max_radius,
+            self.min_dist if min_dist is None else min_dist,
+            self.param2 if param2 is None else param2)
+        coarse_done = time.perf_counter()
+
+        result = None
+        for candidate in candidates:
+            result = self._refine(gray, candidate)
+            if result is not None:
+                break
+            self.rejected_candidates += 1
+        refine_done = time.perf_counter()
+
+        self._record((coarse_done - start) * 1000.0, (refine_done - coarse_done) * 1000.0)
+        if result is None:
+            self.misses += 1
+            return False, (None, None, None)
+        self.detections += 1
+        return True, result
+
+    def _record(self, coarse_ms, refine_ms):
+        self.last_coarse_ms = coarse_ms
+        self.last_refine_ms = refine_ms
+        if self.detections + self.misses == 0:
+            self.mean_coarse_ms = coarse_ms
+            self.mean_refine_ms = refine_ms
+        else:
+            self.mean_coarse_ms += 0.1 * (coarse_ms - self.mean_coarse_ms)
+            self.mean_refine_ms += 0.1 * (refine_ms - self.mean_refine_ms)
+
+    def get_stats(self):
+        return {
+            "factor": self.factor,
+            "detections": self.detections,
+            "misses": self.misses,
+            "rejected_candidates": self.rejected_candidates,
+            "last_coarse_ms": round(self.last_coarse_ms, 3),
+            "last_refine_ms": round(self.last_refine_ms, 3),
+            "mean_coarse_ms": round(self.mean_coarse_ms, 3),
+            "mean_refine_ms": round(self.mean_refine_ms, 3),
+        }
@@ -0,0 +1,404 @@
+"""
+Hochgeschwindigkeits-Aufnahme mit Vorlauf (Pre-Trigger) fuer die Capture-Pipeline
+
+Die letzten Sekunden Rohbilder liegen in einem Ringpuffer im Speicher, der
+beim Scharfschalten (arm) einmal angelegt wird. Bei einem Trigger schreibt
+ein eigener Thread den Vorlauf und die folgenden Bilder in eine
+memory-mapped Datei. Der Tracking-Thread
+kopiert pro Bild nur in den Ringpuffer und legt dabei keinen Speicher an.
+
+Eine Aufnahme ist ein Ordner mit:
+    frames.raw  Rohbilder hintereinander (memory-mapped geschrieben)
+    meta.npy    Ein Eintrag pro Bild (FRAME_DTYPE): Zeitstempel, Groesse, Crop, Offset in frames.raw
+    info.json   Ausloeser, Zeitpunkt, Kameraformat, Anzahl Bilder
+"""
+import os
+import json
+import time
+import datetime
+import threading
+import numpy as np
+
+# Metadaten pro Bild, im Ringpuffer und in meta.npy
+FRAME_DTYPE = np.dtype([
+    ("seq", "u8"),
+    ("timestamp", "f8"),
+    ("pos", "u8"),          # Ring: fortlaufende Byteposition, Datei: Offset in frames.raw
+    ("nbytes", "u4"),
+    ("height", "u4"),
+    ("width", "u4"),
+    ("channels", "u1"),     # 0 = 2D-Array (z.B. YUV420)
+    ("found", "i1"),        # 1/0 = Ball gefunden/nicht, -1 = unbekannt
+    ("crop_x", "i4"),
+    ("crop_y", "i4"),
+    ("crop_width", "i4"),
+    ("crop_height", "i4"),
+])
+
+TRIGGER_DETECTED = "ball_detected"
+TRIGGER_LOST = "detection_lost"
+
+
+class FrameRecorder:
+    """
+    Ringpuffer fuer Rohbilder mit Aufnahme auf Trigger.
+
+    Der Ringpuffer (buffer_mb) wird erst mit arm() angelegt; vorher kehrt
+    add() sofort zurueck und kostet weder Speicher noch eine Kopie pro Bild.
+    add() wird im Capture- oder Tracking-Thread pro Bild aufgerufen und
+    kopiert das Bild in den vorab angelegten Puffer. Bilder unterschiedlicher
+    Groesse (z.B. langsamer und schneller Crop-Modus) liegen direkt
+    hintereinander. trigger() startet eine Aufnahme: der Schreib-Thread
+    sichert alle Bilder ab pre_seconds vor dem Trigger bis post_seconds
+    danach. Bilder, die der Ring ueberschreibt, bevor sie gesichert sind,
+    werden als verloren gezaehlt.
+
+    Args:
+        directory (str): Zielordner fuer Aufnahmen
+        buffer_mb (float): Groesse des Ringpuffers in MiB
+        max_frames (int): Maximale Anzahl Bilder im Ring (Metadaten-Slots)
+        pre_seconds (float): Vorlauf vor dem Trigger
+        post_seconds (float): Nachlauf nach dem Trigger
+        capture_format (str, optional): Kameraformat, wird in info.json gespeichert
+        auto_triggers (iterable): TRIGGER_DETECTED und/oder TRIGGER_LOST fuer
+            automatische Aufnahmen ueber update_detection()
+        file_chunk_mb (float): Schrittweite, um die die Datei bei Bedarf waechst
+        armed (bool): Ringpuffer sofort anlegen, sonst erst mit arm()
+    """
+
+    def __init__(self, directory="recordings", buffer_mb=256, max_frames=4096, pre_seconds=1.0,
+                 post_seconds=1.0, capture_format=None, auto_triggers=(), file_chunk_mb=64,
+                 armed=True):
+        self.directory = directory
+        self.capacity = int(buffer_mb * 1024 * 1024)
+        self.max_frames = max_frames
+        self.pre_seconds = pre_seconds
+        self.post_seconds = post_seconds
+        self.capture_format = capture_format
+        self.auto_triggers = tuple(auto_triggers)
+        self.file_chunk = int(file_chunk_mb * 1024 * 1024)
+
+        # Erst in arm() angelegt, add() kopiert danach nur hinein
+        self.armed = False
+        self.buffer = None
+        self.meta = None
+        self.seq = 0            # letztes vollstaendig geschriebenes Bild
+        self.head = 0           # fortlaufende Byteposition nach dem letzten Bild
+        self.reserved = 0       # Ende des Bereichs, der gerade ueberschrieben wird
+        self.last_timestamp = None
+        self.last_found = None
+
+        self.cond = threading.Condition()
+        self.pending = None     # (Zeitpunkt, Ausloeser) fuer den Schreib-Thread
+        self.recording = False
+        self.running = True
+        self.thread = threading.Thread(target=self._writer_loop, daemon=True)
+        self.thread.start()
+
+        # Statistik
+        self.recordings = 0
+        self.frames_written = 0
+        self.frames_lost = 0
+        self.triggers_ignored = 0
+        self.last_path = None
+
+        if armed:
+            self.arm()
+
+    def arm(self):
+        """
+        Ringpuffer anlegen und ab dem naechsten Bild mitschreiben.
+
+        Returns:
+            bool: True, wenn der Recorder dadurch scharf geschaltet wurde
+        """
+        with self.cond:
+            if self.armed:
+                return False
+            self.buffer = np.zeros(self.capacity, dtype=np.uint8)
+            self.meta = np.zeros(self.max_frames, dtype=FRAME_DTYPE)
+            # Zuletzt setzen: add() sieht armed erst mit fertigem Puffer
+            self.armed = True
+        return True
+
+    # --- Tracking-Thread ---
+    def add(self, frame, timestamp=None, crop=None, found=None):
+        """
+        Bild in den Ringpuffer kopieren (keine Speicheranforderung).
+
+        Ohne arm() passiert nichts.
+
+        Args:
+            frame (np.ndarray): Rohbild (uint8), z.B. direkt aus capture_array()
+            timestamp (float, optional): Aufnahmezeitpunkt, sonst time.perf_counter()
+            crop (tuple, optional): (x_offset, y_offset, width, height) des Sensor-Crops
+            found (bool, optional): Detektionsergebnis, fuer Metadaten und Auto-Trigger
+        """
+        if not self.armed:
+            return
+        if frame.dtype != np.uint8:
+            raise ValueError("only uint8 frames can be recorded")
+        nbytes = frame.nbytes
+        if nbytes > self.capacity:
+            raise ValueError("frame larger than the recording buffer")
+        if timestamp is None:
+            timestamp = time.perf_counter()
+
+        pos = self.head
+        offset = pos % self.capacity
+        if offset + nbytes > self.capacity:
+            # Bild nicht ueber das Pufferende teilen, vorne weiterschreiben
+            pos += self.capacity - offset
+            offset = 0
+        self.reserved = pos + nbytes
+        np.copyto(self.buffer[offset:offset + nbytes].reshape(frame.shape), frame)
+
+        seq = self.seq + 1
+        row = self.meta[seq % self.max_frames]
+        row["seq"] = seq
+        row["timestamp"] = timestamp
+        row["pos"] = pos
+        row["nbytes"] = nbytes
+        row["height"] = frame.shape[0]
+        row["width"] = frame.shape[1]
+        row["channels"] = frame.shape[2] if frame.ndim == 3 else 0
+        row["found"] = -1 if found is None else int(bool(found))
+        if crop is not None:
+            row["crop_x"], row["crop_y"], row["crop_width"], row["crop_height"] = crop
+        else:
+            row["crop_x"] = row["crop_y"] = row["crop_width"] = row["crop_height"] = -1
+        self.head = pos + nbytes
+        self.seq = seq
+        self.last_timestamp = timestamp
+
+        if self.recording:
+            with self.cond:
+                self.cond.notify()
+        if found is not None and self.auto_triggers:
+            self.update_detection(found)
+
+    def update_detection(self, found):
+        """Detektionsergebnis melden; loest ggf. TRIGGER_DETECTED oder TRIGGER_LOST aus."""
+        previous = self.last_found
+        self.last_found = found
+        if previous is None:
+            return
+        if found and not previous and TRIGGER_DETECTED in self.auto_triggers:
+            self.trigger(TRIGGER_DETECTED)
+        elif previous and not found and TRIGGER_LOST in self.auto_triggers:
+            self.trigger(TRIGGER_LOST)
+
+    def trigger(self, reason="manual", timestamp=None):
+        """
+        Aufnahme starten. Waehrend einer laufenden Aufnahme oder ohne arm()
+        wird der Trigger ignoriert.
+
+        Args:
+            reason (str): Ausloeser, landet im Ordnernamen und in info.json
+            timestamp (float, optional): Triggerzeitpunkt in der Zeitbasis von add();
+                Standard ist der Zeitstempel des neuesten Bildes
+
+        Returns:
+            bool: True, wenn eine Aufnahme gestartet wurde
+        """
+        if not self.armed:
+            self.triggers_ignored += 1
+            return False
+        if timestamp is None:
+            timestamp = self.last_timestamp if self.last_timestamp is not None else time.perf_counter()
+        with self.cond:
+            if self.recording or self.pending is not None:
+                self.triggers_ignored += 1
+                return False
+            self.pending = (timestamp, reason)
+            self.recording = True
+            self.cond.notify()
+        return True
+
+    # --- Schreib-Thread ---
+    def _intact(self, pos):
+        # Daten ab pos sind noch nicht ueberschrieben
+        return self.reserved - pos <= self.capacity
+
+    def _row(self, seq):
+        row = self.meta[seq % self.max_frames].copy()
+        if row["seq"] != seq or not self._intact(int(row["pos"])):
+            return None
+        return row
+
+    def _first_seq(self, start_time):
+        # Aeltestes noch vorhandenes Bild im Vorlauf suchen
+        first = self.seq + 1
+        seq = self.seq
+        while seq > 0 and seq > self.seq - self.max_frames:
+            row = self._row(seq)
+            if row is None or row["timestamp"] < start_time:
+                break
+            first = seq
+            seq -= 1
+        return first
+
+    def _writer_loop(self):
+        while self.running:
+            with self.cond:
+                self.cond.wait_for(lambda: self.pending is not None or not self.running)
+                if not self.running:
+                    break
+                trigger_time, reason = self.pending
+                self.pending = None
+            try:
+                self._record(trigger_time, reason)
+            finally:
+                with self.cond:
+                    self.recording = False
+
+    def _record(self, trigger_time, reason):
+        stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S-%f")[:-3]
+        # Ausloeser kann aus einer HTTP-Anfrage kommen: nur sichere Zeichen im Ordnernamen
+        safe_reason = "".join(c if c.isalnum() or c in "-_" else "_" for c in reason)[:40]
+        path = os.path.join(self.directory, f"{stamp}_{safe_reason}")
+        os.makedirs(path, exist_ok=True)
+        raw_path = os.path.join(path, "frames.raw")
+
+        seq = self._first_seq(trigger_time - self.pre_seconds)
+        # Startgroesse: Vorlauf plus geschaetzter Nachlauf, waechst bei Bedarf
+        pre_bytes = max(0, self.head - int(self.meta[seq % self.max_frames]["pos"])) \
+            if seq <= self.seq else 0
+        size = pre_bytes + max(self.file_chunk,
+                               int(pre_bytes / max(self.pre_seconds, 1e-3) * self.post_seconds * 1.25))
+        raw = np.memmap(raw_path, dtype=np.uint8, mode="w+", shape=(size,))
+        rows = []
+        write_pos = 0
+        lost = 0
+        end_time = trigger_time + self.post_seconds
+        idle_since = time.perf_counter()
+
+        while self.running:
+            if seq > self.seq:
+                # Auf neue Bilder warten; ohne neue Bilder (Kamera steht) abbrechen
+                with self.cond:
+                    self.cond.wait(0.05)
+                if seq > self.seq and time.perf_counter() - idle_since > max(1.0, self.post_seconds):
+                    break
+                continue
+            idle_since = time.perf_counter()
+
+            row = self._row(seq)
+            if row is None:
+                lost += 1
+                seq += 1
+                continue
+            if row["timestamp"] > end_time:
+                break
+
+            nbytes = int(row["nbytes"])
+            if write_pos + nbytes > size:
+                raw.flush()
+                del raw
+                size += max(self.file_chunk, nbytes)
+                with open(raw_path, "r+b") as f:
+                    f.truncate(size)
+                raw = np.memmap(raw_path, dtype=np.uint8, mode="r+", shape=(size,))
+
+            offset = int(row["pos"]) % self.capacity
+            raw[write_pos:write_pos + nbytes] = self.buffer[offset:offset + nbytes]
+            # Waehrend des Kopierens ueberschrieben? Dann verwerfen
+            if self._row(seq) is None:
+                lost += 1
+                seq += 1
+                continue
+            row["pos"] = write_pos
+            rows.append(row)
+            write_pos += nbytes
+            seq += 1
+            self.frames_written += 1
+
+        raw.flush()
+        del raw
+        with open(raw_path, "r+b") as f:
+            f.truncate(write_pos)
+        meta = np.array(rows, dtype=FRAME_DTYPE)
+        np.save(os.path.join(path, "meta.npy"), meta)
+        info = {
+            "reason": reason,
+            "trigger_time": trigger_time,
+            "pre_seconds": self.pre_seconds,
+            "post_seconds": self.post_seconds,
+            "capture_format": self.capture_format,
+            "frames": len(rows),
+            "frames_lost": lost,
+            "bytes": write_pos,
+            "created": datetime.datetime.now().isoformat(timespec="milliseconds"),
+        }
+        with open(os.path.join(path, "info.json"), "w") as f:
+            json.dump(info, f, indent=2)
+
+        self.frames_lost += lost
+        self.recordings += 1
+        self.last_path = path
+        print(f"recording saved: {path} ({len(rows)} frames, {lost} lost)")
+
+    def get_stats(self):
+        if not self.armed:
+            return {
+                "armed": False,
+                "recording": False,
+                "buffered_frames": 0,
+                "buffered_seconds": 0.0,
+                "recordings": self.recordings,
+                "frames_written": self.frames_written,
+                "frames_lost": self.frames_lost,
+                "triggers_ignored": self.triggers_ignored,
+                "last_path": self.last_path,
+            }
+        meta = self.meta.copy()
+        valid = ((meta["seq"] > 0) & (meta["seq"] + self.max_frames > self.seq)
+                 & (self.reserved - meta["pos"].astype(np.int64) <= self.capacity))
+        buffered = int(np.count_nonzero(valid))
+        span = 0.0
+        if buffered:
+            span = self.last_timestamp - float(meta["timestamp"][valid].min())
+        return {
+            "armed": True,
+            "recording": self.recording,
+            "buffered_frames": buffered,
+            "buffered_seconds": round(span, 3),
+            "recordings": self.recordings,
+            "frames_written": self.frames_written,
+            "frames_lost": self.frames_lost,
+            "triggers_ignored": self.triggers_ignored,
+            "last_path": self.last_path,
+        }
+
+    def stop(self):
+        """Laufende Aufnahme abschliessen und den Schreib-Thread beenden."""
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+        self.thread.join()
+
+
+def load_recording(path):
+    """
+    Aufnahme oeffnen, ohne die Bilder in den Speicher zu laden.
+
+    Returns:
+        tuple: (info dict, meta array (FRAME_DTYPE), frames memmap (uint8))
+    """
+    with open(os.path.join(path, "info.json")) as f:
+        info = json.load(f)
+    meta = np.load(os.path.join(path, "meta.npy"))
+    raw_path = os.path.join(path, "frames.raw")
+    if os.path.getsize(raw_path) == 0:
+        return info, meta, np.zeros(0, dtype=np.uint8)
+    frames = np.memmap(raw_path, dtype=np.uint8, mode="r")
+    return info, meta, frames
+
+
+def recording_frame(frames, row):
+    """Einzelnes Bild einer Aufnahme als View (z.B. frames, meta[i] aus load_recording)."""
+    start = int(row["pos"])
+    data = frames[start:start + int(row["nbytes"])]
+    if row["channels"]:
+        return data.reshape(int(row["height"]), int(row["width"]), int(row["channels"]))
+    return data.reshape(int(row["height"]), int(row["width"]))
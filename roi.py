@@ -0,0 +1,114 @@
+"""
+Vorhergesagte Region-of-Interest fuer die Balldetektion
+"""
+
+
+class RoiPredictor:
+    """
+    Sagt aus den letzten Detektionen voraus, wo der Ball im naechsten Bild
+    liegt, und liefert ein Suchfenster um diese Position.
+
+    Die Fenstergroesse ergibt sich aus dem letzten Radius und der
+    Geschwindigkeit (Pixel pro Bild). Nach einem Fehlschlag wird kein
+    Fenster geliefert, d.h. es wird wieder im ganzen Bild gesucht.
+
+    Args:
+        radius_factor (float): Halbe Fenstergroesse als Vielfaches des Radius
+        velocity_factor (float): Zuschlag pro Pixel Geschwindigkeit
+        padding (int): Fester Zuschlag in Pixel
+        min_half_size (int): Minimale halbe Fenstergroesse in Pixel
+    """
+
+    def __init__(self, radius_factor=1.5, velocity_factor=2.0, padding=8, min_half_size=32):
+        self.radius_factor = radius_factor
+        self.velocity_factor = velocity_factor
+        self.padding = padding
+        self.min_half_size = min_half_size
+        self.reset()
+
+        # Statistik
+        self.roi_hits = 0
+        self.roi_misses = 0
+        self.full_frame_searches = 0
+
+    def reset(self):
+        self.last = None  # (x, y, r)
+        self.velocity = (0.0, 0.0)
+
+    def shift(self, dx, dy):
+        """Verschiebt die letzte Position, z.B. wenn sich der Sensor-Crop bewegt."""
+        if self.last is not None:
+            x, y, r = self.last
+            self.last = (x + dx, y + dy, r)
+
+    def window(self, width, height, min_radius=0):
+        """
+        Suchfenster (x0, y0, x1, y1) fuer das naechste Bild oder None,
+        wenn im ganzen Bild gesucht werden soll.
+        """
+        if self.last is None:
+            return None
+        x, y, r = self.last
+        vx, vy = self.velocity
+
+        # Vorhergesagte Position (konstante Geschwindigkeit)
+        px = x + vx
+        py = y + vy
+        radius = max(r, min_radius)
+        half_w = int(radius * self.radius_factor + abs(vx) * self.velocity_factor + self.padding)
+        half_h = int(radius * self.radius_factor + abs(vy) * self.velocity_factor + self.padding)
+        half_w = max(half_w, self.min_half_size)
+        half_h = max(half_h, self.min_half_size)
+
+        x0 = max(0, int(px) - half_w)
+        y0 = max(0, int(py) - half_h)
+        x1 = min(width, int(px) + half_w)
+        y1 = min(height, int(py) + half_h)
+
+        # Fenster deckt (fast) das ganze Bild ab oder liegt ausserhalb
+        if x1 - x0 <= 0 or y1 - y0 <= 0:
+            return None
+        if (x1 - x0) * (y1 - y0) >= 0.75 * width * height:
+            return None
+        return x0, y0, x1, y1
+
+    def update(self, found, x=None, y=None, r=None):
+        if not found or x is None or y is None:
+            self.reset()
+            return
+        x = float(x)
+        y = float(y)
+        r = float(r or 0)
+        if self.last is not None:
+            self.velocity = (x - self.last[0], y - self.last[1])
+        self.last = (x, y, r)
+
+
+def detect_with_roi(detect, frame, predictor, min_radius=0, size=None, full_frame=True):
+    """
+    Fuehrt detect(frame, roi) zuerst im vorhergesagten Fenster aus und nur
+    nach einem Fehlschlag im ganzen Bild.
+
+    detect muss die Signatur detect(frame, roi=None) -> (frame, found, (x, y, r))
+    haben und Koordinaten im Gesamtbild liefern. size = (width, height) ist
+    noetig, wenn frame nicht die Bildgroesse hat (z.B. rohes YUV420).
+    Mit full_frame=False entfaellt die Ganzbildsuche nach einem Fehlschlag im
+    Fenster; erst das naechste Bild sucht ohne Vorhersage im ganzen Bild.
+    """
+    w, h = size if size is not None else (frame.shape[1], frame.shape[0])
+    roi = predictor.window(w, h, min_radius)
+    if roi is not None:
+        frame, found, dimensions = detect(frame, roi)
+        if found:
+            predictor.roi_hits += 1
+            predictor.update(True, *dimensions)
+            return frame, found, dimensions
+        predictor.roi_misses += 1
+        if not full_frame:
+            predictor.update(False)
+            return frame, False, (None, None, None)
+
+    predictor.full_frame_searches += 1
+    frame, found, dimensions = detect(frame)
+    predictor.update(found, *dimensions)
+    return frame, found, dimensions
@@ -0,0 +1,212 @@
+"""
+Taktung der Tracking-Schleife: absolute Deadlines statt sleep(Restzeit)
+"""
+import time
+from metrics import LatencyHistogram
+
+# Taktung
+PACING_FRAMES = "frames"  # jedes neue Kamerabild sofort, die Kamera gibt den Takt
+PACING_FIXED = "fixed"    # feste Rate auf einem Raster absoluter Deadlines
+PACING_FREE = "free"      # so schnell wie moeglich, ohne Warten
+PACINGS = (PACING_FRAMES, PACING_FIXED, PACING_FREE)
+
+# Verhalten bei Ueberlauf
+OVERRUN_SKIP = "skip"        # verpasste Takte auslassen, Raster bleibt erhalten
+OVERRUN_DEGRADE = "degrade"  # Detektor vereinfachen, bis die Zyklen wieder passen
+OVERRUN_ALERT = "alert"      # nur melden (on_alert), hoechstens einmal pro Intervall
+OVERRUN_POLICIES = (OVERRUN_SKIP, OVERRUN_DEGRADE, OVERRUN_ALERT)
+
+
+class DeadlineScheduler:
+    """
+    Taktet eine Verarbeitungsschleife und zaehlt Ueberlaeufe.
+
+    Die naechste Deadline wird immer aus der vorigen berechnet (deadline +
+    period), nie aus dem Ende des Zyklus; Laufzeitschwankungen und die
+    Ungenauigkeit von sleep() summieren sich damit nicht zu einer Drift.
+    Ein zu langer Zyklus wird bei fixed nachgeholt (der naechste startet
+    sofort), bis hoechstens max_catchup Takte im Rueckstand; danach oder mit
+    overrun="skip" springt die Deadline auf den naechsten Takt des Rasters.
+
+    Ein Ueberlauf ist bei fixed ein Zyklusende nach dem naechsten Takt, bei
+    frames und free ein Zyklus laenger als period_s (bei frames = Bilddauer,
+    d.h. das naechste Bild wartet schon oder geht verloren).
+
+    Verwendung:
+        scheduler.wait()     # fixed: bis zum Takt schlafen
+        ...                  # auf das Bild warten
+        scheduler.start()    # Zyklusbeginn
+        ...                  # Detektion
+        scheduler.done()     # Ueberlauf pruefen, naechste Deadline
+
+    Args:
+        period_s (float): Taktdauer (fixed) bzw. Zeitbudget pro Zyklus
+        pacing (str): "frames", "fixed" oder "free"
+        overrun (str): "skip", "degrade" oder "alert"
+        metrics (Metrics, optional): Exportiert Ueberlaeufe und Weckverspaetung
+        on_degrade (callable, optional): on_degrade(True/False) bei overrun="degrade"
+        on_alert (callable, optional): on_alert(stats) bei overrun="alert",
+            Standard ist eine Warnung auf stdout
+        degrade_after (int): Ueberlaeufe in Folge bis zum Vereinfachen
+        recover_after (int): Puenktliche Zyklen in Folge bis zum Zuruecknehmen
+        alert_interval_s (float): Mindestabstand zwischen zwei Meldungen
+        max_catchup (int): So viele Takte Rueckstand werden nachgeholt (fixed)
+    """
+
+    def __init__(self, period_s=0.002, pacing=PACING_FRAMES, overrun=OVERRUN_SKIP, metrics=None,
+                 on_degrade=None, on_alert=None, degrade_after=3, recover_after=100,
+                 alert_interval_s=1.0, max_catchup=2):
+        if pacing not in PACINGS:
+            raise ValueError(f"pacing must be one of {PACINGS}, got {pacing!r}")
+        if overrun not in OVERRUN_POLICIES:
+            raise ValueError(f"overrun must be one of {OVERRUN_POLICIES}, got {overrun!r}")
+        self.period = period_s
+        self.pacing = pacing
+        self.overrun = overrun
+        self.on_degrade = on_degrade
+        self.on_alert = on_alert or self._print_alert
+        self.degrade_after = degrade_after
+        self.recover_after = recover_after
+        self.alert_interval = alert_interval_s
+        self.max_catchup = max_catchup
+        self.deadline = None
+        self.cycle_start = None
+        self.degraded = False
+
+        if metrics is not None:
+            self.overrun_hist = metrics.histogram("scheduler_overrun_seconds",
+                                                  "Time a tracking cycle ran past its deadline")
+            self.lateness_hist = metrics.histogram("scheduler_wakeup_lateness_seconds",
+                                                   "Wake-up delay after a fixed-rate deadline")
+            metrics.counter("scheduler_overruns_total", "Tracking cycles past their deadline",
+                            fn=lambda: self.overruns)
+            metrics.counter("scheduler_ticks_skipped_total", "Fixed-rate ticks skipped after overruns",
+                            fn=lambda: self.ticks_skipped)
+            metrics.gauge("scheduler_degraded", "Detector degraded because of overruns",
+                          lambda: int(self.degraded))
+        else:
+            self.overrun_hist = LatencyHistogram()
+            self.lateness_hist = LatencyHistogram()
+
+        # Statistik
+        self.cycles = 0
+        self.overruns = 0
+        self.consecutive_overruns = 0
+        self.on_time = 0
+        self.worst_overrun_s = 0.0
+        self.ticks_skipped = 0
+        self.realigned = 0
+        self.degradations = 0
+        self.alerts = 0
+        self._alert_time = 0.0
+        self._alert_overruns = 0
+        self.mean_interval_s = 0.0
+
+    # --- Zyklus ---
+    def wait(self):
+        """Bei fixed bis zur naechsten Deadline schlafen, sonst sofort zurueck."""
+        if self.pacing != PACING_FIXED:
+            return
+        now = time.perf_counter()
+        if self.deadline is None or now - self.deadline > self.max_catchup * self.period:
+            # Erster Takt oder Schleife stand (keine Bilder): Raster neu ausrichten
+            self.deadline = now
+            return
+        delay = self.deadline - now
+        if delay > 0:
+            time.sleep(delay)
+            self.lateness_hist.observe(max(0.0, time.perf_counter() - self.deadline))
+
+    def start(self):
+        """Zyklusbeginn (Bild liegt vor); gibt perf_counter() zurueck."""
+        now = time.perf_counter()
+        if self.cycle_start is not None:
+            interval = now - self.cycle_start
+            self.mean_interval_s += 0.05 * (interval - self.mean_interval_s) \
+                if self.mean_interval_s else interval
+        self.cycle_start = now
+        return now
+
+    def done(self):
+        """
+        Zyklusende: Ueberlauf auswerten und die naechste Deadline setzen.
+
+        Returns:
+            bool: True, wenn der Zyklus seine Deadline verpasst hat
+        """
+        end = time.perf_counter()
+        self.cycles += 1
+        if self.pacing == PACING_FIXED and self.deadline is not None:
+            late = end - self.deadline
+            self.deadline += self.period
+            overrun_s = end - self.deadline
+            if overrun_s > 0 and (self.overrun == OVERRUN_SKIP
+                                  or overrun_s > self.max_catchup * self.period):
+                # Auf den naechsten Takt nach end springen, Phase bleibt erhalten
+                missed = int(late // self.period)
+                self.deadline += missed * self.period
+                self.ticks_skipped += missed
+                self.realigned += 1
+        else:
+            start = self.cycle_start if self.cycle_start is not None else end
+            overrun_s = end - start - self.period
+
+        if overrun_s > 0:
+            self._overran(overrun_s)
+            return True
+        self._on_time()
+        return False
+
+    # --- Ueberlauf ---
+    def _overran(self, overrun_s):
+        self.overruns += 1
+        self.consecutive_overruns += 1
+        self.on_time = 0
+        self.worst_overrun_s = max(self.worst_overrun_s, overrun_s)
+        self.overrun_hist.observe(overrun_s)
+        if self.overrun == OVERRUN_DEGRADE:
+            if not self.degraded and self.consecutive_overruns >= self.degrade_after:
+                self.degraded = True
+                self.degradations += 1
+                if self.on_degrade is not None:
+                    self.on_degrade(True)
+        elif self.overrun == OVERRUN_ALERT:
+            self._alert_overruns += 1
+            now = time.monotonic()
+            if now - self._alert_time >= self.alert_interval:
+                self._alert_time = now
+                self.alerts += 1
+                self.on_alert(self.get_stats())
+                self._alert_overruns = 0
+
+    def _on_time(self):
+        self.consecutive_overruns = 0
+        self.on_time += 1
+        if self.degraded and self.on_time >= self.recover_after:
+            self.degraded = False
+            if self.on_degrade is not None:
+                self.on_degrade(False)
+
+    def _print_alert(self, stats):
+        print(f"Warning: tracking cycle overran its {stats['period_ms']} ms deadline "
+              f"({self._alert_overruns} times since last warning, "
+              f"worst {stats['worst_overrun_ms']} ms)")
+
+    def get_stats(self):
+        return {
+            "pacing": self.pacing,
+            "overrun_policy": self.overrun,
+            "period_ms": round(self.period * 1000.0, 3),
+            "cycles": self.cycles,
+            "cycle_hz": round(1.0 / self.mean_interval_s, 1) if self.mean_interval_s else 0.0,
+            "overruns": self.overruns,
+            "worst_overrun_ms": round(self.worst_overrun_s * 1000.0, 3),
+            "mean_overrun_ms": round(self.overrun_hist.mean() * 1000.0, 3),
+            "p99_overrun_ms": round(self.overrun_hist.quantile(0.99) * 1000.0, 3),
+            "ticks_skipped": self.ticks_skipped,
+            "realigned": self.realigned,
+            "p99_wakeup_lateness_ms": round(self.lateness_hist.quantile(0.99) * 1000.0, 3),
+            "degraded": self.degraded,
+            "degradations": self.degradations,
+            "alerts": self.alerts,
+        }
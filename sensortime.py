@@ -0,0 +1,172 @@
+"""
+Bildrate, verlorene Bilder und Latenz aus den Sensor-Zeitstempeln von Picamera2
+"""
+import time
+
+# SensorTimestamp kommt aus CLOCK_MONOTONIC (ns), wie time.monotonic_ns()
+now_ns = time.monotonic_ns
+
+
+def capture_with_metadata(picam2, name="main"):
+    """
+    Bild und Metadaten desselben Requests holen (statt capture_array()).
+
+    Returns:
+        tuple: (frame, metadata) mit u.a. SensorTimestamp (ns), FrameDuration
+            und ExposureTime (us); fehlt SensorTimestamp, steht dort die
+            Zeit der Abholung
+    """
+    request = picam2.capture_request()
+    try:
+        frame = request.make_array(name)
+        metadata = request.get_metadata()
+    finally:
+        request.release()
+    if metadata.get("SensorTimestamp") is None:
+        metadata["SensorTimestamp"] = now_ns()
+    return frame, metadata
+
+
+class SensorTiming:
+    """
+    Wertet die Zeitstempel der Bilder aus.
+
+    Der Abstand zweier SensorTimestamps ist das echte Bildintervall des
+    Sensors, unabhaengig davon, wie schnell Python die Bilder abholt. Ist der
+    Abstand deutlich groesser als die FrameDuration, fehlen dazwischen Bilder
+    (verloren im ISP, in der Queue oder weil zu langsam abgeholt). Nach
+    restart() (Crop geaendert, Kamera neu gestartet) wird die naechste Luecke
+    getrennt als Neustart gezaehlt.
+
+    position_ready() misst die Zeit vom Start der Belichtung bis die Position
+    vorliegt.
+
+    Args:
+        frame_duration_us (float): Nominale Bilddauer, falls die Metadaten keine FrameDuration haben
+        metrics (Metrics, optional): Bekommt die Latenz als Histogramm und die verlorenen Bilder
+        gap_tolerance (float): Anteil einer Bilddauer, ab dem ein Intervall als Luecke zaehlt
+    """
+
+    def __init__(self, frame_duration_us=2000, metrics=None, gap_tolerance=0.5):
+        self.nominal_duration_us = frame_duration_us
+        self.gap_tolerance = gap_tolerance
+        self.last_timestamp = None
+        self.restarting = False
+
+        # Zustand fuer die Anzeige
+        self.frames = 0
+        self.frames_dropped = 0
+        self.frames_lost_restart = 0
+        self.frame_duration_us = frame_duration_us
+        self.exposure_us = None
+        self.interval_us = 0.0
+        self.mean_interval_us = 0.0
+        self.last_latency_ms = 0.0
+        self.mean_latency_ms = 0.0
+        self.last_gap_us = 0.0
+        # Empfangene Bilder pro Sekunde Sensorzeit (Fenster von 1 s)
+        self.received_fps = 0.0
+        self._window_start = None
+        self._window_frames = 0
+
+        self.latency_histogram = None
+        if metrics is not None:
+            self.latency_histogram = metrics.histogram(
+                "exposure_to_position_seconds",
+                "Time from start of exposure (SensorTimestamp) until the position is available")
+            metrics.counter("frames_dropped_total", "Frames lost on the way", {"where": "sensor"},
+                            fn=lambda: self.frames_dropped)
+            metrics.counter("frames_dropped_total", "Frames lost on the way", {"where": "restart"},
+                            fn=lambda: self.frames_lost_restart)
+            metrics.gauge("sensor_fps", "Frame rate from SensorTimestamp intervals", self.sensor_fps)
+
+    def restart(self):
+        """Naechste Luecke gehoert zu einem gewollten Neustart der Kamera."""
+        self.restarting = True
+
+    def update(self, metadata):
+        """
+        Zeitstempel eines neuen Bildes eintragen.
+
+        Args:
+            metadata (dict): Metadaten des Requests
+
+        Returns:
+            int: Anzahl der Bilder, die seit dem letzten fehlen
+        """
+        timestamp = metadata.get("SensorTimestamp")
+        if timestamp is None:
+            return 0
+        duration = metadata.get("FrameDuration") or self.nominal_duration_us
+        self.frame_duration_us = duration
+        self.exposure_us = metadata.get("ExposureTime", self.exposure_us)
+        self.frames += 1
+
+        missing = 0
+        if self.last_timestamp is not None:
+            interval_us = (timestamp - self.last_timestamp) / 1000.0
+            self.interval_us = interval_us
+            gap = interval_us / duration
+            if gap > 1.0 + self.gap_tolerance:
+                missing = int(round(gap)) - 1
+                self.last_gap_us = interval_us
+                if self.restarting:
+                    self.frames_lost_restart += missing
+                else:
+                    self.frames_dropped += missing
+            elif interval_us > 0:
+                # Nur lueckenlose Intervalle ergeben die Sensorrate
+                if self.mean_interval_us == 0.0:
+                    self.mean_interval_us = interval_us
+                else:
+                    self.mean_interval_us += 0.05 * (interval_us - self.mean_interval_us)
+        self.restarting = False
+        self.last_timestamp = timestamp
+
+        if self._window_start is None:
+            self._window_start = timestamp
+            self._window_frames = 0
+        self._window_frames += 1
+        window_ns = timestamp - self._window_start
+        if window_ns >= 1_000_000_000:
+            self.received_fps = (self._window_frames - 1) * 1e9 / window_ns
+            self._window_start = timestamp
+            self._window_frames = 1
+        return missing
+
+    def position_ready(self, timestamp, ready_ns=None):
+        """
+        Position des Bildes mit SensorTimestamp timestamp liegt vor.
+
+        Returns:
+            float: Latenz in Sekunden (Belichtungsstart bis jetzt)
+        """
+        if timestamp is None:
+            return None
+        latency = ((ready_ns if ready_ns is not None else now_ns()) - timestamp) / 1e9
+        self.last_latency_ms = latency * 1000.0
+        if self.mean_latency_ms == 0.0:
+            self.mean_latency_ms = self.last_latency_ms
+        else:
+            self.mean_latency_ms += 0.05 * (self.last_latency_ms - self.mean_latency_ms)
+        if self.latency_histogram is not None:
+            self.latency_histogram.observe(latency)
+        return latency
+
+    def sensor_fps(self):
+        return 1e6 / self.mean_interval_us if self.mean_interval_us else 0.0
+
+    def get_stats(self):
+        return {
+            "sensor_fps": round(self.sensor_fps(), 2),
+            "received_fps": round(self.received_fps, 2),
+            "frame_interval_us": round(self.interval_us, 1),
+            "frame_duration_us": self.frame_duration_us,
+            "exposure_us": self.exposure_us,
+            "frames": self.frames,
+            "frames_dropped": self.frames_dropped,
+            "frames_lost_restart": self.frames_lost_restart,
+            "last_gap_us": round(self.last_gap_us, 1),
+            "latency_ms": round(self.last_latency_ms, 3),
+            "mean_latency_ms": round(self.mean_latency_ms, 3),
+        }
@@ -0,0 +1,314 @@
+"""
+Ballpositionen im Shared Memory fuer Leser in anderen Prozessen (ohne Serialisierung, ohne Sockets)
+
+Tracker-Prozess:
+    tracker = Balltracker(shared_positions=True)
+
+Anderer Prozess (z.B. Steuerung):
+    reader = SharedPositionReader()
+    for sample in reader.samples():
+        print(sample["seq"], sample["x"], sample["y"], sample["z"])
+"""
+import os
+import mmap
+import time
+import numpy as np
+from multiprocessing import shared_memory
+
+try:
+    import _posixshmem
+except ImportError:  # Windows: Bloecke verschwinden mit dem letzten Handle, kein resource_tracker
+    _posixshmem = None
+
+DEFAULT_NAME = "balltracker_positions"
+MAGIC = 0x42544B50  # "BTKP"
+LAYOUT_VERSION = 1
+
+HEADER_DTYPE = np.dtype([
+    ("magic", np.uint32),
+    ("layout", np.uint32),
+    ("capacity", np.uint32),
+    ("writer_pid", np.uint32),
+    ("head", np.uint64),  # seq des zuletzt vollstaendig geschriebenen Samples
+    ("created_ns", np.int64),
+])
+
+# Feste Anordnung eines Slots; version ist der Seqlock (ungerade = wird geschrieben)
+SAMPLE_DTYPE = np.dtype([
+    ("version", np.uint64),
+    ("seq", np.uint64),
+    ("timestamp_ns", np.int64),
+    ("x", np.float64),
+    ("y", np.float64),
+    ("z", np.float64),
+    ("radius", np.float32),
+    ("confidence", np.float32),
+    ("latency_ms", np.float32),
+    ("found", np.uint8),
+])
+
+
+def _views(buf, capacity):
+    header = np.ndarray((1,), dtype=HEADER_DTYPE, buffer=buf)
+    ring = np.ndarray((capacity,), dtype=SAMPLE_DTYPE, buffer=buf, offset=HEADER_DTYPE.itemsize)
+    return header, ring
+
+
+class SharedPositionRing:
+    """
+    Schreibseite: ein Prozess, ein Thread (der Detektions-Thread).
+
+    Jedes Sample landet in Slot seq % capacity. Pro Slot gilt ein Seqlock:
+    version wird vor dem Schreiben ungerade (2*seq+1) und danach gerade
+    (2*seq+2) gesetzt, erst dann wird head im Header weitergezaehlt. Der
+    Schreiber wartet nie auf Leser; wer zu langsam liest, verliert Samples.
+
+    Args:
+        name (str): Name des Shared-Memory-Blocks
+        capacity (int): Anzahl Slots (bei 500 Hz reichen 4096 fuer ~8 s)
+    """
+
+    def __init__(self, name=DEFAULT_NAME, capacity=4096):
+        self.name = name
+        self.capacity = capacity
+        size = HEADER_DTYPE.itemsize + capacity * SAMPLE_DTYPE.itemsize
+        try:
+            self.shm = _open(name, create=True, size=size)
+        except FileExistsError:
+            owner = _owner(name)
+            if owner is not None and _pid_alive(owner[0]):
+                raise FileExistsError(f"shared memory {name} is in use by writer pid {owner[0]}") from None
+            # Rest eines abgestuerzten Trackers, es gibt nur einen Schreiber
+            _unlink(name)
+            self.shm = _open(name, create=True, size=size)
+
+        self.header, self.ring = _views(self.shm.buf, capacity)
+        self.ring[:] = np.zeros(capacity, dtype=SAMPLE_DTYPE)
+        self.version = self.ring["version"]
+        # Besitzer: pid und Erzeugungszeit, close() entfernt nur den eigenen Block
+        self.created_ns = time.monotonic_ns()
+        self.header[0] = (MAGIC, LAYOUT_VERSION, capacity, os.getpid(), 0, self.created_ns)
+        self.head = self.header["head"]
+        self.samples_written = 0
+
+    def write(self, sample):
+        """
+        Ein Sample veroeffentlichen.
+
+        Args:
+            sample (PositionSample): Aus positionstream, seq muss fortlaufend steigen
+        """
+        seq = sample.seq
+        i = seq % self.capacity
+        self.version[i] = 2 * seq + 1
+        self.ring[i] = (2 * seq + 1, seq, sample.timestamp_ns or 0, sample.x, sample.y, sample.z,
+                        sample.radius, sample.confidence,
+                        sample.latency_ms if sample.latency_ms is not None else np.nan,
+                        sample.found)
+        self.version[i] = 2 * seq + 2
+        self.head[0] = seq
+        self.samples_written += 1
+
+    def close(self):
+        """
+        Block freigeben und entfernen; Leser behalten ihre Abbildung bis zum eigenen close().
+
+        Hat inzwischen ein anderer Schreiber den Namen uebernommen, bleibt dessen Block stehen.
+        """
+        self.header = self.ring = self.version = self.head = None
+        self.shm.close()
+        if _owner(self.name) == (os.getpid(), self.created_ns):
+            _unlink(self.name)
+
+    def get_stats(self):
+        return {"name": self.name, "capacity": self.capacity,
+                "samples_written": self.samples_written}
+
+
+class SharedPositionReader:
+    """
+    Leseseite in einem beliebigen Prozess.
+
+    read_new() kopiert alle neuen Samples in einem vektorisierten Schritt
+    und verwirft Slots, die waehrend des Kopierens ueberschrieben wurden
+    (version vorher/nachher verschieden, ungerade oder seq passt nicht).
+    Der Tracker wird dabei nie blockiert. Auf ARM gibt es keine
+    Speicherbarrieren zwischen den numpy-Zuweisungen; die version- und
+    seq-Pruefung faengt halb sichtbare Slots ab, im schlimmsten Fall fehlt
+    ein Sample (torn).
+
+    Nur der Schreiber entfernt den Block (unlink); der Leser meldet ihn nicht
+    beim resource_tracker an, auch nicht im Prozess des Schreibers.
+
+    Args:
+        name (str): Name des Shared-Memory-Blocks
+        from_start (bool): Auch die noch vorhandenen aelteren Samples liefern
+    """
+
+    def __init__(self, name=DEFAULT_NAME, from_start=False):
+        self.shm = _open(name)
+        header = np.ndarray((1,), dtype=HEADER_DTYPE, buffer=self.shm.buf)
+        if header["magic"][0] != MAGIC or header["layout"][0] != LAYOUT_VERSION:
+            self.shm.close()
+            raise RuntimeError(f"shared memory {name} has no position ring (layout {LAYOUT_VERSION})")
+        self.capacity = int(header["capacity"][0])
+        self.header, self.ring = _views(self.shm.buf, self.capacity)
+        self.head = self.header["head"]
+        self.version = self.ring["version"]
+        head = int(self.head[0])
+        self.last_seq = max(0, head - self.capacity + 1) - 1 if from_start else head
+
+        # Statistik
+        self.samples_read = 0
+        self.missed = 0
+        self.torn = 0
+
+    def latest(self):
+        """Neuestes vollstaendiges Sample (numpy record) oder None."""
+        for _ in range(3):
+            seq = int(self.head[0])
+            if not seq:
+                return None
+            i = seq % self.capacity
+            before = self.version[i]
+            record = self.ring[i].copy()
+            if before == 2 * seq + 2 and self.version[i] == before and record["seq"] == seq:
+                return record
+        return None
+
+    def read_new(self):
+        """
+        Alle Samples seit dem letzten Aufruf, in Reihenfolge.
+
+        Returns:
+            np.ndarray: Strukturiertes Array (SAMPLE_DTYPE), evtl. leer
+        """
+        head = int(self.head[0])
+        if head <= self.last_seq:
+            return self.ring[:0].copy()
+        first = self.last_seq + 1
+        if head - first >= self.capacity:
+            # Vom Schreiber ueberrundet
+            self.missed += head - self.capacity + 1 - first
+            first = head - self.capacity + 1
+
+        seqs = np.arange(first, head + 1, dtype=np.uint64)
+        index = seqs % self.capacity
+        before = self.version[index]
+        records = self.ring[index]  # Fancy Indexing kopiert
+        after = self.version[index]
+        valid = (before == after) & (before == 2 * seqs + 2) & (records["seq"] == seqs)
+        if not valid.all():
+            self.torn += int((~valid).sum())
+            records = records[valid]
+        self.last_seq = head
+        self.samples_read += len(records)
+        return records
+
+    def wait_new(self, timeout=None, poll=0.0005):
+        """Wartet (Polling, ohne Syscalls zum Tracker) auf neue Samples und liefert sie."""
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while True:
+            records = self.read_new()
+            if len(records):
+                return records
+            if deadline is not None and time.monotonic() >= deadline:
+                return records
+            time.sleep(poll)
+
+    def samples(self, timeout=None, poll=0.0005):
+        """Iterator ueber jedes neue Sample; endet nach timeout Sekunden ohne Daten."""
+        while True:
+            records = self.wait_new(timeout, poll)
+            if not len(records):
+                return
+            yield from records
+
+    def close(self):
+        self.header = self.ring = self.version = self.head = None
+        self.shm.close()
+
+    def get_stats(self):
+        return {"last_seq": self.last_seq, "samples_read": self.samples_read,
+                "missed": self.missed, "torn": self.torn}
+
+
+class _SharedBlock:
+    """
+    Wie shared_memory.SharedMemory (buf, close(), unlink()), aber ohne resource_tracker.
+
+    Vor Python 3.13 meldet SharedMemory jeden geoeffneten Block beim
+    resource_tracker an, der ihn beim Ende des Prozesses entfernt: beim Leser
+    ist das falsch, beim Schreiber trifft es einen Block, den inzwischen ein
+    anderer Schreiber uebernommen hat. Ein nachtraegliches unregister() wuerde
+    den Eintrag des Schreibers entfernen, wenn beide denselben Tracker nutzen.
+    Wer den Block entfernt, entscheidet hier allein SharedPositionRing.
+    """
+
+    def __init__(self, name, create=False, size=0):
+        self.name = name
+        flags = os.O_RDWR | (os.O_CREAT | os.O_EXCL if create else 0)
+        fd = _posixshmem.shm_open("/" + name, flags, mode=0o600)
+        try:
+            if create:
+                os.ftruncate(fd, size)
+            else:
+                size = os.fstat(fd).st_size
+            self._mmap = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        self.buf = memoryview(self._mmap)
+
+    def close(self):
+        self.buf.release()
+        self._mmap.close()
+
+    def unlink(self):
+        _posixshmem.shm_unlink("/" + self.name)
+
+
+def _open(name, create=False, size=0):
+    if _posixshmem is None:
+        return shared_memory.SharedMemory(name=name, create=create, size=size)
+    return _SharedBlock(name, create, size)
+
+
+def _unlink(name):
+    if _posixshmem is None:
+        return
+    try:
+        _posixshmem.shm_unlink("/" + name)
+    except FileNotFoundError:
+        pass
+
+
+def _owner(name):
+    """(writer_pid, created_ns) des Rings name; None, wenn es ihn nicht gibt oder er kein Ring ist."""
+    try:
+        block = _open(name)
+    except FileNotFoundError:
+        return None
+    try:
+        if len(block.buf) < HEADER_DTYPE.itemsize:
+            return None
+        header = np.frombuffer(block.buf, dtype=HEADER_DTYPE, count=1).copy()
+    finally:
+        block.close()
+    if header["magic"][0] != MAGIC:
+        return None
+    return int(header["writer_pid"][0]), int(header["created_ns"][0])
+
+
+def _pid_alive(pid):
+    if _posixshmem is None:
+        # Ohne lebenden Schreiber gaebe es den Block nicht mehr
+        return True
+    if pid <= 0:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # Prozess eines anderen Benutzers
+    return True
@@ -0,0 +1,186 @@
+"""
+Eine Capture-Pipeline pro Kamera, die an beliebig viele MJPEG-Clients verteilt
+"""
+import time
+import threading
+from jpegencoder import PreviewEncoder
+from metrics import Metrics
+
+
+class StreamHub:
+    """
+    Holt Bilder in einem einzigen Thread, rendert pro angefragtem Overlay
+    (Modus) einmal die Detektion und verteilt das JPEG an alle Clients.
+    Das Encoding laeuft im PreviewEncoder mit eigener Vorschaurate, der
+    Capture-Thread wartet nie auf einen Browser.
+
+    Jeder Client bekommt immer nur das neueste fertige Bild seines Modus;
+    langsame Clients ueberspringen Bilder statt sie zu puffern. Modi ohne
+    Client werden nicht berechnet, ohne Clients wird gar nicht aufgenommen.
+
+    Ohne capture laeuft kein eigener Thread; ein externer Tracking-Loop
+    reicht seine Bilder dann mit submit() ein.
+
+    Neben stream() (ein Thread pro Flask-Client) koennen Listener jedes
+    fertige JPEG bekommen (add_listener), z.B. der AsyncStreamServer, der
+    alle Clients in einem Event-Loop bedient.
+
+    Args:
+        capture (callable, optional): Liefert bei jedem Aufruf ein neues BGR-Bild
+        process (callable, optional): process(frame, mode) -> frame mit Overlay
+            oder (frame, render); render(frame) -> BGR-Bild laeuft dann erst
+            im Encoder und nur fuer Bilder, die wirklich kodiert werden
+        modes (iterable): Erlaubte Modi; der erste ist der Standard
+        preview_fps (float): Maximale Vorschaurate pro Modus
+        target_bandwidth (float, optional): Ziel-Bandbreite in Bytes/s pro Modus
+        cpu_budget (float, optional): Anteil eines Kerns fuer das Encoding pro Modus
+        metrics (Metrics, optional): Ziel fuer Bildzeit, Encoding und Versand;
+            ohne Angabe legt der Hub eigene Metriken an
+        placement (ThreadPlacement, optional): Kerne/Prioritaet fuer den
+            Capture-Thread ("capture") und die Encoder-Threads ("encode")
+    """
+
+    def __init__(self, capture=None, process=None, modes=("none",), preview_fps=30.0,
+                 target_bandwidth=None, cpu_budget=None, metrics=None, placement=None):
+        self.capture = capture
+        self.process = process
+        self.modes = tuple(modes)
+        self.cond = threading.Condition()
+        self.subscribers = {m: 0 for m in self.modes}
+        self.latest = {m: (0, None) for m in self.modes}
+        self.thread = None
+        self.running = False
+        self.listeners = []
+        self.placement = placement
+
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.send_stage = self.metrics.stage("send")
+        self.encoder = PreviewEncoder(self.publish, preview_fps=preview_fps,
+                                      target_bandwidth=target_bandwidth,
+                                      cpu_budget=cpu_budget,
+                                      has_clients=self.has_clients,
+                                      metrics=self.metrics, placement=placement)
+        self.metrics.counter("preview_frames_skipped_total",
+                             "Frames not encoded because of preview rate, busy workers or no clients",
+                             fn=lambda: self.encoder.frames_skipped)
+        self.metrics.gauge("stream_clients", "Connected MJPEG clients", self.client_count)
+
+        # FPS der Pipeline (nicht pro Client)
+        self.fps = 0.0
+        self.frames_captured = 0
+
+    def start(self):
+        self.running = True
+        if self.capture is not None:
+            self.thread = threading.Thread(target=self._loop, name="capture", daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.running = False
+        with self.cond:
+            self.cond.notify_all()
+        if self.thread is not None:
+            self.thread.join()
+        self.encoder.shutdown()
+
+    def _active_modes(self):
+        return [m for m in self.modes if self.subscribers[m] > 0]
+
+    def _loop(self):
+        if self.placement is not None:
+            self.placement.apply("capture")
+        frame_counter = 0
+        start_time = time.time()
+
+        while self.running:
+            with self.cond:
+                # Ohne Clients nicht aufnehmen
+                self.cond.wait_for(lambda: self._active_modes() or not self.running)
+                active = self._active_modes()
+            if not self.running:
+                break
+
+            frame = self.capture()
+            self.frames_captured += 1
+            frame_start = time.perf_counter()
+
+            for mode in active:
+                # Bei mehreren Overlays darf keiner in das Bild des anderen zeichnen
+                out = frame.copy() if len(active) > 1 else frame
+                render = None
+                if self.process is not None:
+                    out = self.process(out, mode)
+                    if isinstance(out, tuple):
+                        out, render = out
+                # Bild gehoert ab hier dem Encoder, keine weitere Kopie noetig
+                self.encoder.submit(mode, out, copy=False, render=render)
+            self.metrics.frame_done(time.perf_counter() - frame_start)
+
+            # FPS berechnen
+            frame_counter += 1
+            elapsed = time.time() - start_time
+            if elapsed >= 1.0:
+                self.fps = frame_counter / elapsed
+                frame_counter = 0
+                start_time = time.time()
+
+    def submit(self, mode, frame, copy=True, render=None):
+        """Bild eines externen Tracking-Loops zur Vorschau anbieten (blockiert nie)."""
+        return self.encoder.submit(mode, frame, copy, render)
+
+    def publish(self, mode, frame_bytes):
+        with self.cond:
+            seq = self.latest[mode][0] + 1
+            self.latest[mode] = (seq, frame_bytes)
+            self.cond.notify_all()
+        for listener in self.listeners:
+            listener(mode, seq, frame_bytes)
+
+    def add_listener(self, listener):
+        """
+        listener(mode, seq, frame_bytes) fuer jedes fertige JPEG aufrufen.
+
+        Laeuft im Encoder-Thread und darf nicht blockieren.
+        """
+        self.listeners.append(listener)
+
+    def subscribe(self, mode):
+        """Client fuer mode anmelden; gibt den tatsaechlich verwendeten Modus zurueck."""
+        if mode not in self.modes:
+            mode = self.modes[0]
+        with self.cond:
+            self.subscribers[mode] += 1
+            self.cond.notify_all()
+        return mode
+
+    def unsubscribe(self, mode):
+        with self.cond:
+            self.subscribers[mode] -= 1
+
+    def stream(self, mode=None):
+        """Generator fuer eine Flask-Response (multipart/x-mixed-replace)."""
+        mode = self.subscribe(mode)
+        try:
+            last_seq = 0
+            while self.running:
+                with self.cond:
+                    if not self.cond.wait_for(
+                            lambda: self.latest[mode][0] > last_seq or not self.running, 1.0):
+                        continue
+                    last_seq, frame_bytes = self.latest[mode]
+                if frame_bytes is None:
+                    continue
+                # Flask setzt den Generator erst fort, wenn das Bild geschrieben ist
+                send_start = time.perf_counter()
+                yield (b'--frame\r\n'
+                       b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
+                self.send_stage.observe(time.perf_counter() - send_start)
+        finally:
+            self.unsubscribe(mode)
+
+    def has_clients(self, mode):
+        return self.subscribers.get(mode, 0) > 0
+
+    def client_count(self):
+        with self.cond:
+            return sum(self.subscribers.values())
@@ -0,0 +1,378 @@
+"""
+Telemetrie per WebSocket: Positionen, Radius, FPS und Stufenzeiten als Binaerpakete
+
+Statt jede Sekunde /fps abzufragen und den Ball in jedes JPEG zu zeichnen,
+schiebt der Server die Detektionen gesammelt an den Browser; die Seite
+zeichnet Kreis und Spur selbst in ein Canvas ueber dem Stream. Jeder Client
+waehlt seine Rate (?hz=60 oder Nachricht {"hz": 120}), ein Paket enthaelt
+alle Detektionen seit dem letzten Paket.
+
+Paketformat (little endian):
+    Kopf      '<2sBBHHff'  magic b"BT", version, 0, count, n_stages, fps, sensor_fps
+    Stufen    n_stages x float32, Mittelwert in ms (Namen in der hello-Nachricht)
+    Samples   count x SAMPLE_DTYPE (36 Byte)
+
+Die erste Nachricht ist Text (JSON, type "hello") mit Bildgroesse, Stufen-
+und Modusnamen. Nur mit STREAM_SERVER=asyncio verfuegbar; unter Flask
+faellt die Seite auf das Polling von /fps zurueck.
+
+Der MJPEG-Stream enthaelt den Ball weiterhin fuer alle anderen Zuschauer;
+nur wer ihn selbst zeichnet, holt den Stream mit ?overlay=client ohne
+Ball-Overlay (eigener Hub-Modus, z.B. "hough:client").
+"""
+import asyncio
+import collections
+import json
+import struct
+import time
+import numpy as np
+
+MAGIC = b"BT"
+VERSION = 1
+HEADER = struct.Struct("<2sBBHHff")
+
+SAMPLE_DTYPE = np.dtype([
+    ("timestamp_ns", "<i8"),   # SensorTimestamp des Bildes
+    ("seq", "<u4"),
+    ("x", "<f4"),              # Bildkoordinaten im Crop
+    ("y", "<f4"),
+    ("radius", "<f4"),
+    ("crop_x", "<u2"),         # Crop-Fenster auf dem Sensor
+    ("crop_y", "<u2"),
+    ("crop_w", "<u2"),
+    ("crop_h", "<u2"),
+    ("found", "u1"),
+    ("mode", "u1"),            # Index in modes der hello-Nachricht
+    ("pad", "<u2"),
+])
+
+MIN_RATE = 1.0
+MAX_RATE = 500.0
+DEFAULT_RATE = 30.0
+
+# Hub-Modus ohne Ball im JPEG, fuer Seiten, die per Telemetrie selbst zeichnen
+CLIENT_OVERLAY = ":client"
+
+
+def with_client_overlay(modes):
+    """Hub-Modi: jeder Modus zusaetzlich als Variante ohne Ball-Overlay."""
+    modes = tuple(modes)
+    return modes + tuple(mode + CLIENT_OVERLAY for mode in modes)
+
+
+def stream_mode(args, default):
+    """
+    Hub-Modus fuer /video_feed?mode=...&overlay=client.
+
+    Args:
+        args (dict): Query-Parameter (request.args oder query des AsyncStreamServer)
+        default (str): Modus ohne mode-Parameter
+    """
+    mode = args.get("mode") or default
+    if args.get("overlay") == "client":
+        mode += CLIENT_OVERLAY
+    return mode
+
+
+def split_mode(mode):
+    """ "hough:client" -> ("hough", False), "hough" -> ("hough", True): Ball ins JPEG zeichnen?"""
+    if mode.endswith(CLIENT_OVERLAY):
+        return mode[:-len(CLIENT_OVERLAY)], False
+    return mode, True
+
+
+class Telemetry:
+    """
+    Sammelt Detektionen und verteilt sie an WebSocket-Clients.
+
+    add() laeuft im Capture- oder Tracking-Thread und haengt nur ein Tupel
+    an eine deque; gepackt wird erst im Event-Loop, einmal pro Paket.
+
+    Args:
+        width (int): Bildbreite des Streams
+        height (int): Bildhoehe des Streams
+        modes (tuple): Namen der Overlays (Modus der Samples)
+        fps (callable, optional): Liefert die Pipeline-FPS
+        sensor_fps (callable, optional): Liefert die Sensor-FPS
+        metrics (Metrics, optional): Quelle der Stufenzeiten
+        history (int): So viele Samples werden vorgehalten
+        trail (int): Laenge der Spur im Browser (Samples)
+        flip (bool): Bild ist gegenueber dem Sensor um 180 Grad gedreht
+    """
+
+    def __init__(self, width, height, modes=("none",), fps=None, sensor_fps=None, metrics=None,
+                 history=2048, trail=120, flip=False):
+        self.width = width
+        self.height = height
+        self.modes = tuple(modes)
+        self.mode_index = {mode: i for i, mode in enumerate(self.modes)}
+        self.fps = fps or (lambda: 0.0)
+        self.sensor_fps = sensor_fps or (lambda: 0.0)
+        self.metrics = metrics
+        self.trail = trail
+        self.flip = flip
+        self.history = collections.deque(maxlen=history)
+        self.seq = 0
+        # Stufenzeiten: Namen beim ersten Client festgelegt, Werte hoechstens alle 0.25 s neu
+        self.stages = None
+        self._stage_values = b""
+        self._stage_time = 0.0
+
+        # Statistik
+        self.clients = 0
+        self.connections = 0
+        self.messages_sent = 0
+        self.bytes_sent = 0
+        self.samples_sent = 0
+        self.samples_missed = 0
+
+    # --- Erfassung (Capture-Thread) ---
+    def add(self, x, y, radius, found, timestamp_ns=None, crop=None, mode=None):
+        """
+        Detektion eines Bildes ablegen.
+
+        Args:
+            x, y, radius (float): Ball in Bildkoordinaten (ohne Treffer beliebig)
+            found (bool): Ball gefunden
+            timestamp_ns (int, optional): SensorTimestamp, sonst monotonic_ns()
+            crop (tuple, optional): (x, y, w, h) des Bildes auf dem Sensor
+            mode (str, optional): Overlay, zu dem die Detektion gehoert
+        """
+        self.seq += 1
+        if timestamp_ns is None:
+            timestamp_ns = time.monotonic_ns()
+        crop_x, crop_y, crop_w, crop_h = crop or (0, 0, self.width, self.height)
+        if not found:
+            x = y = radius = 0.0
+        self.history.append((timestamp_ns, self.seq, x, y, radius,
+                             crop_x, crop_y, crop_w, crop_h,
+                             bool(found), self.mode_index.get(mode, 0), 0))
+
+    # --- Pakete ---
+    def hello(self, rate):
+        if self.stages is None:
+            summary = self.metrics.summary() if self.metrics is not None else {}
+            self.stages = [name for name in summary if name != "overhead_ratio"]
+        return json.dumps({
+            "type": "hello", "version": VERSION, "width": self.width, "height": self.height,
+            "modes": list(self.modes), "stages": self.stages, "flip": self.flip,
+            "record_size": SAMPLE_DTYPE.itemsize, "trail": self.trail, "hz": rate,
+        })
+
+    def _stage_means(self):
+        now = time.monotonic()
+        if self.metrics is not None and now - self._stage_time >= 0.25:
+            summary = self.metrics.summary()
+            self._stage_values = np.array(
+                [summary.get(name, {}).get("mean_ms", 0.0) for name in self.stages],
+                dtype="<f4").tobytes()
+            self._stage_time = now
+        return self._stage_values
+
+    def batch(self, after):
+        """
+        Paket mit allen Samples nach seq after.
+
+        Returns:
+            tuple: (letzte seq im Paket, bytes)
+        """
+        samples = [sample for sample in tuple(self.history) if sample[1] > after]
+        if samples:
+            # Aeltere Samples sind aus der deque gefallen (langsamer Client)
+            self.samples_missed += samples[0][1] - after - 1 if after else 0
+            after = samples[-1][1]
+        stages = self._stage_means()
+        data = np.array(samples, dtype=SAMPLE_DTYPE).tobytes()
+        header = HEADER.pack(MAGIC, VERSION, 0, len(samples), len(stages) // 4,
+                             self.fps(), self.sensor_fps())
+        self.samples_sent += len(samples)
+        return after, header + stages + data
+
+    @staticmethod
+    def _rate(value, default=DEFAULT_RATE):
+        try:
+            rate = float(value)
+        except (TypeError, ValueError):
+            return default
+        return min(MAX_RATE, max(MIN_RATE, rate))
+
+    # --- WebSocket-Endpunkt ---
+    async def websocket(self, websocket, query):
+        """Handler fuer AsyncStreamServer(websockets={"/telemetry": telemetry.websocket})."""
+        state = {"rate": self._rate(query.get("hz"))}
+        await websocket.send(self.hello(state["rate"]))
+
+        async def receive():
+            # Client kann die Rate jederzeit aendern: {"hz": 120}
+            while True:
+                message = await websocket.receive()
+                if message is None:
+                    return
+                try:
+                    state["rate"] = self._rate(json.loads(message).get("hz"), state["rate"])
+                except (ValueError, AttributeError):
+                    pass
+
+        loop = asyncio.get_running_loop()
+        receiver = asyncio.ensure_future(receive())
+        self.clients += 1
+        self.connections += 1
+        # Mit der Spur beginnen, damit der Browser sofort etwas zeichnet
+        last_seq = max(0, self.seq - self.trail)
+        deadline = loop.time()
+        try:
+            while not receiver.done():
+                # Feste Taktung ohne Drift; nach einem Haenger nicht nachholen
+                deadline = max(deadline + 1.0 / state["rate"], loop.time())
+                await asyncio.wait([receiver], timeout=deadline - loop.time())
+                if receiver.done():
+                    break
+                last_seq, message = self.batch(last_seq)
+                await websocket.send(message)
+                self.messages_sent += 1
+                self.bytes_sent += len(message)
+        except ConnectionError:
+            pass
+        finally:
+            self.clients -= 1
+            receiver.cancel()
+
+    def get_stats(self):
+        return {
+            "clients": self.clients,
+            "connections": self.connections,
+            "messages_sent": self.messages_sent,
+            "bytes_sent": self.bytes_sent,
+            "samples_sent": self.samples_sent,
+            "samples_missed": self.samples_missed,
+            "seq": self.seq,
+        }
+
+
+# Browser-Seite: WebSocket lesen, Kreis und Spur ins Canvas ueber dem Stream
+# zeichnen. startTelemetry({canvas, fps, hz, mode, fallback, connected});
+# fallback wird aufgerufen, wenn der Server keinen WebSocket anbietet (Flask),
+# connected(true/false), sobald die Seite den Ball selbst zeichnet bzw. nicht
+# mehr (dann den Stream mit bzw. ohne ?overlay=client neu laden).
+TELEMETRY_JS = '''
+function startTelemetry(options) {
+    const canvas = document.getElementById(options.canvas);
+    const ctx = canvas.getContext('2d');
+    const url = (location.protocol === 'https:' ? 'wss://' : 'ws://') + location.host +
+        '/telemetry?hz=' + (options.hz || 30);
+    let info = null;
+    let trail = [];
+    let opened = false;
+    let ws;
+    try {
+        ws = new WebSocket(url);
+    } catch (e) {
+        options.fallback();
+        return;
+    }
+    ws.binaryType = 'arraybuffer';
+    ws.onopen = () => { opened = true; };
+    ws.onclose = () => {
+        ctx.clearRect(0, 0, canvas.width, canvas.height);
+        if (!opened) {
+            options.fallback();
+        } else {
+            if (info && options.connected) {
+                options.connected(false);
+            }
+            setTimeout(() => startTelemetry(options), 2000);
+        }
+    };
+    ws.onmessage = (event) => {
+        if (typeof event.data === 'string') {
+            const first = info === null;
+            info = JSON.parse(event.data);
+            canvas.width = info.width;
+            canvas.height = info.height;
+            if (first && options.connected) {
+                options.connected(true);
+            }
+            return;
+        }
+        const view = new DataView(event.data);
+        const count = view.getUint16(4, true);
+        const stageCount = view.getUint16(6, true);
+        const stages = [];
+        for (let i = 0; i < stageCount; i++) {
+            stages.push(info.stages[i] + ' ' + view.getFloat32(16 + 4 * i, true).toFixed(2));
+        }
+        let offset = 16 + 4 * stageCount;
+        for (let i = 0; i < count; i++, offset += info.record_size) {
+            trail.push({
+                x: view.getFloat32(offset + 12, true),
+                y: view.getFloat32(offset + 16, true),
+                r: view.getFloat32(offset + 20, true),
+                cropX: view.getUint16(offset + 24, true),
+                cropY: view.getUint16(offset + 26, true),
+                cropW: view.getUint16(offset + 28, true),
+                cropH: view.getUint16(offset + 30, true),
+                found: view.getUint8(offset + 32) === 1,
+                mode: info.modes[view.getUint8(offset + 33)],
+            });
+        }
+        if (trail.length > 4 * info.trail) {
+            trail = trail.slice(-info.trail);
+        }
+        document.getElementById(options.fps).innerText =
+            'FPS: ' + view.getFloat32(8, true).toFixed(1) +
+            ' | Sensor: ' + view.getFloat32(12, true).toFixed(1) + ' | ms: ' + stages.join(', ');
+        draw();
+    };
+
+    function draw() {
+        const mode = options.mode();
+        const points = trail.filter(p => p.mode === mode).slice(-info.trail);
+        ctx.clearRect(0, 0, canvas.width, canvas.height);
+        const last = points[points.length - 1];
+        if (!last) {
+            return;
+        }
+        if (canvas.width !== last.cropW || canvas.height !== last.cropH) {
+            // Crop-Groesse hat sich geaendert (dynamischer Tracker)
+            canvas.width = last.cropW;
+            canvas.height = last.cropH;
+        }
+        // Aeltere Punkte ueber Sensorkoordinaten ins aktuelle Crop umrechnen
+        const toFrame = (p) => {
+            if (info.flip) {
+                const sx = p.cropX + p.cropW - 1 - p.x, sy = p.cropY + p.cropH - 1 - p.y;
+                return [last.cropX + last.cropW - 1 - sx, last.cropY + last.cropH - 1 - sy];
+            }
+            return [p.cropX + p.x - last.cropX, p.cropY + p.y - last.cropY];
+        };
+        ctx.strokeStyle = 'rgba(255, 165, 0, 0.8)';
+        ctx.lineWidth = 2;
+        ctx.beginPath();
+        let drawing = false;
+        for (const p of points) {
+            if (!p.found) {
+                drawing = false;
+                continue;
+            }
+            const [x, y] = toFrame(p);
+            if (drawing) {
+                ctx.lineTo(x, y);
+            } else {
+                ctx.moveTo(x, y);
+                drawing = true;
+            }
+        }
+        ctx.stroke();
+        if (last.found) {
+            ctx.strokeStyle = 'rgb(0, 255, 0)';
+            ctx.beginPath();
+            ctx.arc(last.x, last.y, last.r, 0, 2 * Math.PI);
+            ctx.stroke();
+            ctx.fillStyle = 'rgb(255, 0, 0)';
+            ctx.beginPath();
+            ctx.arc(last.x, last.y, 3, 0, 2 * Math.PI);
+            ctx.fill();
+        }
+    }
+}
+'''
@@ -0,0 +1,307 @@
+import asyncio
+import socket
+
+import pytest
+
+from asyncserver import (_MAX_BODY, _WEBSOCKET_MAX_MESSAGE, WS_CLOSE_INVALID_DATA,
+                         WS_CLOSE_PROTOCOL_ERROR, WS_CLOSE_TOO_BIG, AsyncStreamServer, WebSocket)
+
+
+def echo_app(environ, start_response):
+    body = environ["wsgi.input"].read()
+    text = f"{environ['REQUEST_METHOD']} {environ['PATH_INFO']}?{environ['QUERY_STRING']} " \
+           f"{environ.get('HTTP_X_TEST', '-')} {environ.get('CONTENT_LENGTH', '-')} "
+    start_response("200 OK", [("Content-Type", "text/plain"), ("Connection", "keep-alive")])
+    return [text.encode() + body]
+
+
+class Closing:
+    """WSGI-Ergebnis, das nach dem ersten Teil oder sofort fehlschlaegt."""
+
+    def __init__(self, start_response, fail_first):
+        self.start_response = start_response
+        self.fail_first = fail_first
+        self.closed = False
+
+    def __iter__(self):
+        self.start_response("200 OK", [("Content-Type", "text/plain")])
+        if self.fail_first:
+            raise RuntimeError("broken route")
+        yield b"first"
+        raise RuntimeError("broken stream")
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def serve():
+    servers = []
+
+    def start(app):
+        server = AsyncStreamServer(None, app)
+        server.start("127.0.0.1", 0)
+        servers.append(server)
+        return server.server.sockets[0].getsockname()[1]
+
+    yield start
+    for server in servers:
+        server.stop()
+
+
+def request(port, data):
+    with socket.create_connection(("127.0.0.1", port), timeout=5) as sock:
+        sock.sendall(data)
+        chunks = []
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    head, _, body = b"".join(chunks).partition(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    headers = dict(line.split(": ", 1) for line in lines[1:])
+    return int(lines[0].split(" ")[1]), headers, body
+
+
+def test_get_passes_path_query_and_headers(serve):
+    port = serve(echo_app)
+    status, headers, body = request(port, b"GET /fps?mode=color&x=%20 HTTP/1.1\r\n"
+                                          b"Host: pi:5000\r\nX-Test: yes\r\n\r\n")
+    assert status == 200
+    assert headers["Connection"] == "close"
+    assert body == b"GET /fps?mode=color&x=%20 yes - "
+
+
+def test_post_body_is_passed_to_the_app(serve):
+    port = serve(echo_app)
+    status, _, body = request(port, b"POST /color_thresholds HTTP/1.1\r\n"
+                                    b"Content-Length: 5\r\n\r\nhello")
+    assert status == 200
+    assert body == b"POST /color_thresholds? - 5 hello"
+
+
+def test_head_sends_no_body(serve):
+    port = serve(echo_app)
+    status, _, body = request(port, b"HEAD / HTTP/1.1\r\n\r\n")
+    assert status == 200
+    assert body == b""
+
+
+def test_malformed_request_line_is_rejected(serve):
+    port = serve(echo_app)
+    status, _, _ = request(port, b"NONSENSE\r\n\r\n")
+    assert status == 400
+
+
+@pytest.mark.parametrize("length", [b"abc", b"-1"])
+def test_bad_content_length_is_rejected(serve, length):
+    port = serve(echo_app)
+    status, _, _ = request(port, b"POST / HTTP/1.1\r\nContent-Length: " + length + b"\r\n\r\n")
+    assert status == 400
+
+
+def test_large_body_is_rejected_before_reading(serve):
+    port = serve(echo_app)
+    status, _, body = request(port, b"POST / HTTP/1.1\r\nContent-Length: %d\r\n\r\n"
+                              % (_MAX_BODY + 1))
+    assert status == 413
+    assert body == b"request body too large"
+
+
+def test_error_before_first_chunk_answers_500_and_closes(serve):
+    results = []
+
+    def app(environ, start_response):
+        results.append(Closing(start_response, fail_first=True))
+        return results[-1]
+
+    port = serve(app)
+    status, _, _ = request(port, b"GET / HTTP/1.1\r\n\r\n")
+    assert status == 500
+    assert results[0].closed
+
+
+def test_error_while_streaming_ends_response_and_closes(serve):
+    results = []
+
+    def app(environ, start_response):
+        results.append(Closing(start_response, fail_first=False))
+        return results[-1]
+
+    port = serve(app)
+    status, _, body = request(port, b"GET / HTTP/1.1\r\n\r\n")
+    assert status == 200
+    assert body == b"first"
+    assert results[0].closed
+
+
+def test_without_app_answers_404(serve):
+    port = serve(None)
+    status, _, _ = request(port, b"GET /anything HTTP/1.1\r\n\r\n")
+    assert status == 404
+
+
+# --- WebSocket ---
+class FakeWriter:
+    def __init__(self):
+        self.data = bytearray()
+
+    def write(self, data):
+        self.data += data
+
+    async def drain(self):
+        pass
+
+
+def client_frame(opcode, payload, fin=True, mask=b"\x12\x34\x56\x78", length_bytes=None, rsv=0):
+    """Frame wie ein Browser: maskiert, Laenge in 7, 16 oder 64 Bit."""
+    length = len(payload)
+    if length_bytes is None:
+        length_bytes = 0 if length < 126 else 2 if length < 65536 else 8
+    first = bytes(((0x80 if fin else 0) | rsv | opcode,))
+    masked = 0x80 if mask is not None else 0
+    if length_bytes == 0:
+        header = first + bytes((masked | length,))
+    else:
+        header = first + bytes((masked | (126 if length_bytes == 2 else 127),))
+        header += length.to_bytes(length_bytes, "big")
+    if mask is None:
+        return header + payload
+    return header + mask + bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+
+
+def server_frames(data):
+    """Unmaskierte Frames des Servers -> [(fin, opcode, payload)]."""
+    frames = []
+    i = 0
+    while i < len(data):
+        b1, b2 = data[i], data[i + 1]
+        length = b2 & 0x7F
+        i += 2
+        if length == 126:
+            length = int.from_bytes(data[i:i + 2], "big")
+            i += 2
+        elif length == 127:
+            length = int.from_bytes(data[i:i + 8], "big")
+            i += 8
+        assert not b2 & 0x80
+        frames.append((bool(b1 & 0x80), b1 & 0x0F, bytes(data[i:i + length])))
+        i += length
+    return frames
+
+
+def exchange(*frames, receives=1):
+    """frames an einen WebSocket fuettern, receives Mal receive() aufrufen."""
+    async def run():
+        reader = asyncio.StreamReader()
+        for frame in frames:
+            reader.feed_data(frame)
+        reader.feed_eof()
+        writer = FakeWriter()
+        websocket = WebSocket(reader, writer)
+        results = [await websocket.receive() for _ in range(receives)]
+        return results, server_frames(writer.data), websocket
+
+    return asyncio.run(run())
+
+
+def close_code(frame):
+    fin, opcode, payload = frame
+    assert fin and opcode == 0x8
+    return int.from_bytes(payload, "big") if payload else None
+
+
+def test_masked_text_and_binary_messages():
+    results, sent, websocket = exchange(client_frame(0x1, '{"hz": 120}'.encode()),
+                                        client_frame(0x2, b"\x00\x01\xff"), receives=2)
+    assert results == ['{"hz": 120}', b"\x00\x01\xff"]
+    assert sent == []
+    assert not websocket.closed
+
+
+@pytest.mark.parametrize("size,length_bytes", [(300, 2), (10, 8), (_WEBSOCKET_MAX_MESSAGE, 8)])
+def test_extended_payload_lengths(size, length_bytes):
+    payload = bytes(range(256)) * (size // 256) + bytes(size % 256)
+    results, _, _ = exchange(client_frame(0x2, payload, length_bytes=length_bytes))
+    assert results == [payload]
+
+
+@pytest.mark.parametrize("size", [100, 300, 70000])
+def test_send_uses_shortest_length_encoding(size):
+    async def run():
+        writer = FakeWriter()
+        await WebSocket(None, writer).send(bytes(size))
+        return bytes(writer.data)
+
+    data = asyncio.run(run())
+    expected = 2 + (0 if size < 126 else 2 if size < 65536 else 8)
+    assert len(data) == expected + size
+    assert server_frames(data) == [(True, 0x2, bytes(size))]
+
+
+def test_ping_gets_pong_with_same_payload():
+    results, sent, _ = exchange(client_frame(0x9, b"alive?"), client_frame(0xA, b"ignored"),
+                                client_frame(0x1, b"next"))
+    assert results == ["next"]
+    assert sent == [(True, 0xA, b"alive?")]
+
+
+def test_close_is_acknowledged_with_client_code():
+    results, sent, websocket = exchange(client_frame(0x8, (1001).to_bytes(2, "big") + b"bye"),
+                                        client_frame(0x1, b"too late"), receives=2)
+    assert results == [None, None]
+    assert [close_code(frame) for frame in sent] == [1001]
+    assert websocket.closed
+
+
+def test_fragmented_message_with_interleaved_ping():
+    results, sent, _ = exchange(client_frame(0x1, b"hel", fin=False),
+                                client_frame(0x9, b"p"),
+                                client_frame(0x0, b"l", fin=False),
+                                client_frame(0x0, b"o"))
+    assert results == ["hello"]
+    assert sent == [(True, 0xA, b"p")]
+
+
+@pytest.mark.parametrize("frames", [
+    [client_frame(0x1, b"plain", mask=None)],
+    [client_frame(0x3, b"reserved opcode")],
+    [client_frame(0x1, b"rsv", rsv=0x40)],
+    [client_frame(0x0, b"continuation without start")],
+    [client_frame(0x1, b"a", fin=False), client_frame(0x1, b"b")],
+    [client_frame(0x9, b"fragmented ping", fin=False)],
+    [client_frame(0x9, bytes(126))],
+])
+def test_protocol_errors_close_with_1002(frames):
+    results, sent, websocket = exchange(*frames)
+    assert results == [None]
+    assert [close_code(frame) for frame in sent] == [WS_CLOSE_PROTOCOL_ERROR]
+    assert websocket.closed
+
+
+def test_oversized_message_closes_with_1009_without_reading_it():
+    header = client_frame(0x2, b"", length_bytes=8)[:2] + (1 << 40).to_bytes(8, "big")
+    results, sent, _ = exchange(header)
+    assert results == [None]
+    assert [close_code(frame) for frame in sent] == [WS_CLOSE_TOO_BIG]
+
+
+def test_oversized_fragmented_message_closes_with_1009():
+    half = bytes(_WEBSOCKET_MAX_MESSAGE // 2 + 1)
+    results, sent, _ = exchange(client_frame(0x2, half, fin=False), client_frame(0x0, half))
+    assert results == [None]
+    assert [close_code(frame) for frame in sent] == [WS_CLOSE_TOO_BIG]
+
+
+def test_invalid_utf8_closes_with_1007():
+    results, sent, _ = exchange(client_frame(0x1, b"\xff\xfe"))
+    assert results == [None]
+    assert [close_code(frame) for frame in sent] == [WS_CLOSE_INVALID_DATA]
+
+
+def test_end_of_stream_sends_close():
+    results, sent, websocket = exchange(client_frame(0x1, b"par", fin=False))
+    assert results == [None]
+    assert [close_code(frame) for frame in sent] == [None]
+    assert websocket.closed
@@ -0,0 +1,131 @@
+import cv2
+import numpy as np
+import pytest
+
+from colorlut import ColorClassifier, LOWER_ORANGE, UPPER_ORANGE, QUANT_BITS, parse_hsv
+from framesource import SyntheticSource, bgr_to_format, format_to_bgr
+
+WIDTH, HEIGHT = 64, 48
+
+
+def reference_mask(bgr, lower=LOWER_ORANGE, upper=UPPER_ORANGE):
+    hsv = cv2.cvtColor(bgr, cv2.COLOR_BGR2HSV)
+    return cv2.inRange(hsv, np.array(lower), np.array(upper))[::2, ::2]
+
+
+def cell_centers(rng, bits, shape):
+    # Farbwerte genau auf den Zellmitten der Tabelle -> keine Quantisierungsfehler
+    shift = 8 - bits
+    return ((rng.integers(0, 1 << bits, shape) << shift) + ((1 << shift) >> 1)).astype(np.uint8)
+
+
+def blocks(plane):
+    # Jeden Wert als 2x2-Block, wie ihn die halb aufgeloeste Maske sieht
+    return np.repeat(np.repeat(plane, 2, axis=0), 2, axis=1)
+
+
+def orange_heavy(rng, bits, shape):
+    # Ein Viertel der Pixel aus dem Orange-Bereich, damit beide Klassen vorkommen
+    colors = cell_centers(rng, bits, shape + (3,))
+    hsv = np.stack([rng.integers(5, 26, shape), rng.integers(150, 256, shape),
+                    rng.integers(150, 256, shape)], axis=-1).astype(np.uint8)
+    orange = cv2.cvtColor(hsv, cv2.COLOR_HSV2BGR)
+    pick = rng.random(shape) < 0.25
+    colors[pick] = orange[pick]
+    return colors
+
+
+def test_rejects_unknown_format():
+    with pytest.raises(ValueError):
+        ColorClassifier(pixel_format="NV12")
+
+
+def test_rgb_lut_matches_inrange_xbgr8888():
+    rng = np.random.default_rng(1)
+    bits = QUANT_BITS["RGB"][0]
+    bgr = blocks(cell_centers(rng, bits, (HEIGHT // 2, WIDTH // 2, 3)))
+    frame = bgr_to_format(bgr, "XBGR8888")  # [R, G, B, 255] wie von Picamera2
+    classifier = ColorClassifier(pixel_format="RGB")
+    mask, scale, offset = classifier.mask(frame)
+    assert scale == 2 and offset == (0, 0)
+    np.testing.assert_array_equal(mask, reference_mask(bgr))
+
+
+def test_yuv420_lut_matches_inrange():
+    rng = np.random.default_rng(2)
+    y_bits, u_bits, v_bits = QUANT_BITS["YUV420"]
+    y = blocks(cell_centers(rng, y_bits, (HEIGHT // 2, WIDTH // 2)))
+    u = cell_centers(rng, u_bits, (HEIGHT // 2, WIDTH // 2))
+    v = cell_centers(rng, v_bits, (HEIGHT // 2, WIDTH // 2))
+    frame = np.concatenate([y.ravel(), u.ravel(), v.ravel()]).reshape(HEIGHT * 3 // 2, WIDTH)
+    bgr = cv2.cvtColor(frame, cv2.COLOR_YUV2BGR_I420)
+    classifier = ColorClassifier(pixel_format="YUV420")
+    mask, scale, offset = classifier.mask(frame, width=WIDTH, height=HEIGHT)
+    np.testing.assert_array_equal(mask, reference_mask(bgr))
+
+
+@pytest.mark.parametrize("pixel_format, capture_format", [("RGB", "XBGR8888"), ("YUV420", "YUV420")])
+def test_lut_agrees_with_inrange_on_real_colors(pixel_format, capture_format):
+    rng = np.random.default_rng(3)
+    bgr = blocks(orange_heavy(rng, 8, (HEIGHT // 2, WIDTH // 2)))
+    frame = bgr_to_format(bgr, capture_format)
+    classifier = ColorClassifier(pixel_format=pixel_format)
+    mask, _, _ = classifier.mask(frame, width=WIDTH, height=HEIGHT)
+    # Referenz auf dem Bild, das die Kamera tatsaechlich liefert
+    expected = reference_mask(format_to_bgr(frame, capture_format, WIDTH, HEIGHT))
+    assert expected.any()
+    # Quantisierung: nur Farben nahe der Grenze duerfen abweichen
+    assert np.mean(mask == expected) > 0.95
+
+
+def test_roi_is_aligned_and_offset():
+    bgr = np.zeros((HEIGHT, WIDTH, 3), np.uint8)
+    bgr[20:30, 30:40] = (0, 140, 255)
+    frame = bgr_to_format(bgr, "XBGR8888")
+    classifier = ColorClassifier(pixel_format="RGB")
+    full, _, _ = classifier.mask(frame)
+    part, scale, offset = classifier.mask(frame, roi=(11, 9, 51, 41))
+    assert offset == (10, 8)
+    np.testing.assert_array_equal(part, full[4:21, 5:26])
+
+
+def test_synthetic_ball_is_found():
+    source = SyntheticSource(realtime=False, noise=0)
+    source.configure(source.create_video_configuration(main={"size": (320, 240)}))
+    sensor_x, sensor_y = source.ball_position(0.0)
+    source.set_crop(320, 240, sensor_x - 160, sensor_y - 120)
+    source.start()
+    frame = source.capture_array()
+    bx, by, r = source.last_truth
+    mask, scale, offset = ColorClassifier(pixel_format="RGB").mask(frame)
+    assert mask[int(by) // scale, int(bx) // scale] == 255
+    assert mask[0, 0] == 0
+
+
+def test_set_thresholds_rebuilds_table():
+    rng = np.random.default_rng(4)
+    bgr = blocks(orange_heavy(rng, 8, (HEIGHT // 2, WIDTH // 2)))
+    frame = bgr_to_format(bgr, "XBGR8888")
+    classifier = ColorClassifier(pixel_format="RGB")
+    assert classifier.rebuilds == 1
+    table = classifier.lut
+
+    classifier.set_thresholds(LOWER_ORANGE, UPPER_ORANGE)
+    assert classifier.rebuilds == 1
+    assert classifier.lut is table
+
+    lower, upper = (90, 50, 50), (130, 255, 255)
+    classifier.set_thresholds(lower, upper)
+    assert classifier.rebuilds == 2
+    assert classifier.lut is not table
+    assert classifier.get_thresholds() == (lower, upper)
+    mask, _, _ = classifier.mask(frame)
+    expected = reference_mask(format_to_bgr(frame, "XBGR8888"), lower, upper)
+    assert np.mean(mask == expected) > 0.95
+    assert not np.array_equal(mask, reference_mask(bgr))
+
+
+def test_parse_hsv():
+    assert parse_hsv("5,150,150") == (5, 150, 150)
+    with pytest.raises(ValueError):
+        parse_hsv("1,2")
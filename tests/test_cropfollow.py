@@ -0,0 +1,56 @@
+import pytest
+
+from cropfollow import CropFollower, centered_offset, frame_to_sensor
+from framesource import SyntheticSource
+from GSCrop import SENSOR_WIDTH, SENSOR_HEIGHT
+
+
+def test_deadband_keeps_crop():
+    follower = CropFollower(320, 240, edge_margin=0.25, min_step=16)
+    # Innerhalb von [80, 240] x [60, 180] relativ zum Crop
+    for rel_x, rel_y in [(160, 120), (81, 61), (239, 179)]:
+        assert follower.update(400, 300, 400 + rel_x, 300 + rel_y) is None
+
+
+def test_edge_recenters_crop():
+    follower = CropFollower(320, 240, edge_margin=0.25, min_step=16)
+    assert follower.needs_move(400, 300, 400 + 300, 300 + 120)
+    new = follower.update(400, 300, 400 + 300, 300 + 120)
+    assert new == centered_offset(700, 420, 320, 240)
+    assert new[0] > 400
+
+
+def test_margin_is_relative_to_crop_size():
+    narrow = CropFollower(320, 240, edge_margin=0.1)
+    wide = CropFollower(320, 240, edge_margin=0.4)
+    assert not narrow.needs_move(0, 0, 50, 120)
+    assert wide.needs_move(0, 0, 50, 120)
+
+
+def test_small_step_at_sensor_edge_is_ignored():
+    follower = CropFollower(320, 240, edge_margin=0.25, min_step=16)
+    x_offset, y_offset = SENSOR_WIDTH - 320, SENSOR_HEIGHT - 240
+    # Ball am rechten unteren Rand: Crop kann nicht weiter
+    assert follower.needs_move(x_offset, y_offset, SENSOR_WIDTH - 5, SENSOR_HEIGHT - 5)
+    assert follower.update(x_offset, y_offset, SENSOR_WIDTH - 5, SENSOR_HEIGHT - 5) is None
+
+
+def test_frame_to_sensor_corners():
+    assert frame_to_sensor(0, 0, 100, 50, 320, 240) == (100 + 319, 50 + 239)
+    assert frame_to_sensor(319, 239, 100, 50, 320, 240) == (100, 50)
+
+
+@pytest.mark.parametrize("index", [0, 7, 25])
+def test_frame_to_sensor_matches_rotated_source(index):
+    source = SyntheticSource(realtime=False, noise=0, blur=False, rotate180=True)
+    source.configure(source.create_video_configuration(main={"size": (320, 240)}))
+    bx, by = source.ball_position(source.frame_time(index))
+    x_offset, y_offset = centered_offset(bx, by, 320, 240)
+    source.set_crop(320, 240, x_offset, y_offset)
+    source.start()
+    while source.frame_index < index:
+        source.capture_array()
+    fx, fy, _ = source.last_truth
+    sx, sy = frame_to_sensor(fx, fy, x_offset, y_offset, 320, 240)
+    assert sx == pytest.approx(bx)
+    assert sy == pytest.approx(by)
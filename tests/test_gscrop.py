@@ -0,0 +1,85 @@
+import struct
+
+import pytest
+
+import GSCrop
+from GSCrop import (CROP_ALIGN, SENSOR_HEIGHT, SENSOR_WIDTH, SUBDEV_FORMAT, SUBDEV_SELECTION,
+                    V4L2_FIELD_NONE, V4L2_SEL_TGT_CROP, V4L2_SUBDEV_FORMAT_ACTIVE,
+                    CropController, format_buffer, selection_buffer)
+
+
+def test_struct_sizes_match_kernel_abi():
+    assert SUBDEV_FORMAT.size == 88
+    assert SUBDEV_SELECTION.size == 64
+
+
+def test_get_format_buffer_round_trip():
+    buf = format_buffer()
+    assert isinstance(buf, bytearray)
+    assert len(buf) == 88
+    fields = SUBDEV_FORMAT.unpack(buf)
+    assert fields[:2] == (V4L2_SUBDEV_FORMAT_ACTIVE, 0)
+    assert not any(fields[2:])
+
+
+def test_set_format_buffer_round_trip():
+    buf = format_buffer(728, 544, 0x3010, V4L2_FIELD_NONE)
+    assert len(buf) == 88
+    which, pad, width, height, code, field, *rest = SUBDEV_FORMAT.unpack(buf)
+    assert (which, pad, width, height, code, field) == (V4L2_SUBDEV_FORMAT_ACTIVE, 0, 728, 544,
+                                                        0x3010, V4L2_FIELD_NONE)
+    assert not any(rest)
+
+
+def test_selection_buffer_round_trip():
+    buf = selection_buffer(356, 272, 728, 544)
+    assert len(buf) == 64
+    which, pad, target, flags, x, y, width, height, *reserved = SUBDEV_SELECTION.unpack(buf)
+    assert (which, pad, target, flags) == (V4L2_SUBDEV_FORMAT_ACTIVE, 0, V4L2_SEL_TGT_CROP, 0)
+    assert (x, y, width, height) == (356, 272, 728, 544)
+    assert not any(reserved)
+
+
+def test_subdev_backend_reads_active_format(monkeypatch, tmp_path):
+    calls = []
+
+    def fake_ioctl(fd, request, buf):
+        calls.append((request, len(buf)))
+        if request == GSCrop.VIDIOC_SUBDEV_G_FMT:
+            struct.pack_into("<III", buf, 8, 1440, 1088, 0x3010)
+        return 0
+
+    monkeypatch.setattr(GSCrop.fcntl, "ioctl", fake_ioctl)
+    node = tmp_path / "v4l-subdev0"
+    node.write_bytes(b"")
+    backend = GSCrop.V4L2SubdevBackend(str(node))
+    try:
+        assert backend.code == 0x3010
+        assert backend.apply(728, 544, 356, 272)
+    finally:
+        backend.close()
+    assert calls == [(GSCrop.VIDIOC_SUBDEV_G_FMT, 88), (GSCrop.VIDIOC_SUBDEV_S_SELECTION, 64),
+                     (GSCrop.VIDIOC_SUBDEV_S_FMT, 88)]
+
+
+@pytest.mark.parametrize("width,height,x,y", [
+    (1438, 1086, 10, 10),
+    (728, 544, 10_000, 10_000),
+    (726, 542, SENSOR_WIDTH, SENSOR_HEIGHT),
+    (1440, 1088, 3, 3),
+    (100, 100, -20, -20),
+])
+def test_snap_stays_aligned_and_on_sensor(width, height, x, y):
+    width, height, x, y = CropController.snap(width, height, x, y)
+    assert x % CROP_ALIGN == 0 and y % CROP_ALIGN == 0
+    assert 0 <= x and x + width <= SENSOR_WIDTH
+    assert 0 <= y and y + height <= SENSOR_HEIGHT
+
+
+def test_snap_centers_by_default():
+    assert CropController.snap(728, 544) == (728, 544, 356, 272)
+
+
+def test_snap_rejects_odd_sizes():
+    with pytest.raises(ValueError):
+        CropController.snap(727, 544)
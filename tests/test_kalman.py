@@ -0,0 +1,79 @@
+import pytest
+
+from kalman import BallKalman
+
+
+def feed(kf, track, times):
+    for t in times:
+        x, y = track(t)
+        kf.update(x, y, t)
+
+
+def test_unknown_model_is_rejected():
+    with pytest.raises(ValueError):
+        BallKalman(model="xy")
+
+
+def test_no_prediction_before_first_update():
+    kf = BallKalman()
+    assert not kf.initialized
+    assert kf.predict_position(1.0) is None
+    kf.predict(1.0)
+    assert kf.t is None
+
+
+def test_first_update_sets_position():
+    kf = BallKalman(model="cv")
+    kf.update(100.0, 50.0, 2.0)
+    assert kf.initialized
+    assert kf.updates == 1
+    assert kf.position() == (100.0, 50.0)
+    assert kf.velocity() == (0.0, 0.0)
+
+
+def test_cv_predicts_constant_velocity():
+    kf = BallKalman(model="cv", measurement_std=0.5)
+    track = lambda t: (100.0 + 600.0 * t, 200.0 - 300.0 * t)
+    feed(kf, track, [i * 0.002 for i in range(50)])
+    vx, vy = kf.velocity()
+    assert vx == pytest.approx(600.0, rel=0.02)
+    assert vy == pytest.approx(-300.0, rel=0.02)
+    t = 49 * 0.002 + 0.01
+    px, py = kf.predict_position(t)
+    assert px == pytest.approx(track(t)[0], abs=1.0)
+    assert py == pytest.approx(track(t)[1], abs=1.0)
+
+
+def test_ca_follows_acceleration():
+    kf = BallKalman(model="ca", measurement_std=0.5)
+    # Wurfparabel: konstante Beschleunigung in y
+    track = lambda t: (50.0 + 400.0 * t, 100.0 + 200.0 * t + 0.5 * 2000.0 * t * t)
+    feed(kf, track, [i * 0.002 for i in range(100)])
+    t = 99 * 0.002 + 0.01
+    px, py = kf.predict_position(t)
+    assert px == pytest.approx(track(t)[0], abs=1.0)
+    assert py == pytest.approx(track(t)[1], abs=1.0)
+
+
+def test_predict_position_does_not_change_state():
+    kf = BallKalman(model="cv")
+    feed(kf, lambda t: (10.0 * t, 0.0), [0.0, 0.1, 0.2])
+    state = kf.x.copy()
+    kf.predict_position(5.0)
+    assert (kf.x == state).all()
+    assert kf.t == 0.2
+    # Zeitpunkte vor der letzten Messung werden nicht rueckwaerts gerechnet
+    assert kf.predict_position(0.0) == pytest.approx(kf.position())
+
+
+def test_reset_forgets_track():
+    kf = BallKalman()
+    feed(kf, lambda t: (t, t), [0.0, 0.1, 0.2])
+    kf.reset()
+    assert not kf.initialized
+    assert kf.t is None
+    assert kf.updates == 0
+    assert kf.predict_position(0.3) is None
+    kf.update(5.0, 6.0, 10.0)
+    assert kf.updates == 1
+    assert kf.position() == (5.0, 6.0)
@@ -0,0 +1,161 @@
+import json
+import os
+import time
+
+import numpy as np
+import pytest
+
+from recorder import FrameRecorder, load_recording, recording_frame
+
+SHAPE = (16, 16, 3)
+FRAME_BYTES = int(np.prod(SHAPE))
+DT = 0.01
+
+
+def frame(seq):
+    return np.full(SHAPE, seq % 256, np.uint8)
+
+
+def timestamp(seq):
+    # Halbe Bilddauer versetzt, damit kein Bild genau auf einer Grenze liegt
+    return seq * DT + DT / 2
+
+
+def wait_until(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError("timed out")
+        time.sleep(0.005)
+
+
+def make_recorder(tmp_path, frames_in_ring=1000, **kwargs):
+    kwargs.setdefault("pre_seconds", 0.5)
+    kwargs.setdefault("post_seconds", 0.3)
+    return FrameRecorder(directory=str(tmp_path), buffer_mb=frames_in_ring * FRAME_BYTES / (1024 * 1024),
+                         max_frames=4096, file_chunk_mb=0.01, **kwargs)
+
+
+def check_frames(path):
+    info, meta, frames = load_recording(path)
+    for row in meta:
+        data = recording_frame(frames, row)
+        assert data.shape == SHAPE
+        # Kein zerrissenes oder ueberschriebenes Bild in der Datei
+        assert (data == row["seq"] % 256).all()
+    return info, meta
+
+
+def test_disarmed_recorder_ignores_frames(tmp_path):
+    recorder = make_recorder(tmp_path, armed=False)
+    try:
+        recorder.add(frame(1), timestamp(1))
+        assert recorder.buffer is None
+        assert recorder.seq == 0
+        assert not recorder.trigger()
+        assert recorder.get_stats()["triggers_ignored"] == 1
+        assert recorder.arm()
+        assert not recorder.arm()
+        recorder.add(frame(1), timestamp(1))
+        assert recorder.seq == 1
+    finally:
+        recorder.stop()
+
+
+def test_pre_and_post_trigger_frames_are_saved(tmp_path):
+    recorder = make_recorder(tmp_path)
+    try:
+        for seq in range(1, 101):
+            recorder.add(frame(seq), timestamp(seq), crop=(8, 4, 16, 16), found=seq % 2 == 0)
+        assert recorder.trigger("test", timestamp=1.0)
+        assert not recorder.trigger("again")
+        for seq in range(101, 201):
+            recorder.add(frame(seq), timestamp(seq))
+        wait_until(lambda: recorder.recordings == 1)
+    finally:
+        recorder.stop()
+
+    info, meta = check_frames(recorder.last_path)
+    # Vorlauf ab 0.5 s, Nachlauf bis 1.3 s
+    assert list(meta["seq"]) == list(range(50, 130))
+    assert info["frames"] == 80
+    assert info["frames_lost"] == 0
+    assert info["reason"] == "test"
+    assert info["bytes"] == 80 * FRAME_BYTES
+    assert os.path.getsize(os.path.join(recorder.last_path, "frames.raw")) == 80 * FRAME_BYTES
+    assert list(meta["pos"]) == [i * FRAME_BYTES for i in range(80)]
+    pre = meta[meta["seq"] <= 100]
+    assert (pre["crop_x"] == 8).all() and (pre["crop_width"] == 16).all()
+    assert list(pre["found"]) == [int(seq % 2 == 0) for seq in pre["seq"]]
+    assert (meta[meta["seq"] > 100]["found"] == -1).all()
+    assert recorder.get_stats()["triggers_ignored"] == 1
+
+
+def test_unsafe_reason_is_sanitized(tmp_path):
+    recorder = make_recorder(tmp_path)
+    try:
+        recorder.add(frame(1), timestamp(1))
+        recorder.trigger("../x y", timestamp=timestamp(1))
+        recorder.add(frame(100), timestamp(100))
+        wait_until(lambda: recorder.recordings == 1)
+    finally:
+        recorder.stop()
+    assert os.path.dirname(recorder.last_path) == str(tmp_path)
+    assert recorder.last_path.endswith("___x_y")
+    with open(os.path.join(recorder.last_path, "info.json")) as f:
+        assert json.load(f)["reason"] == "../x y"
+
+
+def test_overwritten_rows_are_rejected(tmp_path):
+    recorder = make_recorder(tmp_path, frames_in_ring=10)
+    try:
+        for seq in range(1, 26):
+            recorder.add(frame(seq), timestamp(seq))
+        assert recorder._row(25)["seq"] == 25
+        assert recorder._row(16) is not None
+        # Ring fasst zehn Bilder: aeltere Daten sind ueberschrieben
+        assert recorder._row(15) is None
+        assert recorder._row(1) is None
+        assert recorder._first_seq(0.0) == 16
+        stats = recorder.get_stats()
+        assert stats["buffered_frames"] == 10
+        assert stats["buffered_seconds"] == pytest.approx(9 * DT)
+    finally:
+        recorder.stop()
+
+
+def test_frames_overwritten_during_recording_are_lost(tmp_path):
+    recorder = make_recorder(tmp_path, frames_in_ring=10, pre_seconds=0.0, post_seconds=10.0)
+    try:
+        for seq in range(1, 6):
+            recorder.add(frame(seq), timestamp(seq))
+        recorder.trigger(timestamp=timestamp(5))
+        wait_until(lambda: recorder.frames_written == 1)
+        time.sleep(0.1)
+        # Schreib-Thread wartet auf neue Bilder; waehrenddessen laeuft der Ring mehrfach um
+        with recorder.cond:
+            for seq in range(6, 56):
+                recorder.add(frame(seq), timestamp(seq))
+        recorder.add(frame(2000), timestamp(2000))
+        wait_until(lambda: recorder.recordings == 1)
+    finally:
+        recorder.stop()
+
+    info, meta = check_frames(recorder.last_path)
+    assert recorder.frames_lost > 0
+    assert info["frames_lost"] == recorder.frames_lost
+    assert list(meta["seq"]) == sorted(meta["seq"])
+    # Jedes Bild ab dem Trigger ist entweder gesichert oder als verloren gezaehlt
+    assert info["frames"] + info["frames_lost"] == 56 - 5
+    assert meta["seq"][-1] == 55
+
+
+def test_rejects_unsupported_frames(tmp_path):
+    recorder = make_recorder(tmp_path, frames_in_ring=2)
+    try:
+        with pytest.raises(ValueError):
+            recorder.add(np.zeros(SHAPE, np.float32))
+        with pytest.raises(ValueError):
+            recorder.add(np.zeros((64, 64, 3), np.uint8))
+    finally:
+        recorder.stop()
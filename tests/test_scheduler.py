@@ -0,0 +1,107 @@
+import pytest
+
+import scheduler
+from scheduler import DeadlineScheduler
+
+
+class FakeClock:
+    """Ersetzt time im scheduler-Modul: sleep() schiebt nur die Uhr weiter."""
+
+    def __init__(self):
+        self.now = 100.0
+
+    def perf_counter(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(scheduler, "time", clock)
+    return clock
+
+
+def run_cycle(s, clock, work):
+    s.wait()
+    start = s.start()
+    clock.now += work
+    return start, s.done()
+
+
+def test_rejects_unknown_policies():
+    with pytest.raises(ValueError):
+        DeadlineScheduler(pacing="sometimes")
+    with pytest.raises(ValueError):
+        DeadlineScheduler(overrun="ignore")
+
+
+def test_fixed_rate_does_not_drift(clock):
+    s = DeadlineScheduler(0.01, "fixed")
+    starts = [run_cycle(s, clock, 0.003)[0] for _ in range(1000)]
+    # Zyklus k beginnt genau bei start + k * period, unabhaengig von der Arbeitszeit
+    assert starts[-1] - starts[0] == pytest.approx(999 * 0.01)
+    assert s.overruns == 0
+
+
+def test_fixed_skip_keeps_phase(clock):
+    s = DeadlineScheduler(0.01, "fixed", "skip")
+    first, _ = run_cycle(s, clock, 0.001)
+    _, overran = run_cycle(s, clock, 0.025)   # endet nach 2.5 Takten
+    assert overran
+    assert s.ticks_skipped == 2
+    start, _ = run_cycle(s, clock, 0.001)
+    # Naechster Start wieder auf dem Raster: first + 4 * period
+    assert start - first == pytest.approx(0.04)
+    assert s.worst_overrun_s == pytest.approx(0.015)
+
+
+def test_fixed_catch_up_without_skip(clock):
+    s = DeadlineScheduler(0.01, "fixed", "alert", on_alert=lambda stats: None, max_catchup=2)
+    first, _ = run_cycle(s, clock, 0.001)
+    run_cycle(s, clock, 0.015)                # 0.5 Takte zu lang
+    start, _ = run_cycle(s, clock, 0.001)
+    # Kein Warten: der naechste Zyklus holt den verpassten Takt sofort nach
+    assert start - first == pytest.approx(0.025)
+    assert s.ticks_skipped == 0
+    start, _ = run_cycle(s, clock, 0.001)
+    assert start - first == pytest.approx(0.03)
+
+
+def test_frames_pacing_overrun_against_budget(clock):
+    s = DeadlineScheduler(0.002, "frames")
+    assert not run_cycle(s, clock, 0.0015)[1]
+    assert run_cycle(s, clock, 0.0025)[1]
+    assert s.overruns == 1
+    assert s.get_stats()["worst_overrun_ms"] == pytest.approx(0.5)
+
+
+def test_degrade_and_recover(clock):
+    events = []
+    s = DeadlineScheduler(0.002, "free", "degrade", on_degrade=events.append,
+                          degrade_after=3, recover_after=5)
+    for _ in range(3):
+        run_cycle(s, clock, 0.003)
+    assert events == [True] and s.degraded
+    for _ in range(4):
+        run_cycle(s, clock, 0.001)
+    assert s.degraded
+    run_cycle(s, clock, 0.001)
+    assert events == [True, False] and not s.degraded
+
+
+def test_alert_is_rate_limited(clock):
+    alerts = []
+    s = DeadlineScheduler(0.002, "free", "alert", on_alert=alerts.append, alert_interval_s=1.0)
+    for _ in range(10):
+        run_cycle(s, clock, 0.003)
+    assert len(alerts) == 1
+    clock.now += 1.0
+    run_cycle(s, clock, 0.003)
+    assert len(alerts) == 2
+    assert s.overruns == 11
@@ -0,0 +1,130 @@
+import subprocess
+import sys
+import uuid
+
+import numpy as np
+import pytest
+from multiprocessing import resource_tracker
+
+from positionstream import PositionSample
+from sharedpositions import SharedPositionReader, SharedPositionRing
+
+
+def sample(seq, found=True):
+    return PositionSample(seq, seq * 2_000_000, float(seq), 2.0 * seq, 0.0, 10.0, 0.9, found, 1.5)
+
+
+@pytest.fixture
+def ring():
+    ring = SharedPositionRing(name=f"test_positions_{uuid.uuid4().hex[:8]}", capacity=8)
+    yield ring
+    ring.close()
+
+
+def test_reader_gets_new_samples_in_order(ring):
+    reader = SharedPositionReader(ring.name)
+    try:
+        assert len(reader.read_new()) == 0
+        for seq in range(1, 6):
+            ring.write(sample(seq))
+        records = reader.read_new()
+        assert list(records["seq"]) == [1, 2, 3, 4, 5]
+        assert list(records["x"]) == [1.0, 2.0, 3.0, 4.0, 5.0]
+        assert len(reader.read_new()) == 0
+        assert reader.latest()["seq"] == 5
+    finally:
+        reader.close()
+
+
+def test_reader_counts_samples_lost_to_overrun(ring):
+    reader = SharedPositionReader(ring.name)
+    try:
+        for seq in range(1, 21):
+            ring.write(sample(seq))
+        records = reader.read_new()
+        assert list(records["seq"]) == list(range(13, 21))
+        assert reader.missed == 12
+    finally:
+        reader.close()
+
+
+def test_reader_drops_slot_being_written(ring):
+    reader = SharedPositionReader(ring.name)
+    try:
+        for seq in range(1, 4):
+            ring.write(sample(seq))
+        # Schreiber mitten in Slot 2: version ungerade
+        ring.version[2] = 2 * 2 + 1
+        records = reader.read_new()
+        assert list(records["seq"]) == [1, 3]
+        assert reader.torn == 1
+    finally:
+        reader.close()
+
+
+def test_reader_from_start_sees_older_samples(ring):
+    for seq in range(1, 4):
+        ring.write(sample(seq))
+    reader = SharedPositionReader(ring.name, from_start=True)
+    try:
+        assert list(reader.read_new()["seq"]) == [1, 2, 3]
+    finally:
+        reader.close()
+
+
+def test_reader_does_not_register_with_resource_tracker(ring, monkeypatch):
+    calls = []
+    monkeypatch.setattr(resource_tracker, "register", lambda *args: calls.append(args))
+    monkeypatch.setattr(resource_tracker, "unregister", lambda *args: calls.append(args))
+    reader = SharedPositionReader(ring.name)
+    reader.close()
+    assert [call for call in calls if call[1] == "shared_memory"] == []
+    # Block ist noch da, nur der Schreiber entfernt ihn
+    again = SharedPositionReader(ring.name)
+    again.close()
+
+
+def test_rejects_block_without_ring():
+    from multiprocessing import shared_memory
+    name = f"test_other_{uuid.uuid4().hex[:8]}"
+    shm = shared_memory.SharedMemory(name=name, create=True, size=4096)
+    try:
+        np.ndarray((4096,), dtype=np.uint8, buffer=shm.buf)[:] = 0
+        with pytest.raises(RuntimeError):
+            SharedPositionReader(name)
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def test_second_writer_is_rejected_while_first_lives(ring):
+    with pytest.raises(FileExistsError):
+        SharedPositionRing(name=ring.name, capacity=8)
+    # Erster Schreiber laeuft unveraendert weiter
+    ring.write(sample(1))
+    reader = SharedPositionReader(ring.name)
+    try:
+        assert reader.latest()["seq"] == 1
+    finally:
+        reader.close()
+
+
+def test_block_of_dead_writer_is_reclaimed(ring):
+    dead = subprocess.Popen([sys.executable, "-c", ""])
+    dead.wait()
+    ring.header["writer_pid"] = dead.pid
+    new = SharedPositionRing(name=ring.name, capacity=4)
+    try:
+        # Alter Schreiber entfernt beim Beenden nicht den Block des neuen
+        ring.close()
+        new.write(sample(1))
+        reader = SharedPositionReader(new.name)
+        try:
+            assert reader.capacity == 4
+            assert reader.latest()["seq"] == 1
+        finally:
+            reader.close()
+    finally:
+        new.close()
+    with pytest.raises(FileNotFoundError):
+        SharedPositionReader(new.name)
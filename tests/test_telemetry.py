@@ -0,0 +1,67 @@
+import re
+
+import numpy as np
+
+from telemetry import HEADER, MAGIC, SAMPLE_DTYPE, TELEMETRY_JS, VERSION, Telemetry
+
+# DataView-Getter im Browser -> numpy-Typ
+JS_TYPES = {"getFloat32": "<f4", "getUint16": "<u2", "getUint8": "u1"}
+# Namen im JavaScript -> Felder von SAMPLE_DTYPE
+JS_FIELDS = {"x": "x", "y": "y", "r": "radius", "cropX": "crop_x", "cropY": "crop_y",
+             "cropW": "crop_w", "cropH": "crop_h", "found": "found", "mode": "mode"}
+
+
+def js_sample_fields():
+    pattern = r"(\w+): (?:info\.modes\[)?view\.(get\w+)\(offset \+ (\d+)"
+    return {name: (getter, int(offset)) for name, getter, offset in re.findall(pattern, TELEMETRY_JS)}
+
+
+def test_sample_layout_matches_javascript():
+    assert SAMPLE_DTYPE.itemsize == 36
+    fields = js_sample_fields()
+    assert set(fields) == set(JS_FIELDS)
+    for name, (getter, offset) in fields.items():
+        dtype, field_offset = SAMPLE_DTYPE.fields[JS_FIELDS[name]]
+        assert field_offset == offset, name
+        assert dtype == np.dtype(JS_TYPES[getter]), name
+
+
+def test_header_layout_matches_javascript():
+    assert HEADER.size == 16
+    assert "view.getUint16(4, true)" in TELEMETRY_JS     # count
+    assert "view.getUint16(6, true)" in TELEMETRY_JS     # n_stages
+    assert "view.getFloat32(8, true)" in TELEMETRY_JS    # fps
+    assert "view.getFloat32(12, true)" in TELEMETRY_JS   # sensor_fps
+    # Stufen direkt hinter dem Kopf, Samples dahinter
+    assert f"view.getFloat32({HEADER.size} + 4 * i, true)" in TELEMETRY_JS
+    assert f"let offset = {HEADER.size} + 4 * stageCount;" in TELEMETRY_JS
+
+
+def test_batch_decodes_at_javascript_offsets():
+    telemetry = Telemetry(400, 300, modes=("hough", "color"), fps=lambda: 499.5,
+                          sensor_fps=lambda: 500.0)
+    telemetry.stages = []
+    telemetry.add(12.5, 40.25, 21.0, True, 1_000, crop=(520, 344, 400, 400), mode="color")
+    telemetry.add(1.0, 2.0, 3.0, False, 2_000, mode="hough")
+    last, data = telemetry.batch(0)
+    assert last == 2
+
+    magic, version, _, count, stage_count, fps, sensor_fps = HEADER.unpack_from(data)
+    assert (magic, version, count, stage_count) == (MAGIC, VERSION, 2, 0)
+    assert (fps, sensor_fps) == (499.5, 500.0)
+
+    fields = js_sample_fields()
+    offset = HEADER.size + 4 * stage_count
+
+    def read(name, record):
+        getter, field_offset = fields[name]
+        start = offset + record * SAMPLE_DTYPE.itemsize + field_offset
+        return np.frombuffer(data, dtype=JS_TYPES[getter], count=1, offset=start)[0].item()
+
+    assert (read("x", 0), read("y", 0), read("r", 0)) == (12.5, 40.25, 21.0)
+    assert (read("cropX", 0), read("cropY", 0), read("cropW", 0), read("cropH", 0)) == (520, 344, 400, 400)
+    assert (read("found", 0), read("mode", 0)) == (1, 1)
+    # Ohne Treffer: Position 0, Crop = ganzes Bild
+    assert (read("x", 1), read("found", 1), read("mode", 1)) == (0.0, 0, 0)
+    assert (read("cropW", 1), read("cropH", 1)) == (400, 300)
+    assert len(data) == offset + 2 * SAMPLE_DTYPE.itemsize
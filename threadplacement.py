@@ -0,0 +1,223 @@
+"""
+Threads auf Kerne verteilen: Affinitaet, SCHED_FIFO, nice und OpenCV-Threads pro Stufe
+
+Ohne Vorgaben wandern Capture, Detektion, Encoder und HTTP-Threads frei
+ueber alle Kerne und verdraengen sich gegenseitig; das zeigt sich als
+Latenzspitzen weit ueber der Bilddauer von 2 ms. Jeder Thread ruft beim
+Start apply(stage) auf und setzt damit fuer sich selbst die Vorgaben
+seiner Stufe. Die Statistik liest pro Thread CPU-Zeit und unfreiwillige
+Kontextwechsel aus /proc, um den Effekt zu belegen.
+
+Konfiguration als dict oder ueber die Umgebung, z.B.:
+    THREAD_PLACEMENT="capture:cpus=1;detect:cpus=2-3,fifo=50,opencv=1;encode:cpus=0,nice=10;http:cpus=0,nice=5"
+
+Schluessel pro Stufe:
+    cpus    Kerne, z.B. 2, 2-3 oder 0+2
+    fifo    SCHED_FIFO-Prioritaet 1..99 (braucht CAP_SYS_NICE bzw. root)
+    nice    nice-Wert des Threads (negativ braucht CAP_SYS_NICE)
+    opencv  cv2.setNumThreads(); bei den meisten OpenCV-Builds gilt der Wert
+            prozessweit, d.h. die zuletzt gestartete Stufe gewinnt. Sinnvoll
+            fuer die Detektion (z.B. opencv=1 neben gepinnten Threads).
+
+Neue Threads erben Affinitaet, Prioritaet und nice des erzeugenden
+Threads; z.B. erben die Request-Threads von Flask die Vorgaben von "http",
+wenn run_server() sie im Hauptthread setzt.
+"""
+import os
+import threading
+import time
+import cv2
+
+STAGE_KEYS = ("cpus", "fifo", "nice", "opencv")
+
+try:
+    _CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+except (AttributeError, ValueError, OSError):
+    _CLOCK_TICKS = 100
+
+
+def parse_cpus(text):
+    """ "2", "2-3", "0+2" oder "0-1+3" -> Menge der Kerne."""
+    cpus = set()
+    for part in str(text).split("+"):
+        first, _, last = part.strip().partition("-")
+        if last:
+            cpus.update(range(int(first), int(last) + 1))
+        else:
+            cpus.add(int(first))
+    return cpus
+
+
+def parse_placement(spec):
+    """
+    Spezifikation wie in THREAD_PLACEMENT in ein dict umwandeln.
+
+    Returns:
+        dict: stage -> {"cpus": set, "fifo": int, "nice": int, "opencv": int}
+    """
+    config = {}
+    for section in spec.split(";"):
+        section = section.strip()
+        if not section:
+            continue
+        stage, _, rest = section.partition(":")
+        options = {}
+        for part in rest.split(","):
+            if not part.strip():
+                continue
+            key, _, value = part.partition("=")
+            key = key.strip()
+            if key not in STAGE_KEYS:
+                raise ValueError(f"unknown thread placement key {key!r} for stage {stage!r}, "
+                                 f"expected one of {STAGE_KEYS}")
+            options[key] = parse_cpus(value) if key == "cpus" else int(value)
+        config[stage.strip()] = options
+    return config
+
+
+def _read_task(tid):
+    # Felder nach dem Namen in Klammern (der Leerzeichen enthalten kann), siehe proc(5)
+    with open(f"/proc/self/task/{tid}/stat") as f:
+        fields = f.read().rpartition(")")[2].split()
+    info = {
+        "user_s": int(fields[11]) / _CLOCK_TICKS,
+        "system_s": int(fields[12]) / _CLOCK_TICKS,
+        "nice": int(fields[16]),
+        "last_cpu": int(fields[36]),
+        "rt_priority": int(fields[37]),
+    }
+    with open(f"/proc/self/task/{tid}/status") as f:
+        for line in f:
+            if line.startswith("voluntary_ctxt_switches"):
+                info["voluntary_switches"] = int(line.split()[1])
+            elif line.startswith("nonvoluntary_ctxt_switches"):
+                info["involuntary_switches"] = int(line.split()[1])
+    return info
+
+
+class ThreadPlacement:
+    """
+    Vorgaben pro Stufe und Laufzeitstatistik der registrierten Threads.
+
+    Fehlende Rechte (SCHED_FIFO, negatives nice) oder Plattformen ohne
+    sched_setaffinity brechen nichts ab: der Thread laeuft mit den
+    Standardwerten weiter, der Fehler steht in get_stats()["errors"].
+
+    Args:
+        config (dict or str, optional): stage -> Vorgaben oder Spezifikation
+            wie THREAD_PLACEMENT; Stufen ohne Eintrag bleiben unveraendert
+        metrics (Metrics, optional): Exportiert CPU-Zeit und Kontextwechsel
+            pro Thread beim Abruf von /metrics
+    """
+
+    def __init__(self, config=None, metrics=None):
+        if isinstance(config, str):
+            config = parse_placement(config)
+        self.config = {stage: dict(options) for stage, options in (config or {}).items()}
+        self.metrics = metrics
+        self.lock = threading.Lock()
+        # name -> (stage, native thread id, Startzeit)
+        self.threads = {}
+        self.errors = []
+
+    @classmethod
+    def from_env(cls, metrics=None):
+        """Vorgaben aus THREAD_PLACEMENT (leer = nichts aendern, nur messen)."""
+        return cls(os.environ.get("THREAD_PLACEMENT", ""), metrics)
+
+    def apply(self, stage, name=None):
+        """
+        Vorgaben von stage auf den aufrufenden Thread anwenden und ihn registrieren.
+
+        Args:
+            stage (str): z.B. "capture", "detect", "encode", "http", "main"
+            name (str, optional): Name in der Statistik (Standard: Thread-Name)
+
+        Returns:
+            dict: Tatsaechlich gesetzte Werte
+        """
+        options = self.config.get(stage, {})
+        tid = threading.get_native_id()
+        name = name or threading.current_thread().name
+        applied = {}
+        if "cpus" in options:
+            self._try(stage, "cpus", lambda: os.sched_setaffinity(0, options["cpus"]))
+            applied["cpus"] = sorted(options["cpus"])
+        if "nice" in options:
+            # Unter Linux gilt PRIO_PROCESS mit der Thread-ID nur fuer diesen Thread
+            self._try(stage, "nice", lambda: os.setpriority(os.PRIO_PROCESS, tid, options["nice"]))
+            applied["nice"] = options["nice"]
+        if "fifo" in options:
+            self._try(stage, "fifo", lambda: os.sched_setscheduler(
+                0, os.SCHED_FIFO, os.sched_param(options["fifo"])))
+            applied["fifo"] = options["fifo"]
+        if "opencv" in options:
+            cv2.setNumThreads(options["opencv"])
+            applied["opencv"] = options["opencv"]
+
+        with self.lock:
+            known = name in self.threads
+            self.threads[name] = (stage, tid, time.monotonic())
+        if self.metrics is not None and not known:
+            labels = {"thread": name, "stage": stage}
+            self.metrics.counter("thread_cpu_seconds_total", "CPU time per thread (user + system)",
+                                 labels, fn=lambda: self._counter(name, "cpu_s"))
+            self.metrics.counter("thread_involuntary_context_switches_total",
+                                 "Involuntary context switches per thread", labels,
+                                 fn=lambda: self._counter(name, "involuntary_switches"))
+        return applied
+
+    def _try(self, stage, key, action):
+        try:
+            action()
+        except (OSError, AttributeError, ValueError) as e:
+            # Ohne Rechte oder nicht unter Linux: Standard-Scheduler weiterverwenden
+            with self.lock:
+                self.errors.append(f"{stage}.{key}: {e}")
+
+    def _counter(self, name, key):
+        stats = self.thread_stats().get(name)
+        return stats[key] if stats else 0
+
+    def thread_stats(self):
+        """
+        Laufzeitwerte aller registrierten Threads, die noch laufen.
+
+        Returns:
+            dict: name -> stage, tid, cpu_s, cpu_percent (seit apply), user_s,
+                system_s, voluntary_switches, involuntary_switches, last_cpu,
+                affinity, nice, rt_priority
+        """
+        with self.lock:
+            threads = dict(self.threads)
+        now = time.monotonic()
+        result = {}
+        for name, (stage, tid, started) in threads.items():
+            try:
+                info = _read_task(tid)
+                affinity = sorted(os.sched_getaffinity(tid))
+            except (OSError, AttributeError):
+                # Thread beendet oder kein /proc (nicht Linux)
+                continue
+            cpu_s = info["user_s"] + info["system_s"]
+            result[name] = {
+                "stage": stage,
+                "tid": tid,
+                "cpu_s": round(cpu_s, 3),
+                "cpu_percent": round(100.0 * cpu_s / max(now - started, 1e-3), 1),
+                "affinity": affinity,
+                **info,
+            }
+        return result
+
+    def get_stats(self):
+        with self.lock:
+            errors = list(self.errors)
+        return {
+            "config": {stage: {key: sorted(value) if key == "cpus" else value
+                               for key, value in options.items()}
+                       for stage, options in self.config.items()},
+            "opencv_threads": cv2.getNumThreads(),
+            "threads": self.thread_stats(),
+            "errors": errors,
+        }
@@ -1,14 +1,21 @@
+from flask import Flask, Response, request, jsonify
 import time
-import threading
-from flask import Flask, Response, request
-from picamera2 import Picamera2
 import cv2
-import numpy as np
+from framesource import open_frame_source
+from streamhub import StreamHub
+from asyncserver import run_server
+from colorlut import ColorClassifier, parse_hsv, to_frame_coords
+from blob import BlobDetector
+from hough import AdaptiveHoughDetector
+from metrics import Metrics, PROMETHEUS_CONTENT_TYPE
+from threadplacement import ThreadPlacement
+from sensortime import SensorTiming, capture_with_metadata
+from telemetry import Telemetry, TELEMETRY_JS, split_mode, stream_mode, with_client_overlay
 
 app = Flask(__name__)
 
 # Kamera initialisieren
-picam2 = Picamera2()
+picam2 = open_frame_source()  # FRAME_SOURCE=synthetic/replay:... ohne Kamera
 picam2.configure(picam2.create_video_configuration(main={"size": (640, 480)}))
 picam2.set_controls({})
 picam2.set_controls({"NoiseReductionMode": 0})
@@ -16,40 +23,70 @@ picam2.set_controls({"FrameDurationLimits": (2000, 2000)})
 picam2.start()
 
 # Globale Variablen
-fps = 0.0
 MIN_RADIUS = 60
 MAX_RADIUS = 130
-fps_lock = threading.Lock()
-mode_lock = threading.Lock()
-mode = "hough"  # default
+# Hough grob-zu-fein (Kandidaten im verkleinerten Bild, Verfeinerung in voller
+# Aufloesung), Radiusband folgt dem zuletzt gefundenen Radius
+PYRAMID_MIN_WIDTH = 600
+hough_detector = AdaptiveHoughDetector(MIN_RADIUS, MAX_RADIUS, dp=1.5, min_dist=50,
+                                       param1=100, param2=30,
+                                       pyramid_min_width=PYRAMID_MIN_WIDTH)
+# Farbmaske per Lookup-Tabelle, Grenzen zur Laufzeit aenderbar
+color_classifier = ColorClassifier(pixel_format="BGR")
+# Rundester Fleck der Maske per connectedComponents, statt findContours
+blob_detector = BlobDetector()
+
+# Latenz pro Schritt, Export unter /metrics
+metrics = Metrics(frame_budget=0.002)
+# Kerne/Prioritaet pro Thread aus THREAD_PLACEMENT, CPU-Zeit und Kontextwechsel unter /metrics
+placement = ThreadPlacement.from_env(metrics)
+capture_stage = metrics.stage("capture")
+convert_stage = metrics.stage("convert")
+detect_stage = metrics.stage("detect")
+draw_stage = metrics.stage("draw")
+# Echte Bildrate, verlorene Bilder und Latenz aus den Sensor-Zeitstempeln
+sensor_timing = SensorTiming(frame_duration_us=2000, metrics=metrics)
+sensor_timestamp = None  # SensorTimestamp (ns) des aktuellen Bildes
+# Positionen und Stufenzeiten per WebSocket (/telemetry, nur STREAM_SERVER=asyncio)
+telemetry = Telemetry(640, 480, modes=("hough", "color"), fps=lambda: hub.fps,
+                      sensor_fps=sensor_timing.sensor_fps, metrics=metrics)
 
 def detect_ball_hough(frame):
-    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-    blurred = cv2.medianBlur(gray, 5)
-    circles = cv2.HoughCircles(blurred, cv2.HOUGH_GRADIENT, dp=1.5, minDist=50,
-                               param1=100, param2=30, minRadius=MIN_RADIUS, maxRadius=MAX_RADIUS)
-    if circles is not None:
-        circles = np.uint16(np.around(circles))
-        c = circles[0][0]
-        cv2.circle(frame, (c[0], c[1]), c[2], (0, 255, 0), 2)
-        cv2.circle(frame, (c[0], c[1]), 2, (0, 0, 255), 3)
-    return frame
+    found, (x, y, r) = hough_detector.detect(frame)
+    return found, x, y, r
 
 def detect_ball_color(frame):
-    hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
-    lower_orange = np.array([5, 150, 150])
-    upper_orange = np.array([25, 255, 255])
-    mask = cv2.inRange(hsv, lower_orange, upper_orange)
-    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-
-    if contours:
-        largest = max(contours, key=cv2.contourArea)
-        ((x, y), radius) = cv2.minEnclosingCircle(largest)
-        if radius > 5:
-            center = (int(x), int(y))
-            cv2.circle(frame, center, int(radius), (0, 255, 0), 2)
-            cv2.circle(frame, center, 2, (0, 0, 255), 3)
+    # Maske in halber Aufloesung ueber die Lookup-Tabelle, ohne HSV-Konvertierung
+    mask, scale, offset = color_classifier.mask(frame)
+    found, (x, y, radius), _ = blob_detector.find(mask)
+    if found:
+        x, y, radius = to_frame_coords(x, y, radius, scale, offset)
+        found = radius > 5
+    return found, x, y, radius
+
+# Letzte Detektion pro Modus: (Bildnummer, found, x, y, r); Clients mit und
+# ohne Ball-Overlay (?overlay=client) teilen sich eine Detektion pro Bild
+detections = {}
 
+def detect_once(frame, mode, detect):
+    frame_id = hub.frames_captured
+    cached = detections.get(mode)
+    if cached is not None and cached[0] == frame_id:
+        return cached[1:]
+    start = time.perf_counter()
+    found, x, y, r = detect(frame)
+    detect_stage.observe(time.perf_counter() - start)
+    metrics.detection(found)
+    sensor_timing.position_ready(sensor_timestamp)
+    telemetry.add(x, y, r, found, sensor_timestamp, mode=mode)
+    detections[mode] = (frame_id, found, x, y, r)
+    return found, x, y, r
+
+def draw_ball(frame, x, y, r):
+    start = time.perf_counter()
+    cv2.circle(frame, (int(x), int(y)), int(r), (0, 255, 0), 2)
+    cv2.circle(frame, (int(x), int(y)), 2, (0, 0, 255), 3)
+    draw_stage.observe(time.perf_counter() - start)
     return frame
 
 def draw_reference_circles(frame):
@@ -59,57 +96,77 @@ def draw_reference_circles(frame):
     cv2.circle(frame, center, MAX_RADIUS, (255, 0, 0), 1)  # max radius
     return frame
 
-def gen_frames():
-    global fps, mode
-    frame_counter = 0
-    start_time = time.time()
-
-    while True:
-        frame = picam2.capture_array()
-        frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
-
-        with mode_lock:
-            current_mode = mode
-
-        if current_mode == "hough":
-            frame = draw_reference_circles(frame)
-            frame = detect_ball_hough(frame)
-        elif current_mode == "color":
-            frame = detect_ball_color(frame)
-
-        
+def capture_frame():
+    global sensor_timestamp
+    start = time.perf_counter()
+    frame, metadata = capture_with_metadata(picam2)
+    captured = time.perf_counter()
+    sensor_timing.update(metadata)
+    sensor_timestamp = metadata["SensorTimestamp"]
+    frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
+    capture_stage.observe(captured - start)
+    convert_stage.observe(time.perf_counter() - captured)
+    return frame
 
-        # FPS Berechnung
-        frame_counter += 1
-        elapsed = time.time() - start_time
-        if elapsed >= 1.0:
-            with fps_lock:
-                fps = frame_counter / elapsed
-            frame_counter = 0
-            start_time = time.time()
+def process_frame(frame, mode):
+    # "hough:client" usw.: gleiche Detektion, den Ball zeichnet der Browser
+    mode, overlay = split_mode(mode)
+    if mode == "hough":
+        # Erst detektieren, die Referenzkreise liegen genau im Radiusband
+        found, x, y, r = detect_once(frame, mode, detect_ball_hough)
+        if found and overlay:
+            frame = draw_ball(frame, x, y, r)
+        frame = draw_reference_circles(frame)
+    elif mode == "color":
+        found, x, y, r = detect_once(frame, mode, detect_ball_color)
+        if found and overlay:
+            frame = draw_ball(frame, x, y, r)
+    return frame
 
-        ret, buffer = cv2.imencode('.jpg', frame)
-        if not ret:
-            continue
-        frame_bytes = buffer.tobytes()
+def select_mode(args):
+    return stream_mode(args, 'hough')
 
-        yield (b'--frame\r\n'
-               b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
+# Eine Pipeline fuer alle Clients, jeder Client waehlt sein Overlay
+hub = StreamHub(capture_frame, process_frame, modes=with_client_overlay(("hough", "color")),
+                metrics=metrics, placement=placement)
+hub.start()
 
 @app.route('/video_feed')
 def video_feed():
-    global mode
-    requested_mode = request.args.get('mode', 'hough')
-    with mode_lock:
-        mode = requested_mode
-    return Response(gen_frames(),
+    return Response(hub.stream(select_mode(request.args)),
                     mimetype='multipart/x-mixed-replace; boundary=frame')
 
 @app.route('/fps')
 def get_fps():
-    with fps_lock:
-        current_fps = fps
-    return f"{current_fps:.2f}"
+    return f"{hub.fps:.2f}"
+
+@app.route('/stats')
+def stats():
+    return jsonify({'fps': round(hub.fps, 2), 'hough': hough_detector.get_stats(),
+                    'encoder': hub.encoder.get_stats(), 'latency': metrics.summary(),
+                    'timing': sensor_timing.get_stats(), 'telemetry': telemetry.get_stats(),
+                    'threads': placement.get_stats()})
+
+@app.route('/timing')
+def timing():
+    return jsonify(sensor_timing.get_stats())
+
+@app.route('/metrics')
+def get_metrics():
+    return Response(metrics.render(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+@app.route('/color_thresholds')
+def color_thresholds():
+    # z.B. /color_thresholds?lower=5,150,150&upper=25,255,255
+    lower, upper = color_classifier.get_thresholds()
+    try:
+        lower = parse_hsv(request.args['lower']) if 'lower' in request.args else lower
+        upper = parse_hsv(request.args['upper']) if 'upper' in request.args else upper
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    color_classifier.set_thresholds(lower, upper)
+    lower, upper = color_classifier.get_thresholds()
+    return jsonify({'lower': lower, 'upper': upper})
 
 @app.route('/')
 def index():
@@ -119,7 +176,17 @@ def index():
             <title>Live Stream mit Tracking</title>
             <style>
                 body { font-family: Arial, sans-serif; text-align: center; }
-                #fps { font-size: 1.2em; margin-top: 10px; }
+                #fps, #sensor { font-size: 1.2em; margin-top: 10px; }
+                #view { position: relative; display: inline-block; }
+                #view img { display: block; }
+                #overlay {
+                    position: absolute;
+                    left: 0;
+                    top: 0;
+                    width: 100%;
+                    height: 100%;
+                    pointer-events: none;
+                }
                 button {
                     font-size: 1em;
                     padding: 10px 20px;
@@ -138,9 +205,21 @@ def index():
                 <button id="btn-hough" class="active" onclick="changeMode('hough')">Hough Circles</button>
                 <button id="btn-color" onclick="changeMode('color')">Farbtracking Orange</button>
             </div>
-            <img id="video" src="/video_feed?mode=hough" width="640" />
+            <div id="view">
+                <img id="video" src="/video_feed?mode=hough" width="640" />
+                <canvas id="overlay"></canvas>
+            </div>
             <div id="fps">FPS: Berechnung...</div>
-            <script>
+            <div id="sensor">Sensor: Berechnung...</div>
+            <script>''' + TELEMETRY_JS + '''
+                let currentMode = 'hough';
+                // Mit Telemetrie zeichnet der Browser den Ball, der Stream kommt ohne
+                let clientOverlay = false;
+
+                function videoSource(mode) {
+                    return '/video_feed?mode=' + mode + (clientOverlay ? '&overlay=client' : '');
+                }
+
                 function fetchFPS() {
                     fetch('/fps')
                         .then(response => response.text())
@@ -149,11 +228,31 @@ def index():
                         })
                         .catch(console.error);
                 }
-                setInterval(fetchFPS, 1000);
-                fetchFPS();
+                // FPS und Ball kommen per WebSocket; unter Flask weiter per Polling
+                startTelemetry({canvas: 'overlay', fps: 'fps', hz: 60, mode: () => currentMode,
+                                fallback: () => { setInterval(fetchFPS, 1000); fetchFPS(); },
+                                connected: (on) => {
+                                    clientOverlay = on;
+                                    document.getElementById('video').src = videoSource(currentMode);
+                                }});
+
+                function fetchTiming() {
+                    fetch('/timing?t=' + Date.now())
+                        .then(response => response.json())
+                        .then(t => {
+                            document.getElementById('sensor').innerText =
+                                'Sensor: ' + t.sensor_fps.toFixed(1) + ' fps | verloren: ' + t.frames_dropped +
+                                ' | Latenz: ' + t.mean_latency_ms.toFixed(1) + ' ms';
+                        })
+                        .catch(console.error);
+                }
+
+                setInterval(fetchTiming, 1000);
+                fetchTiming();
 
                 function changeMode(mode) {
-                    document.getElementById('video').src = '/video_feed?mode=' + mode;
+                    currentMode = mode;
+                    document.getElementById('video').src = videoSource(mode);
                     document.getElementById('btn-hough').classList.toggle('active', mode === 'hough');
                     document.getElementById('btn-color').classList.toggle('active', mode === 'color');
                 }
@@ -163,4 +262,6 @@ def index():
     '''
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, threaded=True)
+    # STREAM_SERVER=asyncio: alle Clients in einem Event-Loop statt einem Thread pro Stream
+    run_server(app, hub, host='0.0.0.0', port=5000, select_mode=select_mode,
+               websockets={'/telemetry': telemetry.websocket}, placement=placement)
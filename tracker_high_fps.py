@@ -1,23 +1,37 @@
+from flask import Flask, Response, request, jsonify
+import os
 import time
-import threading
-from flask import Flask, Response, request
-from picamera2 import Picamera2
 import cv2
-import numpy as np
-from GSCrop import set_camera_crop
+from framesource import open_frame_source, set_source_crop
+from GSCrop import CropController
+from roi import RoiPredictor, detect_with_roi
+from motiongate import MotionGate, gated
+from yuv import CAPTURE_FORMAT_YUV420, luma, yuv420_to_bgr
+from colorlut import ColorClassifier, parse_hsv, to_frame_coords
+from blob import BlobDetector
+from hough import AdaptiveHoughDetector
+from streamhub import StreamHub
+from asyncserver import run_server
+from recorder import FrameRecorder
+from metrics import Metrics, PROMETHEUS_CONTENT_TYPE
+from threadplacement import ThreadPlacement
+from sensortime import SensorTiming, capture_with_metadata
+from telemetry import Telemetry, TELEMETRY_JS, split_mode, stream_mode, with_client_overlay
 
 app = Flask(__name__)
-picam2 = Picamera2()
+picam2 = open_frame_source()  # FRAME_SOURCE=synthetic/replay:... ohne Kamera
 
 # --- Kamera vorbereiten ---
 # Sensor auf hohen FPS-Modus croppen
 CROP_WIDTH = 400
 CROP_HEIGHT = 400
-set_camera_crop(CROP_WIDTH, CROP_HEIGHT)
+set_source_crop(picam2, CROP_WIDTH, CROP_HEIGHT)
+# YUV420 vom ISP: Hough arbeitet direkt auf der Y-Ebene, Farbe nur bei Bedarf
+CAPTURE_FORMAT = CAPTURE_FORMAT_YUV420
 
 # Kamera initialisieren
 video_config = picam2.create_video_configuration(
-    main={"size": (CROP_WIDTH, CROP_HEIGHT)},
+    main={"size": (CROP_WIDTH, CROP_HEIGHT), "format": CAPTURE_FORMAT},
     raw=None,
     controls={
         "NoiseReductionMode": 0,  # deaktiviert Noise Reduction
@@ -29,41 +43,72 @@ picam2.configure(video_config)
 picam2.start()
 
 # Globale Variablen
-fps = 0.0
 MIN_RADIUS = 20
 MAX_RADIUS = 100
-fps_lock = threading.Lock()
-mode_lock = threading.Lock()
-mode = "hough"
+# Detektion zuerst im Fenster um die vorhergesagte Ballposition
+ROI_TRACKING = True
+# Detektoren nur dort, wo sich etwas bewegt; ohne Bewegung gilt die letzte Detektion
+MOTION_GATE = True
+motion_gate = MotionGate() if MOTION_GATE else None
+# Rohbilder der letzten Sekunde im Speicher, Aufnahme per /record; Ringpuffer
+# (256 MiB) und Kopie pro Bild erst mit RECORDING=1 beim Start oder /record?arm=1
+RECORDING = os.environ.get("RECORDING", "0") == "1"
+_, _, crop_x, crop_y = CropController.snap(CROP_WIDTH, CROP_HEIGHT)
+recorder = FrameRecorder(buffer_mb=256, pre_seconds=1.0, post_seconds=1.0,
+                         capture_format=CAPTURE_FORMAT, armed=RECORDING)
+# Radiusband folgt dem zuletzt gefundenen Radius, bei Fehlschlaegen wieder breiter
+hough_detector = AdaptiveHoughDetector(MIN_RADIUS, MAX_RADIUS, dp=1.5, min_dist=50,
+                                       param1=100, param2=40)
+# Farbmaske per Lookup-Tabelle direkt aus YUV420, Grenzen zur Laufzeit aenderbar
+color_classifier = ColorClassifier(pixel_format=CAPTURE_FORMAT)
+# Rundester Fleck der Maske per connectedComponents, statt findContours
+blob_detector = BlobDetector()
+# Latenz pro Schritt, Export unter /metrics
+metrics = Metrics(frame_budget=0.002)
+# Kerne/Prioritaet pro Thread aus THREAD_PLACEMENT, CPU-Zeit und Kontextwechsel unter /metrics
+placement = ThreadPlacement.from_env(metrics)
+capture_stage = metrics.stage("capture")
+convert_stage = metrics.stage("convert")
+detect_stage = metrics.stage("detect")
+draw_stage = metrics.stage("draw")
+# Echte Bildrate, verlorene Bilder und Latenz aus den Sensor-Zeitstempeln
+sensor_timing = SensorTiming(frame_duration_us=2000, metrics=metrics)
+sensor_timestamp = None  # SensorTimestamp (ns) des aktuellen Bildes
+# Positionen und Stufenzeiten per WebSocket (/telemetry, nur STREAM_SERVER=asyncio);
+# die Seite zeichnet den Ball dann selbst und holt den Stream mit ?overlay=client
+telemetry = Telemetry(CROP_WIDTH, CROP_HEIGHT, modes=("hough", "color"), fps=lambda: hub.fps,
+                      sensor_fps=sensor_timing.sensor_fps, metrics=metrics)
+if motion_gate is not None:
+    for result in ("unchanged", "gated", "full"):
+        metrics.counter("motion_gate_frames_total", "Frames by motion gate decision",
+                        {"result": result},
+                        fn=lambda result=result: getattr(motion_gate, "frames_" + result))
+metrics.counter("frames_dropped_total", "Frames lost on the way", {"where": "recording"},
+                fn=lambda: recorder.frames_lost)
 
 # --- Bildverarbeitung ---
-def detect_ball_hough(frame):
-    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-    blurred = cv2.medianBlur(gray, 5)
-    circles = cv2.HoughCircles(blurred, cv2.HOUGH_GRADIENT, dp=1.5, minDist=50,
-                               param1=100, param2=40, minRadius=MIN_RADIUS, maxRadius=MAX_RADIUS)
-    if circles is not None:
-        circles = np.uint16(np.around(circles))
-        c = circles[0][0]
-        cv2.circle(frame, (c[0], c[1]), c[2], (0, 255, 0), 2)
-        cv2.circle(frame, (c[0], c[1]), 2, (0, 0, 255), 3)
-    return frame
+def detect_ball_hough(frame, roi=None):
+    found, dimensions = hough_detector.detect(frame, roi)
+    if found and frame.ndim == 3:
+        frame = draw_ball(frame, dimensions)
+    return frame, found, dimensions
 
-def detect_ball_color(frame):
-    hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
-    lower_orange = np.array([5, 150, 150])
-    upper_orange = np.array([25, 255, 255])
-    mask = cv2.inRange(hsv, lower_orange, upper_orange)
-    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+def detect_ball_color(frame, roi=None):
+    # Maske in halber Aufloesung direkt aus dem Kamerabild, ohne HSV-Konvertierung
+    mask, scale, offset = color_classifier.mask(frame, roi, CROP_WIDTH, CROP_HEIGHT)
+    found, (x, y, radius), _ = blob_detector.find(mask)
 
-    if contours:
-        largest = max(contours, key=cv2.contourArea)
-        ((x, y), radius) = cv2.minEnclosingCircle(largest)
+    if found:
+        x, y, radius = to_frame_coords(x, y, radius, scale, offset)
         if radius > 5:
-            center = (int(x), int(y))
-            cv2.circle(frame, center, int(radius), (0, 255, 0), 2)
-            cv2.circle(frame, center, 2, (0, 0, 255), 3)
+            return frame, True, (int(x), int(y), int(radius))
+
+    return frame, False, (None, None, None)
 
+def draw_ball(frame, dimensions):
+    x, y, r = dimensions
+    cv2.circle(frame, (int(x), int(y)), int(r), (0, 255, 0), 2)
+    cv2.circle(frame, (int(x), int(y)), 2, (0, 0, 255), 3)
     return frame
 
 def draw_reference_circles(frame):
@@ -74,57 +119,146 @@ def draw_reference_circles(frame):
     return frame
 
 # --- Streaming Funktion ---
-def gen_frames():
-    global fps, mode
-    frame_counter = 0
-    start_time = time.time()
-
-    while True:
-        frame = picam2.capture_array()
-        frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
-
-        with mode_lock:
-            current_mode = mode
-
-        if current_mode == "hough":
-            frame = draw_reference_circles(frame)
-            frame = detect_ball_hough(frame)
-        elif current_mode == "color":
-            frame = detect_ball_color(frame)
-
-        # FPS berechnen
-        frame_counter += 1
-        elapsed = time.time() - start_time
-        if elapsed >= 1.0:
-            with fps_lock:
-                fps = frame_counter / elapsed
-            frame_counter = 0
-            start_time = time.time()
-        
-        ret, buffer = cv2.imencode('.jpg', frame)
-        if not ret:
-            continue
-        frame_bytes = buffer.tobytes()
-
-        yield (b'--frame\r\n'
-               b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
-        
-               
+def capture_frame():
+    global sensor_timestamp
+    # YUV420 bleibt unkonvertiert, die Umwandlung passiert je nach Modus
+    start = time.perf_counter()
+    frame, metadata = capture_with_metadata(picam2)
+    capture_stage.observe(time.perf_counter() - start)
+    sensor_timing.update(metadata)
+    sensor_timestamp = metadata["SensorTimestamp"]
+    if recorder.armed:
+        recorder.add(frame, sensor_timestamp / 1e9, crop=(crop_x, crop_y, CROP_WIDTH, CROP_HEIGHT))
+    return frame
+
+def to_bgr(frame):
+    return yuv420_to_bgr(frame, CROP_WIDTH, CROP_HEIGHT)
+
+# Ein ROI-Praediktor pro Overlay, da jeder Modus seine eigene Detektion hat
+roi_predictors = {"hough": RoiPredictor(), "color": RoiPredictor()}
+last_detections = {"hough": (False, (None, None, None)), "color": (False, (None, None, None))}
+# Bildnummer der letzten Detektion pro Modus; Clients mit und ohne Ball-Overlay
+# (?overlay=client) teilen sich eine Detektion pro Bild
+detected_frames = {}
+
+def process_frame(frame, mode):
+    # "hough:client" usw.: gleiche Detektion, den Ball zeichnet der Browser
+    mode, overlay = split_mode(mode)
+    if mode not in last_detections:
+        return to_bgr(frame)
+    if detected_frames.get(mode) == hub.frames_captured:
+        found, dimensions = last_detections[mode]
+    else:
+        found, dimensions = detect_frame(frame, mode)
+        detected_frames[mode] = hub.frames_captured
+
+    def render(frame):
+        # Farbe und Overlay nur fuer Bilder, die wirklich kodiert werden
+        start = time.perf_counter()
+        preview = to_bgr(frame)
+        converted = time.perf_counter()
+        if mode == "hough":
+            preview = draw_reference_circles(preview)
+        if found and overlay:
+            preview = draw_ball(preview, dimensions)
+        convert_stage.observe(converted - start)
+        draw_stage.observe(time.perf_counter() - converted)
+        return preview
+
+    return frame, render
+
+def detect_frame(frame, mode):
+    if mode == "hough":
+        # Hough direkt auf der Y-Ebene (View, keine Kopie, keine Farbkonvertierung)
+        detect = detect_ball_hough
+        search = luma(frame, CROP_WIDTH, CROP_HEIGHT)
+    elif mode == "color":
+        # Farbmaske direkt aus YUV420 ueber die Lookup-Tabelle
+        detect = detect_ball_color
+        search = frame
+
+    start = time.perf_counter()
+    regions = None
+    if motion_gate is not None:
+        # Ein Vergleich pro Bild, auch wenn beide Overlays aktiv sind
+        regions = motion_gate.regions(luma(frame, CROP_WIDTH, CROP_HEIGHT), sensor_timestamp)
+        detect = gated(detect, regions)
+    if regions == []:
+        # Keine Bewegung: letzte Detektion gilt weiter
+        found, dimensions = last_detections[mode]
+    elif ROI_TRACKING:
+        search, found, dimensions = detect_with_roi(detect, search, roi_predictors[mode], MIN_RADIUS,
+                                                    (CROP_WIDTH, CROP_HEIGHT))
+    else:
+        search, found, dimensions = detect(search)
+    last_detections[mode] = (found, dimensions)
+    telemetry.add(*dimensions, found, sensor_timestamp,
+                  crop=(crop_x, crop_y, CROP_WIDTH, CROP_HEIGHT), mode=mode)
+    detect_stage.observe(time.perf_counter() - start)
+    metrics.detection(found)
+    # process_frame laeuft im Capture-Thread des Hubs direkt nach capture_frame
+    sensor_timing.position_ready(sensor_timestamp)
+    return found, dimensions
+
+def select_mode(args):
+    return stream_mode(args, 'hough')
+
+# Eine Pipeline fuer alle Clients, jeder Client waehlt sein Overlay
+hub = StreamHub(capture_frame, process_frame, modes=with_client_overlay(("hough", "color")),
+                metrics=metrics, placement=placement)
+hub.start()
+
 # --- Flask-Routen ---
 @app.route('/video_feed')
 def video_feed():
-    global mode
-    requested_mode = request.args.get('mode', 'hough')
-    with mode_lock:
-        mode = requested_mode
-    return Response(gen_frames(),
+    return Response(hub.stream(select_mode(request.args)),
                     mimetype='multipart/x-mixed-replace; boundary=frame')
 
 @app.route('/fps')
 def get_fps():
-    with fps_lock:
-        current_fps = fps
-    return f"{current_fps:.2f}"
+    return f"{hub.fps:.2f}"
+
+@app.route('/stats')
+def stats():
+    data = {'fps': round(hub.fps, 2), 'hough': hough_detector.get_stats(),
+            'encoder': hub.encoder.get_stats(), 'latency': metrics.summary(),
+            'timing': sensor_timing.get_stats(), 'telemetry': telemetry.get_stats()}
+    data['threads'] = placement.get_stats()
+    if motion_gate is not None:
+        data['motion_gate'] = motion_gate.get_stats()
+    data['recorder'] = recorder.get_stats()
+    return jsonify(data)
+
+@app.route('/timing')
+def timing():
+    return jsonify(sensor_timing.get_stats())
+
+@app.route('/metrics')
+def get_metrics():
+    return Response(metrics.render(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+@app.route('/record')
+def record():
+    # /record?arm=1 legt den Ringpuffer an; ausloesen erst, wenn Vorlauf vorhanden ist
+    if request.args.get('arm') == '1':
+        return jsonify({'armed': recorder.arm(), **recorder.get_stats()})
+    if not recorder.armed:
+        return jsonify({'error': 'recording not armed, use /record?arm=1'}), 409
+    started = recorder.trigger(request.args.get('reason', 'http'))
+    return jsonify({'started': started, **recorder.get_stats()})
+
+@app.route('/color_thresholds')
+def color_thresholds():
+    # z.B. /color_thresholds?lower=5,150,150&upper=25,255,255
+    lower, upper = color_classifier.get_thresholds()
+    try:
+        lower = parse_hsv(request.args['lower']) if 'lower' in request.args else lower
+        upper = parse_hsv(request.args['upper']) if 'upper' in request.args else upper
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    color_classifier.set_thresholds(lower, upper)
+    lower, upper = color_classifier.get_thresholds()
+    return jsonify({'lower': lower, 'upper': upper})
 
 @app.route('/')
 def index():
@@ -161,15 +295,29 @@ def index():
                     color: white;
                 }
 
-                #video {
+                #view {
+                    position: relative;
                     transform: scale(2);
                     transform-origin: top center;
-                    display: block;
+                    width: fit-content;
                     margin: 20px auto;
+                }
+
+                #video {
+                    display: block;
                     max-width: 100%;
                 }
 
-                #fps {
+                #overlay {
+                    position: absolute;
+                    left: 0;
+                    top: 0;
+                    width: 100%;
+                    height: 100%;
+                    pointer-events: none;
+                }
+
+                #fps, #sensor {
                     font-size: 1.2em;
                     font-weight: bold;
                     color: black;
@@ -188,10 +336,23 @@ def index():
                 <button id="btn-color" onclick="changeMode('color')">Farbtracking Orange</button>
             </div>
             <div id="fps">FPS: Berechnung...</div>
-            <img id="video" src="/video_feed?mode=hough" />
+            <div id="sensor">Sensor: Berechnung...</div>
+            <div id="view">
+                <img id="video" src="/video_feed?mode=hough" />
+                <canvas id="overlay"></canvas>
+            </div>
             
 
-            <script>
+            <script>''' + TELEMETRY_JS + '''
+                let currentMode = 'hough';
+                // Mit Telemetrie zeichnet der Browser den Ball, der Stream kommt ohne
+                let clientOverlay = false;
+
+                function videoSource(mode) {
+                    return '/video_feed?mode=' + mode + (clientOverlay ? '&overlay=client' : '') +
+                        '&t=' + Date.now();
+                }
+
                 function fetchFPS() {
                     fetch('/fps?t=' + Date.now())
                         .then(response => response.text())
@@ -201,11 +362,31 @@ def index():
                         .catch(console.error);
                 }
 
-                setInterval(fetchFPS, 1000);
-                fetchFPS();
+                // FPS und Ball kommen per WebSocket; unter Flask weiter per Polling
+                startTelemetry({canvas: 'overlay', fps: 'fps', hz: 60, mode: () => currentMode,
+                                fallback: () => { setInterval(fetchFPS, 1000); fetchFPS(); },
+                                connected: (on) => {
+                                    clientOverlay = on;
+                                    document.getElementById('video').src = videoSource(currentMode);
+                                }});
+
+                function fetchTiming() {
+                    fetch('/timing?t=' + Date.now())
+                        .then(response => response.json())
+                        .then(t => {
+                            document.getElementById('sensor').innerText =
+                                'Sensor: ' + t.sensor_fps.toFixed(1) + ' fps | verloren: ' + t.frames_dropped +
+                                ' | Latenz: ' + t.mean_latency_ms.toFixed(1) + ' ms';
+                        })
+                        .catch(console.error);
+                }
+
+                setInterval(fetchTiming, 1000);
+                fetchTiming();
 
                 function changeMode(mode) {
-                    document.getElementById('video').src = '/video_feed?mode=' + mode + '&t=' + Date.now();
+                    currentMode = mode;
+                    document.getElementById('video').src = videoSource(mode);
                     document.getElementById('btn-hough').classList.toggle('active', mode === 'hough');
                     document.getElementById('btn-color').classList.toggle('active', mode === 'color');
                 }
@@ -216,4 +397,6 @@ def index():
 
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, threaded=True)
+    # STREAM_SERVER=asyncio: alle Clients in einem Event-Loop statt einem Thread pro Stream
+    run_server(app, hub, host='0.0.0.0', port=5000, select_mode=select_mode,
+               websockets={'/telemetry': telemetry.websocket}, placement=placement)
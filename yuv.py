@@ -0,0 +1,20 @@
+"""
+Hilfsfunktionen fuer YUV420-Bilder aus Picamera2
+
+Picamera2 liefert YUV420 (I420) als ein 2D-Array mit height * 3 / 2 Zeilen:
+zuerst die Y-Ebene, dann U und V. Die Zeilenbreite kann wegen des ISP-Strides
+groesser als die Bildbreite sein.
+"""
+import cv2
+
+CAPTURE_FORMAT_YUV420 = "YUV420"
+
+
+def luma(frame, width, height):
+    """Y-Ebene als View ohne Kopie (Graustufenbild fuer Hough)."""
+    return frame[:height, :width]
+
+
+def yuv420_to_bgr(frame, width, height):
+    """Vollstaendige Farbkonvertierung, nur fuer Farbdetektion oder Vorschau."""
+    return cv2.cvtColor(frame, cv2.COLOR_YUV2BGR_I420)[:height, :width]